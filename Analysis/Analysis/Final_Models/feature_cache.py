@@ -0,0 +1,296 @@
+"""
+Feature preparation shared by Model1_Final.ipynb and Model3_Final.ipynb.
+
+Each recipe in RECIPES names its source tables and a list of transforms
+(winsorize, log1p, Unknown filling, one-hot dummies, ...). The result is cached
+under CACHE_DIR, keyed by a hash of the source file contents and the recipe, so
+a changed table or parameter builds a new entry and an unchanged one loads from
+disk. X and y are memory-mapped NumPy arrays.
+
+    from feature_cache import load_features
+    fs = load_features("model1_trees")
+    X_train, X_test, y_train, y_test = train_test_split(fs.X, fs.y, test_size=0.2, random_state=87)
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+import numpy as np
+import polars as pl
+
+# === Configuration ===
+
+CACHE_DIR = ".feature_cache"  # relative to the notebooks' working directory
+CACHE_VERSION = 1  # bump when a transform changes its output
+TRAIT_COLS = ["Background", "Clothes", "Earring", "Eyes", "Fur", "Hat", "Mouth"]
+PANEL_NUM_COLS = [
+    "buyer_tscount", "buyer_act_period", "buyer_total_value",
+    "buyer_total_gasUsed", "buyer_avg_gasPrice", "buyer_avg_gasLimit",
+    "seller_tscount", "seller_act_period", "seller_total_value",
+    "seller_total_gasUsed", "seller_avg_gasPrice", "seller_avg_gasLimit",
+    "total_offers", "unique_makers_count", "mean_offer_price",
+    "std_offer_price", "lowest_offer", "duration_offer_days",
+]
+
+# sources: table name -> CSV; the first is the base, the others are left-joined on token_id.
+# steps: (transform, parameters), applied in order. target: y column; X is every other
+# numeric column except `ids`.
+RECIPES = {
+    # Model1 OLS: log price of the first sale on the traits (statsmodels formula)
+    "model1_ols": {
+        "sources": {"df_table1": "df_table1.csv", "df_table3": "df_table3.csv"},
+        "steps": [
+            ("select", {"columns": ["token_id", "price_1_sale"] + TRAIT_COLS}),
+            ("winsorize", {"columns": ["price_1_sale"], "lower": 0.01, "upper": 0.99, "method": "quantile"}),
+            ("log", {"columns": ["price_1_sale"], "plus_one": False}),
+            ("fill_unknown", {"columns": TRAIT_COLS}),
+            ("drop_nonfinite", {"columns": ["log_price_1_sale"]}),
+        ],
+        "target": "log_price_1_sale",  # the traits stay strings for C(...) terms, so X is empty
+        "ids": ["token_id"],
+    },
+    # Model1 ElasticNet and tree ensembles: sale month and trait dummies
+    "model1_trees": {
+        "sources": {"df_table1": "df_table1.csv", "df_table3": "df_table3.csv"},
+        "steps": [
+            ("select", {"columns": ["token_id", "time_1_sale", "price_1_sale", "rarity.rank"] + TRAIT_COLS}),
+            ("month", {"column": "time_1_sale", "alias": "sale_1_month"}),
+            ("drop", {"columns": ["time_1_sale", "rarity.rank"]}),  # rarity.rank leaks across time
+            ("one_hot", {"columns": ["sale_1_month"] + TRAIT_COLS, "drop_first": True}),
+            ("log", {"columns": ["price_1_sale"], "plus_one": True, "names": {"price_1_sale": "log_price_1"}}),
+        ],
+        "target": "log_price_1",
+        "ids": ["token_id"],
+    },
+    # Model3 OLS on the panel: winsorized log buyer/seller/offer features
+    "model3_ols": {
+        "sources": {"panel": "Panel_for_Model2.csv"},
+        "steps": [
+            ("drop", {"columns": ["buyer", "seller", "time_of_sale", "event_count",
+                                  "buyer_rolling_avg_value_last10", "seller_rolling_avg_value_last10",
+                                  "buyer_rolling_std_value_last10", "seller_rolling_std_value_last10",
+                                  "median_offer_price", "highest_offer", "rarity.rank"]}),
+            ("winsorize", {"columns": ["price"], "lower": 0.01, "upper": 0.99, "method": "quantile"}),
+            ("log", {"columns": ["price"], "plus_one": True}),
+            ("winsorize", {"columns": PANEL_NUM_COLS, "lower": 0.01, "upper": 0.99, "method": "rank"}),
+            ("log", {"columns": PANEL_NUM_COLS, "plus_one": True}),
+            ("keep_numeric_prefix", {"prefix": "log_"}),
+        ],
+        "target": "log_price",
+        "ids": ["token_id", "sale_time"],
+    },
+}
+
+
+class FeatureSet(NamedTuple):
+    X: np.ndarray  # memory-mapped, float64
+    y: Optional[np.ndarray]
+    columns: List[str]
+    ids: pl.DataFrame
+    frame: pl.DataFrame  # the prepared table, before X/y are split off
+    key: str
+    cached: bool
+
+
+# === Transforms ===
+
+def t_select(df: pl.DataFrame, columns: List[str]) -> pl.DataFrame:
+    return df.select([c for c in columns if c in df.columns])
+
+
+def t_drop(df: pl.DataFrame, columns: List[str]) -> pl.DataFrame:
+    return df.drop([c for c in columns if c in df.columns])
+
+
+def t_month(df: pl.DataFrame, column: str, alias: str) -> pl.DataFrame:
+    """UNIX seconds -> "YYYY-MM"."""
+    return df.with_columns(pl.from_epoch(pl.col(column).cast(pl.Int64)).dt.strftime("%Y-%m").alias(alias))
+
+
+def t_winsorize(df: pl.DataFrame, columns: List[str], lower: float = 0.01, upper: float = 0.99,
+                method: str = "quantile") -> pl.DataFrame:
+    """
+    Clip each column at its lower/upper quantile. "quantile" clips at the
+    interpolated quantiles like pandas `clip(quantile(..))`; "rank" clips at the
+    order statistics like scipy.stats.mstats.winsorize(limits=[lower, 1 - upper]).
+    """
+    exprs = []
+    for c in [c for c in columns if c in df.columns]:
+        col = pl.col(c).cast(pl.Float64)
+        if method == "quantile":
+            lo, hi = col.quantile(lower, interpolation="linear"), col.quantile(upper, interpolation="linear")
+        elif method == "rank":
+            values = col.drop_nulls().sort()
+            n = values.len()
+            lo = values.get((n * lower).floor().cast(pl.Int64))
+            hi = values.get(n - (n * (1 - upper)).floor().cast(pl.Int64) - 1)
+        else:
+            raise ValueError(f"Unknown winsorize method: {method}")
+        exprs.append(col.clip(lo, hi).alias(c))
+    return df.with_columns(exprs)
+
+
+def t_log(df: pl.DataFrame, columns: List[str], plus_one: bool = True, prefix: str = "log_",
+          names: Optional[Dict[str, str]] = None) -> pl.DataFrame:
+    """
+    Replace each column by its log (log1p with plus_one), named prefix + column
+    unless renamed. NumPy computes it so the values match the notebooks bit for bit.
+    """
+    names = names or {}
+    columns = [c for c in columns if c in df.columns]
+    log = np.log1p if plus_one else np.log
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df = df.with_columns([pl.Series(names.get(c, prefix + c), log(df[c].cast(pl.Float64).to_numpy()))
+                              for c in columns])
+    return df.drop([c for c in columns if names.get(c, prefix + c) != c])
+
+
+def t_fill_unknown(df: pl.DataFrame, columns: List[str], value: str = "Unknown") -> pl.DataFrame:
+    return df.with_columns([pl.col(c).fill_null(value) for c in columns if c in df.columns])
+
+
+def t_drop_nonfinite(df: pl.DataFrame, columns: List[str]) -> pl.DataFrame:
+    return df.filter(pl.all_horizontal([pl.col(c).is_finite().fill_null(False) for c in columns]))
+
+
+def t_one_hot(df: pl.DataFrame, columns: List[str], drop_first: bool = True) -> pl.DataFrame:
+    """
+    Int8 dummies named <column>_<level>, like pd.get_dummies: levels are sorted,
+    drop_first drops the first level, nulls get no dummy, and the dummies go
+    after the remaining columns.
+    """
+    dummies = []
+    for c in [c for c in columns if c in df.columns]:
+        levels = df[c].drop_nulls().cast(pl.String).unique().sort().to_list()
+        dummies += [(pl.col(c).cast(pl.String) == level).fill_null(False).cast(pl.Int8).alias(f"{c}_{level}")
+                    for level in levels[1 if drop_first else 0:]]
+    return df.select(pl.exclude(columns), *dummies)
+
+
+def t_keep_numeric_prefix(df: pl.DataFrame, prefix: str = "log_") -> pl.DataFrame:
+    """Drop the numeric columns whose name does not start with `prefix`."""
+    return df.drop([c for c, dtype in df.schema.items() if dtype.is_numeric() and not c.startswith(prefix)])
+
+
+TRANSFORMS = {
+    "select": t_select,
+    "drop": t_drop,
+    "month": t_month,
+    "winsorize": t_winsorize,
+    "log": t_log,
+    "fill_unknown": t_fill_unknown,
+    "drop_nonfinite": t_drop_nonfinite,
+    "one_hot": t_one_hot,
+    "keep_numeric_prefix": t_keep_numeric_prefix,
+}
+
+
+# === Cache ===
+
+def file_hash(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def cache_key(recipe: Dict[str, Any], data_dir: str) -> str:
+    """Hash of the recipe and of the contents of its source files."""
+    sources = {name: file_hash(os.path.join(data_dir, path)) for name, path in recipe["sources"].items()}
+    payload = json.dumps({"version": CACHE_VERSION, "recipe": recipe, "sources": sources}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def prepare_frame(recipe: Dict[str, Any], data_dir: str) -> pl.DataFrame:
+    """Read and join the recipe's source tables, then apply its transforms."""
+    frames = [pl.read_csv(os.path.join(data_dir, path), schema_overrides={"token_id": pl.String},
+                          infer_schema_length=None) for path in recipe["sources"].values()]
+    df = frames[0]
+    for other in frames[1:]:
+        df = df.join(other, on="token_id", how="left", maintain_order="left")
+    for name, params in recipe["steps"]:
+        df = TRANSFORMS[name](df, **params)
+    return df
+
+
+def write_entry(entry_dir: str, recipe: Dict[str, Any], frame: pl.DataFrame, key: str):
+    """Write X.npy, y.npy, frame.parquet and meta.json into a fresh `entry_dir` atomically."""
+    target, ids = recipe["target"], recipe["ids"]
+    columns = [c for c, dtype in frame.schema.items() if dtype.is_numeric() and c != target and c not in ids]
+    temp_dir = f"{entry_dir}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    X = frame.select(columns).to_numpy().astype(np.float64, copy=False) if columns else np.empty((frame.height, 0))
+    np.save(os.path.join(temp_dir, "X.npy"), X)
+    if target:
+        np.save(os.path.join(temp_dir, "y.npy"), frame[target].to_numpy().astype(np.float64, copy=False))
+    frame.write_parquet(os.path.join(temp_dir, "frame.parquet"))
+    with open(os.path.join(temp_dir, "meta.json"), "w") as f:
+        json.dump({"key": key, "recipe": recipe, "columns": columns, "rows": frame.height,
+                   "created": time.strftime("%Y-%m-%d %H:%M:%S")}, f, indent=2)
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(temp_dir, entry_dir)
+
+
+def load_features(recipe: Union[str, Dict[str, Any]], data_dir: str = ".", cache_dir: str = CACHE_DIR,
+                  refresh: bool = False, name: Optional[str] = None) -> FeatureSet:
+    """
+    X/y and the prepared frame of a recipe (a RECIPES name or a recipe dict),
+    loaded from the cache when the source files and the recipe are unchanged.
+    Older cache entries of the same name are removed when a new one is built;
+    a recipe dict is named after its hash unless `name` is given.
+    """
+    if name is None:
+        name = recipe if isinstance(recipe, str) else \
+            "custom-" + hashlib.sha256(json.dumps(recipe, sort_keys=True).encode()).hexdigest()[:8]
+    recipe = RECIPES[recipe] if isinstance(recipe, str) else recipe
+    key = cache_key(recipe, data_dir)
+    entry_dir = os.path.join(cache_dir, f"{name}-{key[:16]}")
+    cached = os.path.exists(os.path.join(entry_dir, "meta.json")) and not refresh
+    if not cached:
+        write_entry(entry_dir, recipe, prepare_frame(recipe, data_dir), key)
+        for old in os.listdir(cache_dir):
+            if old.startswith(f"{name}-") and os.path.join(cache_dir, old) != entry_dir:
+                shutil.rmtree(os.path.join(cache_dir, old), ignore_errors=True)
+
+    with open(os.path.join(entry_dir, "meta.json")) as f:
+        meta = json.load(f)
+    y_path = os.path.join(entry_dir, "y.npy")
+    frame = pl.read_parquet(os.path.join(entry_dir, "frame.parquet"), memory_map=True)
+    return FeatureSet(
+        X=np.load(os.path.join(entry_dir, "X.npy"), mmap_mode="r"),
+        y=np.load(y_path, mmap_mode="r") if os.path.exists(y_path) else None,
+        columns=meta["columns"],
+        ids=frame.select(recipe["ids"]),
+        frame=frame,
+        key=key,
+        cached=cached,
+    )
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or load the cached feature matrices of the model notebooks.")
+    parser.add_argument("recipes", nargs="*", default=list(RECIPES), help=f"any of {', '.join(RECIPES)}")
+    parser.add_argument("--data-dir", default=".", help="folder with the source CSV files")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--refresh", action="store_true", help="rebuild even if the cache is current")
+    args = parser.parse_args()
+
+    for name in args.recipes:
+        start = time.perf_counter()
+        try:
+            fs = load_features(name, args.data_dir, args.cache_dir, refresh=args.refresh)
+        except FileNotFoundError as e:
+            print(f"{name}: skipped, {e}")
+            continue
+        source = "cache" if fs.cached else "built"
+        print(f"{name}: X {fs.X.shape}, {source} in {(time.perf_counter() - start) * 1000:.0f} ms (key {fs.key[:16]})")
+
+if __name__ == "__main__":
+    main()
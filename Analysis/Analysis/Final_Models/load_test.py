@@ -0,0 +1,77 @@
+"""
+Load test for predict_service.py: CONCURRENCY client threads send REQUESTS
+POST /predict calls of ITEMS_PER_REQUEST random tokens each, then the client-
+side p50/p99 latency and throughput are printed next to the server's /stats.
+
+    python predict_service.py serve &
+    python load_test.py --concurrency 32 --requests 2000
+"""
+import json
+import time
+import random
+import argparse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+import numpy as np
+import polars as pl
+
+# === Configuration ===
+
+URL = "http://127.0.0.1:8087"
+TRAITS_CSV = "df_table3.csv"  # token IDs to draw from
+CONCURRENCY = 16  # client threads
+REQUESTS = 1000  # total POST /predict calls
+ITEMS_PER_REQUEST = 1
+SALE_MONTH = "2022-03"
+SEED = 87
+
+
+def post(url: str, items: List[Dict[str, Any]]) -> float:
+    """One POST /predict; returns its latency in seconds."""
+    body = json.dumps({"items": items}).encode()
+    request = urllib.request.Request(url + "/predict", data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def get_json(url: str) -> Dict[str, Any]:
+    with urllib.request.urlopen(url) as response:
+        return json.loads(response.read())
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the price-prediction service.")
+    parser.add_argument("--url", default=URL)
+    parser.add_argument("--traits", default=TRAITS_CSV)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    parser.add_argument("--items", type=int, default=ITEMS_PER_REQUEST, help="items per request")
+    parser.add_argument("--sale-month", default=SALE_MONTH)
+    args = parser.parse_args()
+
+    tokens = pl.read_csv(args.traits, columns=["token_id"], schema_overrides={"token_id": pl.String})["token_id"].to_list()
+    rng = random.Random(SEED)
+    payloads = [[{"token_id": rng.choice(tokens), "sale_month": args.sale_month} for _ in range(args.items)]
+                for _ in range(args.requests)]
+
+    before = get_json(args.url + "/stats")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = np.array(list(pool.map(lambda items: post(args.url, items), payloads))) * 1000
+    elapsed = time.perf_counter() - start
+    after = get_json(args.url + "/stats")
+
+    print(f"{args.requests} requests x {args.items} items, {args.concurrency} clients, {elapsed:.2f}s")
+    print(f"Client: p50={np.percentile(latencies, 50):.2f}ms p99={np.percentile(latencies, 99):.2f}ms "
+          f"throughput={args.requests / elapsed:.1f} req/s ({args.requests * args.items / elapsed:.1f} items/s)")
+    print(f"Server: p50={after['p50_ms']:.2f}ms p99={after['p99_ms']:.2f}ms "
+          f"mean batch={after['mean_batch_items']:.1f} items, "
+          f"{after['requests'] - before['requests']} requests served")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Hyperparameter search for the tree-ensemble comparison of Model1_Final.ipynb.
+
+All model families are searched together: every (candidate, CV fold) fit is a
+task on one shared process pool, and each fit gets a fixed number of threads.
+The CV fold indices are computed once and reused by every family. In "grid"
+mode every candidate is scored on all folds, which gives the same selection as
+GridSearchCV(cv=10). In "halving" mode candidates are first scored on a few
+folds, and only the best 1/ETA of each family get more folds, until the
+survivors have been scored on all of them.
+
+    python model_search.py --mode halving
+"""
+import os
+import json
+import math
+import time
+import argparse
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+import joblib
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import KFold, ParameterGrid, RepeatedKFold, train_test_split
+from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, AdaBoostRegressor
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.inspection import permutation_importance
+from xgboost import XGBRegressor
+
+from feature_cache import RECIPES, load_features
+
+# === Configuration ===
+
+RNG = 87
+CV_FOLDS = 10  # folds of the final score, as GridSearchCV(cv=10)
+ETA = 3  # halving: keep the best 1/ETA of each family per rung
+MIN_FOLDS = 2  # halving: folds scored in the first rung, times ETA per rung
+THREADS_PER_FIT = 1  # threads given to one fit (n_jobs / nthread of the estimator)
+N_JOBS = max(1, (os.cpu_count() or 1) // THREADS_PER_FIT)  # concurrent fits in the shared pool
+OUTPUT_DIR = "."  # best_*.joblib, model_comparison_results.csv, *_importance_*.csv
+
+MODELS = {
+    "RandomForest": RandomForestRegressor(random_state=RNG, n_jobs=THREADS_PER_FIT),
+    "XGBoost": XGBRegressor(random_state=RNG, n_estimators=300, tree_method="hist", n_jobs=THREADS_PER_FIT),
+    "GradientBoosting": GradientBoostingRegressor(random_state=RNG),
+    "AdaBoost": AdaBoostRegressor(estimator=DecisionTreeRegressor(max_depth=3, random_state=RNG), random_state=RNG),
+}
+
+PARAM_GRIDS = {
+    "RandomForest": {
+        "n_estimators": [100, 150, 200, 250, 300],
+        "max_depth": [5, 8, 12, 15, 20],
+        "min_samples_split": [5, 15, 20],
+        "min_samples_leaf": [1, 3, 5],
+        "max_features": ["sqrt", "log2", None, 0.5],
+    },
+    "XGBoost": {
+        "n_estimators": [200, 350, 500],
+        "max_depth": [4, 6, 8],
+        "learning_rate": [0.03, 0.06, 0.1],
+        "subsample": [0.7, 0.9, 1.0],
+        "colsample_bytree": [0.7, 0.9, 1.0],
+        "reg_lambda": [1.0, 3.0, 6.0],
+    },
+    "GradientBoosting": {
+        "n_estimators": [200, 400],
+        "learning_rate": [0.05, 0.1],
+        "max_depth": [2, 3, 4],
+        "subsample": [0.7, 0.9, 1.0],
+        "min_samples_leaf": [1, 3, 5],
+    },
+    "AdaBoost": {
+        "n_estimators": [200, 400, 600],
+        "learning_rate": [0.05, 0.1, 0.2],
+        "estimator__max_depth": [2, 3, 4],
+    },
+}
+
+
+# === Search ===
+
+def fold_score(estimator, X: np.ndarray, y: np.ndarray, train_idx: np.ndarray, test_idx: np.ndarray) -> float:
+    """Pool task: negative MSE of one candidate on one fold."""
+    estimator.fit(X[train_idx], y[train_idx])
+    return -mean_squared_error(y[test_idx], estimator.predict(X[test_idx]))
+
+
+def make_candidates(families: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+    """(family, params) for every grid point, in ParameterGrid order per family."""
+    return [(family, params) for family in families for params in ParameterGrid(PARAM_GRIDS[family])]
+
+
+def search(X: np.ndarray, y: np.ndarray, families: List[str], mode: str = "halving",
+           n_jobs: int = N_JOBS) -> Dict[str, Dict[str, Any]]:
+    """
+    Best candidate of each family by mean CV score over all CV_FOLDS folds.
+    Returns {family: {"params", "score", "fits"}}; ties go to the earlier grid
+    point, as in GridSearchCV.
+    """
+    folds = list(KFold(n_splits=CV_FOLDS).split(X))
+    candidates = make_candidates(families)
+    scores = [[] for _ in candidates]
+    alive = list(range(len(candidates)))
+    fits = {family: 0 for family in families}
+    rung = 0
+    with Parallel(n_jobs=n_jobs) as parallel:
+        while True:
+            budget = CV_FOLDS if mode == "grid" else min(CV_FOLDS, MIN_FOLDS * ETA ** rung)
+            tasks = [(i, fold) for i in alive for fold in range(len(scores[i]), budget)]
+            start = time.time()
+            results = parallel(delayed(fold_score)(clone(MODELS[candidates[i][0]]).set_params(**candidates[i][1]),
+                                                   X, y, *folds[fold]) for i, fold in tasks)
+            for (i, _), score in zip(tasks, results):
+                scores[i].append(score)
+                fits[candidates[i][0]] += 1
+            print(f"Rung {rung}: {len(alive)} candidates on {budget} folds, {len(tasks)} fits "
+                  f"in {time.time() - start:.1f}s")
+            if budget == CV_FOLDS:
+                break
+            survivors = []
+            for family in families:
+                members = [i for i in alive if candidates[i][0] == family]
+                members.sort(key=lambda i: -np.mean(scores[i]))  # stable: earlier grid point first on ties
+                survivors += members[:math.ceil(len(members) / ETA)]
+            alive = sorted(survivors)
+            rung += 1
+
+    best = {}
+    for family in families:
+        members = [i for i in alive if candidates[i][0] == family]
+        i = max(members, key=lambda i: (np.mean(scores[i]), -i))
+        best[family] = {"params": candidates[i][1], "score": float(np.mean(scores[i])), "fits": fits[family]}
+    return best
+
+
+# === Evaluation (as in Model1_Final.ipynb) ===
+
+def split_features(recipe: str, data_dir: str = ".", test_size: float = 0.2
+                   ) -> Tuple[pd.DataFrame, pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    X_train, X_test, y_train, y_test of a feature_cache recipe, split as in cell
+    23 of Model1_Final.ipynb: the rows are split before the recipe's one-hot
+    step, the dummies come from the train rows only, and the test rows are
+    reindexed to them (levels seen only in the test rows get no column).
+    """
+    spec = RECIPES[recipe]
+    one_hot = [params for step, params in spec["steps"] if step == "one_hot"]
+    raw_recipe = {**spec, "steps": [step for step in spec["steps"] if step[0] != "one_hot"]}
+    raw = load_features(raw_recipe, data_dir, name=f"{recipe}_raw").frame.to_pandas()
+
+    idx_train, idx_test = train_test_split(raw.index, test_size=test_size, random_state=RNG)
+    y = raw[spec["target"]].to_numpy(np.float64)
+    X = raw.drop(columns=spec["ids"] + [spec["target"]])
+    X_train, X_test = X.loc[idx_train], X.loc[idx_test]
+    for params in one_hot:
+        columns, drop_first = params["columns"], params.get("drop_first", True)
+        X_train = pd.get_dummies(X_train, columns=columns, drop_first=drop_first, dtype=np.int8)
+        X_test = pd.get_dummies(X_test, columns=columns, drop_first=drop_first, dtype=np.int8) \
+            .reindex(columns=X_train.columns, fill_value=0)
+    return X_train, X_test, y[idx_train], y[idx_test]
+
+
+def _eval_block(y_true_log, y_pred_log, eps=1e-12):
+    rmse_log = np.sqrt(mean_squared_error(y_true_log, y_pred_log))
+    mae_log = mean_absolute_error(y_true_log, y_pred_log)
+    r2_log = r2_score(y_true_log, y_pred_log)
+
+    y_true = np.expm1(y_true_log)
+    y_pred = np.expm1(y_pred_log)
+
+    rmse = np.sqrt(mean_squared_error(y_true, y_pred))
+    mae = mean_absolute_error(y_true, y_pred)
+    r2 = r2_score(y_true, y_pred)
+
+    denom = np.where(np.abs(y_true) < eps, eps, np.abs(y_true))
+    mape = np.mean(np.abs((y_true - y_pred) / denom)) * 100
+
+    smape = np.mean(2 * np.abs(y_pred - y_true) / (np.abs(y_true) + np.abs(y_pred) + eps)) * 100
+
+    return dict(RMSE_log=rmse_log, MAE_log=mae_log, R2_log=r2_log,
+                RMSE=rmse, MAE=mae, R2=r2, MAPE_pct=mape, sMAPE_pct=smape)
+
+
+def evaluate_best(best: Dict[str, Dict[str, Any]], X_train: pd.DataFrame, y_train, X_test: pd.DataFrame, y_test,
+                  feature_names: List[str], out_dir: str = OUTPUT_DIR, diagnostics: bool = True,
+                  n_jobs: int = N_JOBS) -> pd.DataFrame:
+    """
+    Refit each family's best candidate, write best_*.joblib and the importances,
+    return the comparison table. The refit uses the DataFrame, so the saved
+    models keep feature_names_in_ (predict_service.py builds its encoding from them).
+    """
+    X_train_array = np.asarray(X_train, dtype=np.float64)
+    results = []
+    for name, found in best.items():
+        model = clone(MODELS[name]).set_params(**found["params"]).fit(X_train, y_train)
+        tr, te = _eval_block(y_train, model.predict(X_train)), _eval_block(y_test, model.predict(X_test))
+        print(f"\n[{name}] Train R2_log={tr['R2_log']:.4f}, Test R2_log={te['R2_log']:.4f}, "
+              f"Train RMSE_log={tr['RMSE_log']:.4f}, Test RMSE_log={te['RMSE_log']:.4f}")
+
+        if diagnostics:
+            rkf = RepeatedKFold(n_splits=5, n_repeats=2, random_state=RNG)
+            cv_scores = Parallel(n_jobs=n_jobs)(delayed(fold_score)(clone(model), X_train_array, y_train, tr_idx, te_idx)
+                                                for tr_idx, te_idx in rkf.split(X_train))
+            cv_rmse = np.sqrt(-np.array(cv_scores))
+            print(f"[{name}] RepeatedKFold CV RMSE (log): mean={cv_rmse.mean():.4f}, std={cv_rmse.std():.4f}")
+            pi = permutation_importance(model, X_test, y_test, n_repeats=10, random_state=RNG, n_jobs=n_jobs,
+                                        scoring="neg_mean_squared_error")
+            pd.DataFrame({"Feature": feature_names, "MeanDecreaseMSE_log": pi.importances_mean,
+                          "Std": pi.importances_std}).sort_values("MeanDecreaseMSE_log", ascending=False) \
+                .to_csv(os.path.join(out_dir, f"perm_importance_{name}.csv"), index=False)
+        if hasattr(model, "feature_importances_"):
+            pd.DataFrame({"Feature": feature_names, "Importance": model.feature_importances_}) \
+                .sort_values("Importance", ascending=False) \
+                .to_csv(os.path.join(out_dir, f"feature_importance_{name}.csv"), index=False)
+
+        joblib.dump(model, os.path.join(out_dir, f"best_{name}.joblib"))
+        results.append({"Model": name, **te, "BestParams": found["params"], "BestCV_negMSE": found["score"],
+                        "Fits": found["fits"]})
+    return pd.DataFrame(results).sort_values(by="RMSE")
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the tree-ensemble grids on one shared pool.")
+    parser.add_argument("--mode", choices=["halving", "grid"], default="halving")
+    parser.add_argument("--families", nargs="+", choices=list(MODELS), default=list(MODELS))
+    parser.add_argument("--recipe", default="model1_trees", help="feature_cache recipe for X/y")
+    parser.add_argument("--data-dir", default=".")
+    parser.add_argument("--out", default=OUTPUT_DIR)
+    parser.add_argument("--n-jobs", type=int, default=N_JOBS)
+    parser.add_argument("--no-diagnostics", action="store_true", help="skip RepeatedKFold and permutation importance")
+    args = parser.parse_args()
+
+    start = time.time()
+    X_train, X_test, y_train, y_test = split_features(args.recipe, args.data_dir)
+    print(f"{len(X_train)} train / {len(X_test)} test rows, {X_train.shape[1]} features")
+    best = search(np.asarray(X_train, dtype=np.float64), y_train, args.families, mode=args.mode, n_jobs=args.n_jobs)
+    print(json.dumps(best, indent=2, default=str))
+
+    os.makedirs(args.out, exist_ok=True)
+    results_df = evaluate_best(best, X_train, y_train, X_test, y_test, X_train.columns.tolist(), args.out,
+                               diagnostics=not args.no_diagnostics, n_jobs=args.n_jobs)
+    cols = ["Model", "RMSE", "MAE", "R2", "MAPE_pct", "sMAPE_pct", "RMSE_log", "MAE_log", "R2_log", "BestParams"]
+    print("\n=== Test-set comparison (sorted by RMSE on original scale) ===")
+    print(results_df[cols])
+    results_df.to_csv(os.path.join(args.out, "model_comparison_results.csv"), index=False)
+    print(f"\nSearch ({args.mode}) and evaluation finished in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Local price-prediction service over the saved best_*.joblib models.
+
+The models are loaded once. The Model 1 one-hot encoding (sale_1_month and the
+trait dummies, drop_first) is taken from the models' feature names and turned
+into a lookup table: every token in df_table3 maps to the column indices of its
+trait dummies. Requests are queued and scored in micro-batches, with one
+vectorized predict call per model and batch.
+
+    python predict_service.py serve --port 8087
+    python predict_service.py predict --tokens 1 2 3 --sale-month 2024-05
+    curl -X POST localhost:8087/predict -d '{"items": [{"token_id": "1", "sale_month": "2024-05"}]}'
+"""
+import os
+import sys
+import json
+import glob
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+import numpy as np
+import polars as pl
+import joblib
+
+# === Configuration ===
+
+MODEL_DIR = os.path.join("..", "Results")  # best_<name>.joblib
+TRAITS_CSV = "df_table3.csv"
+TRAIT_COLS = ["Background", "Clothes", "Earring", "Eyes", "Fur", "Hat", "Mouth"]
+MONTH_COL = "sale_1_month"
+HOST = "127.0.0.1"
+PORT = 8087
+MAX_BATCH = 256  # items per predict call
+MAX_WAIT_MS = 5  # how long the batcher waits to fill a batch
+LATENCY_WINDOW = 10000  # requests kept for the p50/p99 figures
+
+
+class OneHotLookup:
+    """
+    Model 1 dummies as index lookups: (column, level) -> feature index, and
+    token_id -> indices of its trait dummies. Levels the models never saw (the
+    dropped reference level or new ones) have no dummy, as in pd.get_dummies
+    followed by reindex(fill_value=0).
+    """
+
+    def __init__(self, feature_names: List[str], traits: pl.DataFrame):
+        self.feature_names = list(feature_names)
+        self.index = {}
+        for i, name in enumerate(self.feature_names):
+            for col in [MONTH_COL] + TRAIT_COLS:
+                if name.startswith(col + "_"):
+                    self.index[(col, name[len(col) + 1:])] = i
+                    break
+        self.tokens = {}
+        for row in traits.select(["token_id"] + [c for c in TRAIT_COLS if c in traits.columns]).iter_rows(named=True):
+            self.tokens[row["token_id"]] = self.trait_indices(row)
+
+    def trait_indices(self, traits: Dict[str, Any]) -> List[int]:
+        return [self.index[(col, str(traits[col]))] for col in TRAIT_COLS
+                if traits.get(col) is not None and (col, str(traits[col])) in self.index]
+
+    def encode(self, items: List[Dict[str, Any]]) -> np.ndarray:
+        """One feature row per item: {"token_id" or "traits", "sale_month"}."""
+        X = np.zeros((len(items), len(self.feature_names)), dtype=np.float64)
+        for row, item in enumerate(items):
+            if "traits" in item:
+                columns = self.trait_indices(item["traits"])
+            else:
+                columns = self.tokens.get(str(item["token_id"]))
+                if columns is None:
+                    raise KeyError(f"unknown token_id {item['token_id']}")
+            month = self.index.get((MONTH_COL, str(item.get("sale_month"))))
+            X[row, columns] = 1.0
+            if month is not None:
+                X[row, month] = 1.0
+        return X
+
+
+def load_models(model_dir: str, names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """best_<name>.joblib models of `model_dir`; models that fail to load are skipped."""
+    models = {}
+    for path in sorted(glob.glob(os.path.join(model_dir, "best_*.joblib"))):
+        name = os.path.basename(path)[len("best_"):-len(".joblib")]
+        if names and name not in names:
+            continue
+        try:
+            models[name] = joblib.load(path)
+        except Exception as e:
+            print(f"Skipping {name}: {e}", file=sys.stderr)
+    return models
+
+
+class Predictor:
+    """The loaded models, their shared one-hot lookup and the latency statistics."""
+
+    def __init__(self, models: Dict[str, Any], traits: pl.DataFrame):
+        if not models:
+            raise RuntimeError("No model could be loaded")
+        self.models = models
+        names = [list(m.feature_names_in_) for m in models.values() if hasattr(m, "feature_names_in_")]
+        if not names:
+            raise RuntimeError("The models carry no feature_names_in_ to build the encoding from")
+        self.lookup = OneHotLookup(names[0], traits)
+        # Models trained on another column order get their columns through an index array.
+        position = {name: i for i, name in enumerate(self.lookup.feature_names)}
+        self.columns = {}
+        for name, model in models.items():
+            model_names = list(getattr(model, "feature_names_in_", self.lookup.feature_names))
+            if model_names != self.lookup.feature_names:
+                self.columns[name] = np.array([position.get(f, -1) for f in model_names])
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.items = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def predict(self, items: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Log-price predictions of every model for `items`."""
+        return self.predict_matrix(self.lookup.encode(items))
+
+    def predict_matrix(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        """Log-price predictions of every model for encoded rows, one predict call per model."""
+        predictions = {}
+        for name, model in self.models.items():
+            X_model = X
+            if name in self.columns:
+                index = self.columns[name]
+                X_model = np.where(index >= 0, X[:, np.maximum(index, 0)], 0.0)
+            predictions[name] = np.asarray(model.predict(X_model), dtype=np.float64)
+        return predictions
+
+    def record(self, latency: float, n_items: int):
+        with self.lock:
+            self.latencies.append(latency)
+            self.requests += 1
+            self.items += n_items
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            batches = np.array(self.batch_sizes)
+            elapsed = time.time() - self.started
+            return {
+                "requests": self.requests,
+                "items": self.items,
+                "p50_ms": float(np.percentile(latencies, 50)) if latencies.size else None,
+                "p99_ms": float(np.percentile(latencies, 99)) if latencies.size else None,
+                "requests_per_s": self.requests / elapsed if elapsed else 0.0,
+                "items_per_s": self.items / elapsed if elapsed else 0.0,
+                "mean_batch_items": float(batches.mean()) if batches.size else None,
+                "models": list(self.models),
+            }
+
+
+class MicroBatcher:
+    """
+    Collects requests from many threads and scores them together: a batch is
+    closed when it holds MAX_BATCH items or MAX_WAIT_MS after its first request.
+    """
+
+    def __init__(self, predictor: Predictor, max_batch: int = MAX_BATCH, max_wait_ms: float = MAX_WAIT_MS):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, items: List[Dict[str, Any]]) -> Future:
+        future = Future()
+        self.queue.put((items, future, time.perf_counter()))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            size = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch:
+                try:
+                    request = self.queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._score(batch)
+
+    def _score(self, batch):
+        # Encode each request on its own, so one bad request does not fail the batch.
+        valid, rows = [], []
+        for request in batch:
+            try:
+                rows.append(self.predictor.lookup.encode(request[0]))
+                valid.append(request)
+            except Exception as e:
+                request[1].set_exception(e)
+        if not valid:
+            return
+        X = np.vstack(rows)
+        try:
+            predictions = self.predictor.predict_matrix(X)
+        except Exception as e:
+            for _, future, _ in valid:
+                future.set_exception(e)
+            return
+        self.predictor.batch_sizes.append(len(X))
+        offset = 0
+        for request_items, future, submitted in valid:
+            n = len(request_items)
+            future.set_result({name: values[offset:offset + n] for name, values in predictions.items()})
+            offset += n
+            self.predictor.record(time.perf_counter() - submitted, n)
+
+
+def format_predictions(items: List[Dict[str, Any]], predictions: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Per item: the log price and the price (expm1) of every model."""
+    return [{**{k: v for k, v in item.items() if k != "traits"},
+             **{name: {"log_price": float(values[i]), "price": float(np.expm1(values[i]))}
+                for name, values in predictions.items()}}
+            for i, item in enumerate(items)]
+
+
+# === HTTP ===
+
+def make_handler(batcher: MicroBatcher):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: Dict[str, Any]):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "ok"})
+            elif self.path == "/stats":
+                self._send(200, batcher.predictor.stats())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                items = body["items"]
+                predictions = batcher.submit(items).result()
+            except (KeyError, ValueError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            except Exception as e:  # e.g. a model failing on the batch
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self._send(200, {"predictions": format_predictions(items, predictions)})
+
+        def log_message(self, format, *args):
+            pass  # one line per request would dominate the service time
+
+    return Handler
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default of 5 makes bursts of clients wait for SYN retries
+
+
+def serve(predictor: Predictor, host: str = HOST, port: int = PORT, max_batch: int = MAX_BATCH,
+          max_wait_ms: float = MAX_WAIT_MS):
+    batcher = MicroBatcher(predictor, max_batch, max_wait_ms)
+    server = PredictionServer((host, port), make_handler(batcher))
+    print(f"Serving {', '.join(predictor.models)} on http://{host}:{port} (POST /predict, GET /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(predictor.stats(), indent=2))
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Score NFT listings with the saved best_*.joblib models.")
+    parser.add_argument("command", choices=["serve", "predict"])
+    parser.add_argument("--models", nargs="+", help="model names to load (default: all best_*.joblib)")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--traits", default=TRAITS_CSV)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="serve: items per predict call (1 = no batching)")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--tokens", nargs="+", help="predict: token IDs to score")
+    parser.add_argument("--input", help="predict: JSON lines file of items ({token_id | traits, sale_month})")
+    parser.add_argument("--sale-month", help="predict: YYYY-MM used for --tokens")
+    args = parser.parse_args()
+
+    start = time.time()
+    traits = pl.read_csv(args.traits, schema_overrides={"token_id": pl.String}, infer_schema_length=None)
+    predictor = Predictor(load_models(args.model_dir, args.models), traits)
+    print(f"Loaded {len(predictor.models)} models and {len(predictor.lookup.tokens)} tokens "
+          f"in {time.time() - start:.1f}s", file=sys.stderr)
+
+    if args.command == "serve":
+        serve(predictor, args.host, args.port, args.max_batch, args.max_wait_ms)
+        return
+
+    items = [{"token_id": token, "sale_month": args.sale_month} for token in args.tokens or []]
+    if args.input:
+        with open(args.input) as f:
+            items += [json.loads(line) for line in f if line.strip()]
+    for i in range(0, len(items), MAX_BATCH):
+        batch = items[i:i + MAX_BATCH]
+        for row in format_predictions(batch, predictor.predict(batch)):
+            print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+k sweep of the address clustering in Transfer_clusters.ipynb.
+
+The features (transfers_out, transfers_in and the four sale role counts) come
+from the address index (address_index.py). The StandardScaler and a
+MiniBatchKMeans per k (k-means++ seeded, best of N_INIT restarts) are fitted
+chunk by chunk with partial_fit, and the ks are fitted in parallel. The
+silhouette of every k is estimated on one fixed sample, stratified by address
+activity; the sample and its pairwise distance matrix are computed once and
+shared by all ks. For every k the assignments are written as the notebook's
+cluster_<c>_features.csv files.
+
+    python address_clusters.py --k-min 2 --k-max 15
+"""
+import os
+import time
+import argparse
+from typing import Any, Dict, Iterator, List, Tuple
+import numpy as np
+import polars as pl
+from joblib import Parallel, delayed
+from sklearn.preprocessing import StandardScaler
+from sklearn.cluster import MiniBatchKMeans, kmeans_plusplus
+from sklearn.metrics import pairwise_distances, silhouette_samples
+
+from address_index import AddressIndex, INDEX_DIR, TABLES_DIR, build_index
+
+# === Configuration ===
+
+OUTPUT_DIR = "address_clusters"  # k<k>/cluster_<c>_features.csv, cluster_sweep.csv
+RNG = 42  # as KMeans(random_state=42) in the notebook
+K_MIN, K_MAX = 2, 15
+CHUNK_SIZE = 4096  # rows per partial_fit call
+EPOCHS = 5  # passes over the chunks per k
+N_INIT = 5  # restarts per k, the lowest inertia is kept (partial_fit itself seeds once)
+SILHOUETTE_SAMPLE = 3000  # addresses in the silhouette sample
+STRATA = 10  # activity quantile bins the sample is drawn from
+TAIL_QUANTILE = 0.999  # addresses above this activity quantile are always in the sample
+N_JOBS = os.cpu_count() or 1
+
+
+def chunks(n: int, chunk_size: int, rng: np.random.Generator = None) -> Iterator[slice]:
+    """Row slices of at most chunk_size rows, in shuffled order when rng is given."""
+    starts = np.arange(0, n, chunk_size)
+    if rng is not None:
+        starts = rng.permutation(starts)
+    for start in starts:
+        yield slice(int(start), int(min(start + chunk_size, n)))
+
+
+def fit_scaler(X: np.ndarray, chunk_size: int = CHUNK_SIZE) -> StandardScaler:
+    scaler = StandardScaler()
+    for rows in chunks(len(X), chunk_size):
+        scaler.partial_fit(X[rows])
+    return scaler
+
+
+def stratified_sample(activity: np.ndarray, size: int = SILHOUETTE_SAMPLE, strata: int = STRATA,
+                      seed: int = RNG) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sorted row indices of the silhouette sample and their weights. The most
+    active addresses (above TAIL_QUANTILE) are all taken, since they often form
+    clusters of their own; the rest is drawn proportionally from activity
+    quantile bins and weighted by the inverse of its inclusion probability.
+    """
+    if size >= len(activity):
+        return np.arange(len(activity)), np.ones(len(activity))
+    tail = activity > np.quantile(activity, TAIL_QUANTILE)
+    rest = np.flatnonzero(~tail)
+    edges = np.unique(np.quantile(activity[rest], np.linspace(0, 1, strata + 1)))
+    bins = np.searchsorted(edges[1:-1], activity[rest], side="right")
+    rng = np.random.default_rng(seed)
+    picked, weights = [np.flatnonzero(tail)], [np.ones(int(tail.sum()))]
+    budget = max(size - int(tail.sum()), strata)
+    for b in np.unique(bins):
+        members = rest[bins == b]
+        take = min(max(1, round(budget * len(members) / len(rest))), len(members))
+        picked.append(rng.choice(members, size=take, replace=False))
+        weights.append(np.full(take, len(members) / take))
+    order = np.argsort(np.concatenate(picked))
+    return np.concatenate(picked)[order], np.concatenate(weights)[order]
+
+
+def fit_k(k: int, X: np.ndarray, chunk_size: int = CHUNK_SIZE, epochs: int = EPOCHS,
+          n_init: int = N_INIT) -> Dict[str, Any]:
+    """Pool task: MiniBatchKMeans for one k, fitted and applied chunk by chunk; best of n_init restarts."""
+    start = time.time()
+    best = None
+    for restart in range(n_init):
+        # k-means++ seeds over all rows, and no reassignment of small clusters: the few very active
+        # addresses form their own clusters, as with the notebook's full KMeans.
+        centers, _ = kmeans_plusplus(X, k, random_state=RNG + restart)
+        model = MiniBatchKMeans(n_clusters=k, init=centers, n_init=1, batch_size=chunk_size,
+                                reassignment_ratio=0.0, random_state=RNG + restart)
+        rng = np.random.default_rng(RNG + restart)
+        for _ in range(epochs):
+            for rows in chunks(len(X), chunk_size, rng):
+                model.partial_fit(X[rows])
+        labels = np.empty(len(X), dtype=np.int32)
+        inertia = 0.0
+        for rows in chunks(len(X), chunk_size):
+            labels[rows] = model.predict(X[rows])
+            inertia += float(((X[rows] - model.cluster_centers_[labels[rows]]) ** 2).sum())
+        if best is None or inertia < best["inertia"]:
+            best = {"k": k, "labels": labels, "centers": model.cluster_centers_, "inertia": inertia}
+    best["seconds"] = time.time() - start
+    return best
+
+
+def write_clusters(features: pl.DataFrame, labels: np.ndarray, out_dir: str):
+    """cluster_<c>_features.csv per cluster, as the notebook writes cluster_2_features.csv."""
+    os.makedirs(out_dir, exist_ok=True)
+    assigned = features.with_columns(pl.Series("cluster", labels))
+    for (cluster,), part in assigned.partition_by("cluster", as_dict=True).items():
+        part.write_csv(os.path.join(out_dir, f"cluster_{cluster}_features.csv"))
+
+
+def sweep(features: pl.DataFrame, ks: List[int], out_dir: str = OUTPUT_DIR, n_jobs: int = N_JOBS,
+          sample_size: int = SILHOUETTE_SAMPLE) -> pl.DataFrame:
+    """Fit every k, score it on the shared silhouette sample and write its clusters; returns the summary."""
+    X = features.drop("address").to_numpy().astype(np.float64)
+    scaler = fit_scaler(X)
+    X_scaled = np.vstack([scaler.transform(X[rows]) for rows in chunks(len(X), CHUNK_SIZE)])
+
+    sample, weights = stratified_sample(np.log1p(X.sum(axis=1)), sample_size)
+    distances = pairwise_distances(X_scaled[sample])  # shared by the silhouette of every k
+    print(f"{len(X)} addresses, {X.shape[1]} features; silhouette sample of {len(sample)}")
+
+    fits = Parallel(n_jobs=n_jobs)(delayed(fit_k)(k, X_scaled) for k in ks)
+    rows = []
+    for fit in sorted(fits, key=lambda f: f["k"]):
+        k, labels = fit["k"], fit["labels"]
+        sizes = np.bincount(labels, minlength=k)
+        silhouette = np.average(silhouette_samples(distances, labels[sample], metric="precomputed"),
+                                weights=weights) if len(np.unique(labels[sample])) > 1 else float("nan")
+        write_clusters(features, labels, os.path.join(out_dir, f"k{k}"))
+        pl.DataFrame(scaler.inverse_transform(fit["centers"]), schema=features.columns[1:], orient="row") \
+            .with_row_index("cluster").write_csv(os.path.join(out_dir, f"k{k}", "centroids.csv"))
+        rows.append({"k": k, "inertia": fit["inertia"], "silhouette_sample": float(silhouette),
+                     "min_cluster": int(sizes.min()), "max_cluster": int(sizes.max()), "fit_seconds": fit["seconds"]})
+        print(f"k={k:>2}: inertia={fit['inertia']:.1f} silhouette={silhouette:.4f} sizes={sizes.tolist()}")
+    summary = pl.DataFrame(rows)
+    summary.write_csv(os.path.join(out_dir, "cluster_sweep.csv"))
+    return summary
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep MiniBatchKMeans over k for the address features.")
+    parser.add_argument("--k-min", type=int, default=K_MIN)
+    parser.add_argument("--k-max", type=int, default=K_MAX)
+    parser.add_argument("--index", default=INDEX_DIR)
+    parser.add_argument("--tables", default=TABLES_DIR, help="df_table1/2.csv, used when the index is missing")
+    parser.add_argument("--out", default=OUTPUT_DIR)
+    parser.add_argument("--sample", type=int, default=SILHOUETTE_SAMPLE)
+    parser.add_argument("--n-jobs", type=int, default=N_JOBS)
+    args = parser.parse_args()
+
+    start = time.time()
+    if not os.path.exists(os.path.join(args.index, "meta.json")):
+        build_index(os.path.join(args.tables, "df_table1.csv"), os.path.join(args.tables, "df_table2.csv"), args.index)
+    features = AddressIndex.load(args.index).features()
+    os.makedirs(args.out, exist_ok=True)
+    sweep(features, list(range(args.k_min, args.k_max + 1)), args.out, args.n_jobs, args.sample)
+    print(f"Sweep finished in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Address index over df_table2 (transfers) and df_table1 (sale roles) for
+Transfer_clusters.ipynb.
+
+Addresses get integer IDs (their position in the sorted address array).
+Transfers are stored twice as CSR adjacency, out-edges by sender and in-edges by
+receiver, each edge with its counterpart, token ID and timestamp and sorted by
+(token, timestamp) within an address. Each sale role column of df_table1 is a
+CSR array from address to the df_table1 rows holding it. All arrays are .npy
+files and are memory-mapped on load, so per-address lookups read only that
+address' slice: O(log n) for the ID, then O(degree).
+
+    python address_index.py build
+    python address_index.py query 0x2c2ed4b3876c442fee80bee76ce0ee2ca2a512af
+
+    from address_index import AddressIndex
+    index = AddressIndex.load()
+    index.counts("0x2c2e...")       # the notebook's per-column counts
+    index.cycles("0x2c2e...", max_hops=3, window=7 * 86400)
+"""
+import os
+import json
+import time
+import argparse
+from typing import Any, Dict, List, Optional
+import numpy as np
+import polars as pl
+
+# === Configuration ===
+
+TABLES_DIR = os.path.join("..", "Analysis", "Final_Models")  # df_table1.csv, df_table2.csv
+INDEX_DIR = "address_index"
+ROLE_COLS = ["buyer_n-1_sale", "buyer_n_sale", "seller_n-1_sale", "seller_n_sale"]
+TRANSFER_SCHEMA = {"token_id": pl.Int64, "transfer_from": pl.String, "transfer_to": pl.String,
+                   "event_timestamp": pl.Int64}
+
+
+def _csr(keys: np.ndarray, n: int, *columns: np.ndarray):
+    """indptr over n keys plus the columns in key order (the columns are already sorted within a key)."""
+    order = np.argsort(keys, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return (indptr,) + tuple(c[order] for c in columns)
+
+
+def build_index(table1_path: str, table2_path: str, index_dir: str = INDEX_DIR) -> Dict[str, Any]:
+    """Write the index arrays and meta.json to index_dir; returns the meta."""
+    transfers = (pl.read_csv(table2_path, schema_overrides=TRANSFER_SCHEMA)
+                 .drop_nulls(["transfer_from", "transfer_to"])
+                 .sort(["token_id", "event_timestamp"], maintain_order=True))
+    table1 = pl.read_csv(table1_path, schema_overrides={"token_id": pl.Int64} | {c: pl.String for c in ROLE_COLS},
+                         infer_schema_length=None)
+    roles = [c for c in ROLE_COLS if c in table1.columns]
+
+    addresses = pl.concat([transfers["transfer_from"], transfers["transfer_to"]]
+                          + [table1[c] for c in roles]).drop_nulls().unique().sort()
+    to_id = dict(zip(addresses.to_list(), range(len(addresses))))
+    n = len(addresses)
+
+    src = np.array([to_id[a] for a in transfers["transfer_from"].to_list()], dtype=np.int32)
+    dst = np.array([to_id[a] for a in transfers["transfer_to"].to_list()], dtype=np.int32)
+    token = transfers["token_id"].to_numpy()
+    ts = transfers["event_timestamp"].to_numpy()
+    arrays = {"addresses": np.array(addresses.to_list(), dtype=f"S{max(addresses.str.len_bytes().max() or 1, 1)}"),
+              "table1_token": table1["token_id"].to_numpy()}
+    # Edges are already in (token, timestamp) order, and the stable sort keeps that within an address.
+    arrays["out_indptr"], arrays["out_dst"], arrays["out_token"], arrays["out_ts"] = _csr(src, n, dst, token, ts)
+    arrays["in_indptr"], arrays["in_src"], arrays["in_token"], arrays["in_ts"] = _csr(dst, n, src, token, ts)
+    for role in roles:
+        held = table1[role].to_list()
+        rows = np.array([i for i, a in enumerate(held) if a is not None], dtype=np.int32)
+        keys = np.array([to_id[held[i]] for i in rows], dtype=np.int64)
+        arrays[f"role.{role}.indptr"], arrays[f"role.{role}.row"] = _csr(keys, n, rows)
+
+    os.makedirs(index_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(index_dir, f"{name}.npy"), array)
+    meta = {"n_addresses": n, "n_transfers": len(src), "n_sales": table1.height, "roles": roles,
+            "sources": {os.path.basename(p): os.path.getsize(p) for p in (table1_path, table2_path)}}
+    with open(os.path.join(index_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class AddressIndex:
+    """Read side of the index; every array is a read-only memory map."""
+
+    def __init__(self, index_dir: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        self.index_dir = index_dir
+        self.meta = meta
+        self.roles = meta["roles"]
+        self.addresses = arrays["addresses"]
+        self.table1_token = arrays["table1_token"]
+        self.out_indptr, self.out_dst = arrays["out_indptr"], arrays["out_dst"]
+        self.out_token, self.out_ts = arrays["out_token"], arrays["out_ts"]
+        self.in_indptr, self.in_src = arrays["in_indptr"], arrays["in_src"]
+        self.in_token, self.in_ts = arrays["in_token"], arrays["in_ts"]
+        self.role_indptr = {r: arrays[f"role.{r}.indptr"] for r in self.roles}
+        self.role_row = {r: arrays[f"role.{r}.row"] for r in self.roles}
+
+    @classmethod
+    def load(cls, index_dir: str = INDEX_DIR, mmap: bool = True) -> "AddressIndex":
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {name[:-len(".npy")]: np.load(os.path.join(index_dir, name), mmap_mode="r" if mmap else None)
+                  for name in os.listdir(index_dir) if name.endswith(".npy")}
+        return cls(index_dir, arrays, meta)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    # --- IDs ---
+
+    def id(self, address: str) -> int:
+        """Integer ID of an address, -1 if it is not in the index."""
+        key = address.encode()
+        i = int(np.searchsorted(self.addresses, key))
+        return i if i < len(self.addresses) and self.addresses[i] == key else -1
+
+    def address(self, i: int) -> str:
+        return self.addresses[i].decode()
+
+    def _require(self, address: str) -> int:
+        i = self.id(address)
+        if i < 0:
+            raise KeyError(f"address {address} is not in the index")
+        return i
+
+    # --- Per-address lookups ---
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.out_indptr)
+
+    def in_degree(self) -> np.ndarray:
+        return np.diff(self.in_indptr)
+
+    def role_counts(self) -> Dict[str, np.ndarray]:
+        return {role: np.diff(indptr) for role, indptr in self.role_indptr.items()}
+
+    def transfers(self, address: str, direction: str = "out") -> pl.DataFrame:
+        """df_table2 rows sent ("out") or received ("in") by an address, by token and timestamp."""
+        i = self._require(address)
+        if direction == "out":
+            s, e = self.out_indptr[i], self.out_indptr[i + 1]
+            other = [self.address(j) for j in self.out_dst[s:e]]
+            sender, receiver = [address] * len(other), other
+            token, ts = self.out_token[s:e], self.out_ts[s:e]
+        else:
+            s, e = self.in_indptr[i], self.in_indptr[i + 1]
+            other = [self.address(j) for j in self.in_src[s:e]]
+            sender, receiver = other, [address] * len(other)
+            token, ts = self.in_token[s:e], self.in_ts[s:e]
+        return pl.DataFrame({"token_id": np.asarray(token), "transfer_from": sender, "transfer_to": receiver,
+                             "event_timestamp": np.asarray(ts)}, schema=TRANSFER_SCHEMA)
+
+    def sales(self, address: str) -> pl.DataFrame:
+        """(role, df_table1 row, token_id) for every sale role the address holds."""
+        i = self._require(address)
+        parts = []
+        for role in self.roles:
+            rows = np.asarray(self.role_row[role][self.role_indptr[role][i]:self.role_indptr[role][i + 1]])
+            parts.append(pl.DataFrame({"role": [role] * len(rows), "row": rows, "token_id": self.table1_token[rows]},
+                                      schema={"role": pl.String, "row": pl.Int32, "token_id": pl.Int64}))
+        return pl.concat(parts)
+
+    def counts(self, address: str) -> Dict[str, int]:
+        """Appearances in transfer_from / transfer_to and each role column (0 for unknown addresses)."""
+        i = self.id(address)
+        if i < 0:
+            return {"transfer_from": 0, "transfer_to": 0, **{role: 0 for role in self.roles}}
+        return {"transfer_from": int(self.out_indptr[i + 1] - self.out_indptr[i]),
+                "transfer_to": int(self.in_indptr[i + 1] - self.in_indptr[i]),
+                **{role: int(p[i + 1] - p[i]) for role, p in self.role_indptr.items()}}
+
+    def features(self) -> pl.DataFrame:
+        """
+        The clustering features of Transfer_clusters.ipynb, one row per address
+        in sorted order: transfers_out, transfers_in and <role>_count.
+        """
+        return pl.DataFrame({"address": np.char.decode(np.asarray(self.addresses)),
+                             "transfers_out": self.out_degree(), "transfers_in": self.in_degree(),
+                             **{f"{role}_count": c for role, c in self.role_counts().items()}})
+
+    # --- Graph queries ---
+
+    def neighbors(self, address: str, hops: int = 1, direction: str = "both") -> pl.DataFrame:
+        """Addresses within `hops` transfers (breadth-first), with their distance."""
+        start = self._require(address)
+        seen = {start: 0}
+        frontier = np.array([start])
+        for hop in range(1, hops + 1):
+            found = []
+            if direction in ("out", "both"):
+                found += [self.out_dst[self.out_indptr[v]:self.out_indptr[v + 1]] for v in frontier]
+            if direction in ("in", "both"):
+                found += [self.in_src[self.in_indptr[v]:self.in_indptr[v + 1]] for v in frontier]
+            reached = np.unique(np.concatenate(found)) if found else np.array([], dtype=np.int32)
+            frontier = np.array([v for v in reached if v not in seen], dtype=np.int64)
+            seen.update((int(v), hop) for v in frontier)
+            if not len(frontier):
+                break
+        del seen[start]
+        return pl.DataFrame({"address": [self.address(v) for v in seen], "hops": list(seen.values())},
+                            schema={"address": pl.String, "hops": pl.Int64}).sort(["hops", "address"])
+
+    def _next_edges(self, v: int, token: int, after: int) -> range:
+        """Edges of v sending `token` at or after `after` (one binary search per sorted key)."""
+        s, e = int(self.out_indptr[v]), int(self.out_indptr[v + 1])
+        tokens = self.out_token[s:e]
+        lo, hi = np.searchsorted(tokens, token, "left"), np.searchsorted(tokens, token, "right")
+        first = np.searchsorted(self.out_ts[s + lo:s + hi], after, "left")
+        return range(s + lo + int(first), s + int(hi))
+
+    def _cycles(self, start: int, max_hops: int, window: Optional[int]) -> List[tuple]:
+        found = []
+
+        def walk(v, token, path, times):
+            for edge in self._next_edges(v, token, times[-1]):
+                if window is not None and self.out_ts[edge] - times[0] > window:
+                    break
+                w = int(self.out_dst[edge])
+                if w == start:
+                    found.append((token, path + [w], times[0], int(self.out_ts[edge])))
+                elif len(path) < max_hops and w not in path:
+                    walk(w, token, path + [w], times + [int(self.out_ts[edge])])
+
+        for edge in range(int(self.out_indptr[start]), int(self.out_indptr[start + 1])):
+            w = int(self.out_dst[edge])
+            if w != start and max_hops >= 2:
+                walk(w, int(self.out_token[edge]), [start, w], [int(self.out_ts[edge])])
+        return found
+
+    def _cycle_frame(self, found: List[tuple]) -> pl.DataFrame:
+        return pl.DataFrame({"token_id": [f[0] for f in found],
+                             "path": [[self.address(v) for v in f[1]] for f in found],
+                             "hops": [len(f[1]) - 1 for f in found],
+                             "start_timestamp": [f[2] for f in found], "end_timestamp": [f[3] for f in found]},
+                            schema={"token_id": pl.Int64, "path": pl.List(pl.String), "hops": pl.Int64,
+                                    "start_timestamp": pl.Int64, "end_timestamp": pl.Int64})
+
+    def cycles(self, address: str, max_hops: int = 3, window: Optional[int] = None) -> pl.DataFrame:
+        """
+        Wash-trade cycles starting at an address: one token passed along
+        transfers in time order and returned to the address within max_hops
+        transfers (and within `window` seconds of the first one).
+        """
+        return self._cycle_frame(self._cycles(self._require(address), max_hops, window))
+
+    def wash_cycles(self, max_hops: int = 3, window: Optional[int] = None) -> pl.DataFrame:
+        """cycles() of every address that both sends and receives."""
+        candidates = np.flatnonzero((self.out_degree() > 0) & (self.in_degree() > 0))
+        return self._cycle_frame([c for i in candidates for c in self._cycles(int(i), max_hops, window)])
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the address index.")
+    parser.add_argument("command", choices=["build", "query", "cycles"])
+    parser.add_argument("address", nargs="?")
+    parser.add_argument("--tables", default=TABLES_DIR)
+    parser.add_argument("--index", default=INDEX_DIR)
+    parser.add_argument("--hops", type=int, default=3, help="query: neighborhood radius; cycles: max transfers")
+    parser.add_argument("--window", type=int, help="cycles: max seconds between first and last transfer")
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.command == "build":
+        meta = build_index(os.path.join(args.tables, "df_table1.csv"), os.path.join(args.tables, "df_table2.csv"),
+                           args.index)
+        print(f"Indexed {meta['n_addresses']} addresses, {meta['n_transfers']} transfers and "
+              f"{meta['n_sales']} sales in {time.time() - start:.2f}s")
+        return
+
+    index = AddressIndex.load(args.index)
+    if args.command == "query":
+        if not args.address:
+            parser.error("query needs an address")
+        print(json.dumps(index.counts(args.address), indent=2))
+        if index.id(args.address) >= 0:
+            print(index.transfers(args.address, "out"))
+            print(index.transfers(args.address, "in"))
+            print(index.sales(args.address))
+            print(index.neighbors(args.address, args.hops))
+    else:
+        cycles = index.cycles(args.address, args.hops, args.window) if args.address \
+            else index.wash_cycles(args.hops, args.window)
+        print(cycles)
+    print(f"Done in {time.time() - start:.3f}s")
+
+if __name__ == "__main__":
+    main()
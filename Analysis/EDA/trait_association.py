@@ -0,0 +1,130 @@
+"""
+Frequent trait itemsets for Distribution_association.ipynb without the dense
+TransactionEncoder matrix and mlxtend's apriori.
+
+Each (type, value) trait is a packed bitset over the tokens (one bit per token,
+uint64 words). Itemsets are mined depth-first (Eclat): the bitset of an itemset
+is ANDed with the bitsets of all its candidate extensions at once, and the
+supports come from a vectorized popcount. The result has the same
+support / itemsets / length columns as apriori(use_colnames=True) plus the
+notebook's length column.
+
+    python trait_association.py --input full_nft_details.json --min-support 0.001
+"""
+import time
+import json
+import argparse
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import polars as pl
+
+# === Configuration ===
+
+INPUT = "full_nft_details.json"  # OpenSea NFT details (nfts[].traits) or a wide trait table such as df_table3.csv
+OUTPUT = "frequent_trait_itemsets.csv"
+MIN_SUPPORT = 0.01  # as apriori(min_support=0.01) in the notebook
+TRAIT_COLS = ["Background", "Clothes", "Earring", "Eyes", "Fur", "Hat", "Mouth"]  # wide tables only
+
+
+# === Loading ===
+
+def load_traits(path: str) -> pl.DataFrame:
+    """Long (token_id, type, value) table from the NFT details JSON or a wide trait CSV."""
+    if path.endswith(".json"):
+        with open(path) as f:
+            nfts = json.load(f)["nfts"]
+        rows = [(str(nft["token_id"]), str(t["type"]), str(t["value"])) for nft in nfts for t in nft.get("traits") or []]
+        return pl.DataFrame(rows, schema=["token_id", "type", "value"], orient="row")
+    wide = pl.read_csv(path, schema_overrides={"token_id": pl.String}, infer_schema_length=None)
+    return (wide.select(["token_id"] + [c for c in TRAIT_COLS if c in wide.columns])
+            .unpivot(index="token_id", variable_name="type", value_name="value")
+            .drop_nulls("value")
+            .with_columns(pl.col("value").cast(pl.String)))
+
+
+def encode_bitsets(traits: pl.DataFrame) -> Tuple[List[Tuple[str, str]], np.ndarray, int]:
+    """
+    Sorted (type, value) items (the TransactionEncoder column order), their
+    packed token bitsets (n_items x n_words uint64) and the number of tokens.
+    """
+    token_ids = traits["token_id"].to_list()
+    pairs = list(zip(traits["type"].to_list(), traits["value"].to_list()))
+    token_idx = {token: i for i, token in enumerate(dict.fromkeys(token_ids))}
+    items = sorted(set(pairs))
+    item_idx = {item: i for i, item in enumerate(items)}
+    n_tokens = len(token_idx)
+    dense = np.zeros((len(items), n_tokens), dtype=bool)
+    dense[[item_idx[p] for p in pairs], [token_idx[t] for t in token_ids]] = True
+    n_words = (n_tokens + 63) // 64
+    packed = np.packbits(dense, axis=1, bitorder="little")
+    packed = np.pad(packed, ((0, 0), (0, n_words * 8 - packed.shape[1])))
+    return items, packed.view(np.uint64), n_tokens
+
+
+# === Mining ===
+
+def popcount(bits: np.ndarray) -> np.ndarray:
+    """Set bits per row of a (rows x words) uint64 array."""
+    return np.bitwise_count(bits).sum(axis=1, dtype=np.int64)
+
+
+def eclat(bits: np.ndarray, min_count: int, max_len: Optional[int] = None) -> List[Tuple[Tuple[int, ...], int]]:
+    """(item indices, count) of every itemset contained in at least min_count tokens."""
+    found = []
+    counts = popcount(bits)
+    frequent = np.flatnonzero(counts >= min_count)
+
+    def extend(prefix, ids, sets, set_counts):
+        for k in range(len(ids)):
+            itemset = prefix + (int(ids[k]),)
+            found.append((itemset, int(set_counts[k])))
+            if k + 1 == len(ids) or (max_len is not None and len(itemset) >= max_len):
+                continue
+            joined = sets[k] & sets[k + 1:]
+            joined_counts = popcount(joined)
+            keep = joined_counts >= min_count
+            if keep.any():
+                extend(itemset, ids[k + 1:][keep], joined[keep], joined_counts[keep])
+
+    extend((), frequent, bits[frequent], counts[frequent])
+    return found
+
+
+def frequent_itemsets(items: List[Tuple[str, str]], bits: np.ndarray, n_tokens: int,
+                      min_support: float = MIN_SUPPORT, max_len: Optional[int] = None) -> pd.DataFrame:
+    """support / itemsets / length table, ordered by length and item order as in mlxtend's apriori."""
+    min_count = int(np.ceil(min_support * n_tokens - 1e-9))
+    found = sorted(eclat(bits, max(min_count, 1), max_len), key=lambda f: (len(f[0]), f[0]))
+    return pd.DataFrame({
+        "support": [count / n_tokens for _, count in found],
+        "itemsets": [frozenset(items[i] for i in itemset) for itemset, _ in found],
+        "length": [len(itemset) for itemset, _ in found],
+    })
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine frequent trait itemsets with packed bitsets.")
+    parser.add_argument("--input", default=INPUT)
+    parser.add_argument("--out", default=OUTPUT)
+    parser.add_argument("--min-support", type=float, default=MIN_SUPPORT)
+    parser.add_argument("--max-len", type=int)
+    args = parser.parse_args()
+
+    start = time.time()
+    items, bits, n_tokens = encode_bitsets(load_traits(args.input))
+    print(f"Encoded {len(items)} traits over {n_tokens} tokens in {time.time() - start:.2f}s")
+
+    start = time.time()
+    itemsets = frequent_itemsets(items, bits, n_tokens, args.min_support, args.max_len)
+    print(f"Found {len(itemsets)} itemsets with support >= {args.min_support} in {time.time() - start:.2f}s")
+    print(itemsets.groupby("length").size().to_string())
+    print(itemsets.sort_values(by="support", ascending=False).head(10))
+
+    itemsets.assign(itemsets=itemsets["itemsets"].map(lambda s: " & ".join(f"{t}={v}" for t, v in sorted(s)))) \
+        .to_csv(args.out, index=False)
+
+if __name__ == "__main__":
+    main()
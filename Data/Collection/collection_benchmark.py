@@ -0,0 +1,176 @@
+"""
+Throughput benchmark of the collection scrapers against the local mock API (mock_api.py).
+
+Each run starts a fresh mock server with the given fault profile, points
+nft_event_offer.py (async or thread mode) or Etherscan_User.py at it and
+collects a synthetic set of tokens / addresses into a temporary directory.
+Reported per run: time to completion, pages/s, requests and retries, the
+throttled / unauthorized / failed requests, and the scraper's own time split
+(scrape_metrics.py): seconds spent waiting for a key slot, on the network,
+decoding JSON, writing to disk and sleeping in retry backoff.
+
+Numeric options take several values; every combination is run:
+
+    python collection_benchmark.py --scraper opensea-async --concurrency 4 16 64 --p429 0 0.05
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import tempfile
+import contextlib
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "nft_transaction_data"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_address_data"))
+
+from mock_api import FaultProfile, MockServer
+from scrape_metrics import PHASES
+
+# === Configuration ===
+
+SCRAPERS = ["opensea-async", "opensea-threads", "etherscan"]
+RESULTS = "collection_benchmark.jsonl"  # one JSON line per run is appended here
+ITEMS = 50  # tokens (OpenSea) or addresses (Etherscan) per run
+KEYS = 3  # API keys per run
+CLIENT_RATE = 50.0  # API_RATE_LIMIT of the scraper, requests per second per key
+CONCURRENCY = 16  # MAX_CONCURRENCY (async mode)
+REQUEST_TIMEOUT = 2.0  # scraper request timeout; injected hangs last longer than this
+RETRY_DELAY = 0.5  # scraper backoff after a failed request
+PHASE_REPORT = [f"{phase}_s" for phase in PHASES]  # thread-seconds per phase, from the scraper's metrics
+
+
+def run_once(scraper: str, workdir: str, items: int, keys: int, client_rate: float, concurrency: int,
+             request_timeout: float, retry_delay: float, faults: FaultProfile,
+             data_options: Dict[str, int]) -> Dict[str, Any]:
+    """One collection run against a fresh mock server; returns the measurements."""
+    os.makedirs(workdir, exist_ok=True)
+    api_keys = [f"bench_key_{i:02d}" for i in range(keys)]
+    with MockServer(faults, **data_options) as server:
+        if scraper.startswith("opensea"):
+            import nft_event_offer as module
+            module.EVENTS_BASE_URL = server.opensea_url
+            module.OUTPUT_DIR_FORMAT = os.path.join(workdir, "NFT_Event_{}")
+            module.USE_ASYNC = scraper == "opensea-async"
+            module.MAX_CONCURRENCY = concurrency
+            module.METRICS_DIR = workdir
+            work = [{"token_id": str(i)} for i in range(items)]
+            api = "opensea"
+        else:
+            import Etherscan_User as module
+            module.BASE_URL = server.etherscan_url
+            module.OUTPUT_DIR = workdir
+            work = [f"0x{i:040x}" for i in range(items)]
+            api = "etherscan"
+        module.API_KEYS = api_keys
+        module.API_RATE_LIMIT = client_rate
+        module.REQUEST_TIMEOUT = request_timeout
+        module.RETRY_DELAY = retry_delay
+        module.VERBOSE = False
+
+        log = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            result = module.collect(work)
+        seconds = time.perf_counter() - start
+        counters = server.state.stats()
+
+    failed = result.failed_tokens if api == "opensea" else result.failed_addresses
+    keys_summary = result.key_pool.summary().values()
+    phases = result.metrics.snapshot()["histograms"].get("phase_seconds", {})
+    pages, requests = counters.get(f"{api}.pages", 0), counters.get(f"{api}.requests", 0)
+    return {
+        "seconds": round(seconds, 3),
+        "completed": len(result.processed),
+        "failed": len(failed),
+        "requests": requests,
+        "pages": pages,
+        "records": counters.get(f"{api}.records", 0),
+        "retries": requests - pages,
+        "pages_per_s": round(pages / seconds, 2) if seconds else 0.0,
+        "throttled": counters.get(f"{api}.429", 0),
+        "unauthorized": counters.get(f"{api}.401", 0),
+        "timeouts": counters.get(f"{api}.timeout", 0),
+        "resets": counters.get(f"{api}.reset", 0),
+        "client_errors": sum(s["errors"] for s in keys_summary),
+        "disabled_keys": sum(s["disabled"] for s in keys_summary),
+        "worker_utilization": result.metrics.utilization(),
+        **{f"{phase}_s": round(phases.get(f"phase={phase}", {}).get("sum", 0.0), 3) for phase in PHASES},
+    }
+
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str]):
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).rjust(w) for c, w in zip(columns, widths)))
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the collection scrapers against the local mock API.")
+    parser.add_argument("--scraper", nargs="+", choices=SCRAPERS, default=["opensea-async"])
+    parser.add_argument("--items", type=int, nargs="+", default=[ITEMS])
+    parser.add_argument("--keys", type=int, nargs="+", default=[KEYS])
+    parser.add_argument("--client-rate", type=float, nargs="+", default=[CLIENT_RATE],
+                        help="API_RATE_LIMIT of the scraper (requests/s per key)")
+    parser.add_argument("--server-rate", type=float, nargs="+", default=[None],
+                        help="rate limit enforced by the mock server (requests/s per key)")
+    parser.add_argument("--burst", type=float, nargs="+", default=[None],
+                        help="requests a key may send at once on the mock server (default: one second's worth)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[CONCURRENCY])
+    parser.add_argument("--p429", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--retry-after", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--p401", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--p-timeout", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--p-reset", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, nargs="+", default=[20.0])
+    parser.add_argument("--request-timeout", type=float, nargs="+", default=[REQUEST_TIMEOUT])
+    parser.add_argument("--retry-delay", type=float, nargs="+", default=[RETRY_DELAY])
+    parser.add_argument("--events-per-token", type=int, default=120)
+    parser.add_argument("--txs-per-address", type=int, default=150)
+    parser.add_argument("--out", default=RESULTS)
+    args = parser.parse_args()
+
+    sweep = {name: getattr(args, name) for name in
+             ["scraper", "items", "keys", "client_rate", "server_rate", "burst", "concurrency", "p429", "retry_after",
+              "p401", "p_timeout", "p_reset", "latency_ms", "request_timeout", "retry_delay"]}
+    varied = [name for name, values in sweep.items() if len(values) > 1] or ["scraper"]
+    out_path = os.path.abspath(args.out)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)  # Etherscan_User.py creates its output folder on import
+        try:
+            for n, values in enumerate(itertools.product(*sweep.values())):
+                params = dict(zip(sweep, values))
+                faults = FaultProfile(rate_limit=params["server_rate"], burst=params["burst"], p429=params["p429"],
+                                      retry_after=params["retry_after"], p401=params["p401"],
+                                      p_timeout=params["p_timeout"], hang_seconds=params["request_timeout"] + 1,
+                                      p_reset=params["p_reset"], latency=args.latency, latency_ms=params["latency_ms"])
+                result = run_once(params["scraper"], os.path.join(tmp, f"run_{n}"), params["items"], params["keys"],
+                                  params["client_rate"], params["concurrency"], params["request_timeout"],
+                                  params["retry_delay"], faults, {"events_per_token": args.events_per_token,
+                                                                  "txs_per_address": args.txs_per_address})
+                row = {**params, **result}
+                rows.append(row)
+                print(f"run {n + 1}: " + ", ".join(f"{k}={row[k]}" for k in varied) +
+                      f" -> {row['seconds']}s, {row['pages_per_s']} pages/s, {row['retries']} retries")
+                with open(out_path, "a") as f:
+                    f.write(json.dumps({"timestamp": time.time(), **row}) + "\n")
+        finally:
+            os.chdir(cwd)
+
+    print()
+    print_table(rows, varied + ["seconds", "completed", "failed", "pages", "pages_per_s", "requests", "retries",
+                                "throttled", "unauthorized", "timeouts", "resets"] + PHASE_REPORT)
+    print(f"\nResults appended to {out_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import io
+import os
+import gzip
+import json
+import shutil
+from typing import Any, Dict, Iterator, List, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstandard is only needed for the "zstd" storage format
+    zstandard = None
+
+from page_checkpoint import PageCheckpoint
+
+# "json": one indent=2 JSON document per item (the original format)
+# "gzip" / "zstd": newline-delimited records, compressed page by page
+STORAGE_FORMATS = {"json": ".json", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+
+def _compressor(storage_format: str):
+    if storage_format == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=6)
+    if storage_format == "zstd":
+        if zstandard is None:
+            raise RuntimeError('The "zstd" storage format requires zstandard: pip install zstandard')
+        return zstandard.ZstdCompressor(level=10).compress
+    raise ValueError(f"Unknown storage format: {storage_format}")
+
+
+class JsonPageSink:
+    """
+    Collects the pages of one item in memory and writes the original
+    indent=2 JSON document. Pages are checkpointed with their records.
+    """
+
+    def __init__(self, path: str, item: str, checkpoints: PageCheckpoint):
+        self.path = path
+        self.item = item
+        self.checkpoints = checkpoints
+        self.records = []
+
+    @property
+    def count(self) -> int:
+        return len(self.records)
+
+    def resume(self) -> Tuple[Any, int, bool]:
+        """Restore the checkpointed pages. Returns (next_cursor, pages_done, complete)."""
+        self.records, cursor, pages, complete, _ = self.checkpoints.load(self.item)
+        return cursor, pages, complete
+
+    def add_page(self, records: List[Any], next_cursor: Any):
+        self.records.extend(records)
+        self.checkpoints.append(self.item, records, next_cursor)
+
+    def finish(self, header: Dict[str, Any], records_key: str):
+        """Atomically write `header` plus the records under `records_key`, then drop the checkpoint."""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({**header, records_key: self.records}, f, indent=2)
+        os.replace(temp_path, self.path)
+        self.checkpoints.clear(self.item)
+
+
+class StreamPageSink:
+    """
+    Streams the pages of one item to disk as they arrive.
+
+    Each page is compressed on its own and appended to a spool file, so memory
+    is bounded by one page. Concatenated gzip members / zstd frames read back as
+    one stream. The checkpoint stores the spool size after every page, so a
+    resumed item drops any half-written page. `finish` writes the header line
+    followed by the spooled pages to a temp file and renames it into place.
+    """
+
+    def __init__(self, path: str, item: str, checkpoints: PageCheckpoint, storage_format: str):
+        self.path = path
+        self.item = item
+        self.checkpoints = checkpoints
+        self.spool_path = f"{path}.spool"
+        self.compress = _compressor(storage_format)
+        self.count = 0
+        self._spool_bytes = 0
+
+    def resume(self) -> Tuple[Any, int, bool]:
+        """Restore the spool from the checkpoint. Returns (next_cursor, pages_done, complete)."""
+        _, cursor, pages, complete, position = self.checkpoints.load(self.item)
+        if pages and position and os.path.exists(self.spool_path) \
+                and os.path.getsize(self.spool_path) >= position["bytes"]:
+            os.truncate(self.spool_path, position["bytes"])
+            self._spool_bytes, self.count = position["bytes"], position["count"]
+            return cursor, pages, complete
+        if pages:
+            print(f"Checkpoint for {self.item} does not match its spool file. Starting over.")
+            self.checkpoints.clear(self.item)
+        open(self.spool_path, "wb").close()
+        self._spool_bytes, self.count = 0, 0
+        return None, 0, False
+
+    def add_page(self, records: List[Any], next_cursor: Any):
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        block = self.compress(data)
+        with open(self.spool_path, "ab") as f:
+            f.write(block)
+        self._spool_bytes += len(block)
+        self.count += len(records)
+        self.checkpoints.append(self.item, [], next_cursor,
+                                position={"bytes": self._spool_bytes, "count": self.count})
+
+    def finish(self, header: Dict[str, Any], records_key: str):
+        """Atomically write the header line and the spooled records, then drop spool and checkpoint."""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "wb") as out:
+            out.write(self.compress((json.dumps(header) + "\n").encode("utf-8")))
+            with open(self.spool_path, "rb") as spool:
+                shutil.copyfileobj(spool, out)
+        os.replace(temp_path, self.path)
+        os.remove(self.spool_path)
+        self.checkpoints.clear(self.item)
+
+
+def open_page_sink(base_path: str, item: str, checkpoints: PageCheckpoint, storage_format: str):
+    """Return the page sink for `storage_format`; the file extension is added to `base_path`."""
+    path = base_path + STORAGE_FORMATS[storage_format]
+    if storage_format == "json":
+        return JsonPageSink(path, item, checkpoints)
+    return StreamPageSink(path, item, checkpoints, storage_format)
+
+
+def read_event_file(path: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """
+    Open a stored event or transaction file in any storage format.
+    Returns (metadata, records) where records is an iterator. For the streamed
+    formats the records are decoded lazily, one line at a time.
+    """
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        records_key = "events" if "events" in data else "transactions"
+        records = data.pop(records_key, None) or []
+        return data.get("metadata", data), iter(records)
+
+    if path.endswith(".gz"):
+        stream = gzip.open(path, "rt", encoding="utf-8")
+    elif path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Reading .zst files requires zstandard: pip install zstandard")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True,
+                                                         closefd=True)
+        stream = io.TextIOWrapper(raw, encoding="utf-8")
+    else:
+        raise ValueError(f"Unknown event file format: {path}")
+
+    header = json.loads(stream.readline())
+
+    def records():
+        with stream:
+            for line in stream:
+                yield json.loads(line)
+
+    return header.get("metadata", header), records()
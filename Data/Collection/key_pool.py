@@ -0,0 +1,168 @@
+import time
+import asyncio
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from rate_limiter import TokenBucket
+
+
+class KeyStats:
+    """Request counters and latency for a single API key."""
+
+    def __init__(self):
+        self.requests = 0
+        self.throttled = 0      # HTTP 429 / "rate limit" responses
+        self.unauthorized = 0   # HTTP 401 / "invalid API key" responses
+        self.errors = 0         # network errors and other non-200 responses
+        self.total_latency = 0.0
+        self.first_used = None
+        self.last_used = None
+
+    def throughput(self) -> float:
+        """Requests per second between the first and the last request of this key."""
+        if self.requests < 2 or self.last_used == self.first_used:
+            return 0.0
+        return (self.requests - 1) / (self.last_used - self.first_used)
+
+
+class KeyPool:
+    """
+    Schedules requests across a pool of API keys.
+
+    Every key has its own token bucket, and each request goes to the key that
+    can send soonest, so N keys give close to N times the single-key rate.
+    Keys that get throttled are taken out of rotation for their Retry-After
+    window, and requests queued on them wait for its end; keys that keep
+    returning 401 are disabled for the rest of the run. A throttled key also
+    slows down (its rate is multiplied by `throttle_backoff`, down to
+    `min_rate_fraction` of `rate`) and speeds up again by `rate_recovery` of
+    `rate` per successful request, so a key paced right at the server's limit
+    settles just below it instead of being throttled again and again.
+    """
+
+    def __init__(self, keys: Iterable[str], rate: float, default_cooldown: float = 30.0,
+                 max_unauthorized: int = 3, verbose: bool = True, throttle_backoff: float = 0.9,
+                 min_rate_fraction: float = 0.5, rate_recovery: float = 0.01):
+        self.keys = list(dict.fromkeys(keys))
+        if not self.keys:
+            raise ValueError("KeyPool needs at least one API key")
+        self.rate = rate
+        self.throttle_backoff = throttle_backoff
+        self.min_rate = rate * min_rate_fraction
+        self.rate_recovery = rate * rate_recovery
+        self.default_cooldown = default_cooldown
+        self.max_unauthorized = max_unauthorized
+        self.verbose = verbose  # print every throttled request (disabled keys are always printed)
+        self.buckets = {key: TokenBucket(rate) for key in self.keys}
+        self.stats = {key: KeyStats() for key in self.keys}
+        self._cooldown_until = {key: 0.0 for key in self.keys}
+        self._throttle_count = {key: 0 for key in self.keys}  # bumped by every 429; invalidates reserved slots
+        self._consecutive_401 = {key: 0 for key in self.keys}
+        self._disabled = set()
+        self._lock = threading.Lock()
+
+    def _schedule(self) -> Tuple[str, float, int]:
+        """Pick the key that frees up first, reserve its next slot and return (key, delay, throttle count)."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [key for key in self.keys if key not in self._disabled]
+            if not candidates:
+                raise RuntimeError("No usable API keys left: every key was disabled after repeated 401s.")
+            key = min(candidates, key=lambda k: max(self._cooldown_until[k] - now,
+                                                   self.buckets[k].wait_time()))
+            delay = max(self._cooldown_until[key] - now, self.buckets[key].reserve())
+            return key, delay, self._throttle_count[key]
+
+    def _still_valid(self, key: str, throttle_count: int) -> bool:
+        """False if the key was throttled or disabled while the caller waited for its slot."""
+        with self._lock:
+            return self._throttle_count[key] == throttle_count and key not in self._disabled
+
+    def acquire(self) -> str:
+        """
+        Block until a key may send a request and return that key. A caller whose
+        key got throttled while it waited reserves a new slot after the cooldown.
+        """
+        while True:
+            key, delay, throttle_count = self._schedule()
+            if delay > 0:
+                time.sleep(delay)
+            if self._still_valid(key, throttle_count):
+                return key
+
+    async def acquire_async(self) -> str:
+        """Async counterpart of acquire."""
+        while True:
+            key, delay, throttle_count = self._schedule()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._still_valid(key, throttle_count):
+                return key
+
+    def report(self, key: str, status: Optional[int], latency: float,
+               retry_after: Optional[str] = None):
+        """
+        Record the outcome of a request sent with `key`.
+        `status` is the HTTP status code, or None when the request raised.
+        """
+        with self._lock:
+            now = time.monotonic()
+            stats = self.stats[key]
+            stats.requests += 1
+            stats.total_latency += latency
+            if stats.first_used is None:
+                stats.first_used = now
+            stats.last_used = now
+
+            if status == 429:
+                stats.throttled += 1
+                try:
+                    cooldown = float(retry_after)
+                except (TypeError, ValueError):
+                    cooldown = self.default_cooldown
+                self._cooldown_until[key] = max(self._cooldown_until[key], now + cooldown)
+                self._throttle_count[key] += 1
+                bucket = self.buckets[key]
+                bucket.pause(self._cooldown_until[key])  # later slots start when the cooldown ends
+                bucket.set_rate(max(self.min_rate, bucket.rate * self.throttle_backoff))
+                if self.verbose:
+                    print(f"Key ...{key[-6:]} throttled. Out of rotation for {cooldown:.0f} seconds.")
+            elif status == 401:
+                stats.unauthorized += 1
+                self._consecutive_401[key] += 1
+                if self._consecutive_401[key] >= self.max_unauthorized and key not in self._disabled:
+                    self._disabled.add(key)
+                    print(f"Key ...{key[-6:]} disabled after {self._consecutive_401[key]} consecutive 401 responses.")
+            elif status == 200:
+                bucket = self.buckets[key]
+                if bucket.rate < self.rate:
+                    bucket.set_rate(min(self.rate, bucket.rate + self.rate_recovery))
+            else:
+                stats.errors += 1
+            if status != 401:
+                self._consecutive_401[key] = 0
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-key counters and throughput, keyed by the last 6 characters of each key."""
+        with self._lock:
+            return {
+                f"...{key[-6:]}": {
+                    "requests": s.requests,
+                    "requests_per_second": round(s.throughput(), 3),
+                    "throttled": s.throttled,
+                    "unauthorized": s.unauthorized,
+                    "errors": s.errors,
+                    "avg_latency": round(s.total_latency / s.requests, 4) if s.requests else 0.0,
+                    "disabled": key in self._disabled,
+                }
+                for key, s in self.stats.items()
+            }
+
+    def print_summary(self):
+        """Print the per-key throughput report at the end of a run."""
+        print("\nAPI key usage:")
+        for key, s in self.summary().items():
+            status = " (disabled)" if s["disabled"] else ""
+            print(f"  Key {key}{status}: {s['requests']} requests ({s['requests_per_second']} req/s), "
+                  f"{s['throttled']} throttled, {s['unauthorized']} unauthorized, {s['errors']} errors, "
+                  f"avg latency {s['avg_latency']}s")
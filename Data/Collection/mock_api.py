@@ -0,0 +1,335 @@
+import sys
+import json
+import math
+import time
+import base64
+import random
+import argparse
+import threading
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# === Configuration ===
+
+HOST = "127.0.0.1"
+PORT = 8089
+SEED = 87
+OPENSEA_PATH = "/api/v2/events/chain/ethereum/contract/"  # .../<contract>/nfts/<token_id>
+ETHERSCAN_PATH = "/v2/api"
+EVENTS_PER_TOKEN = 120  # mean number of events per token (all types together)
+TXS_PER_ADDRESS = 150  # mean number of transactions per address
+
+
+class FaultProfile:
+    """
+    What the mock server does besides answering: per-key rate limit, random
+    429/401 responses, hung requests, dropped connections and response latency.
+    Probabilities are per request.
+    """
+
+    def __init__(self, rate_limit: Optional[float] = None, burst: Optional[float] = None, p429: float = 0.0,
+                 retry_after: float = 1.0, p401: float = 0.0, invalid_keys: Optional[List[str]] = None,
+                 p_timeout: float = 0.0, hang_seconds: float = 20.0, p_reset: float = 0.0,
+                 latency: str = "fixed", latency_ms: float = 0.0, latency_sigma: float = 0.5):
+        self.rate_limit = rate_limit  # requests per second per API key; None = unlimited
+        self.burst = burst if burst is not None else max(rate_limit or 1.0, 1.0)  # bucket capacity, default 1s of requests
+        self.p429 = p429
+        self.retry_after = retry_after  # Retry-After seconds of injected 429s (OpenSea)
+        self.p401 = p401
+        self.invalid_keys = set(invalid_keys or [])  # keys that always get 401
+        self.p_timeout = p_timeout
+        self.hang_seconds = hang_seconds  # a "timeout" holds the request this long before answering
+        self.p_reset = p_reset  # close the connection without a response
+        self.latency = latency  # "fixed", "uniform" (0..2x latency_ms) or "lognormal" (median latency_ms)
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.__dict__, "invalid_keys": sorted(self.invalid_keys)}
+
+
+class MockState:
+    """Synthetic collection data, per-key rate buckets and the request counters."""
+
+    def __init__(self, faults: FaultProfile, seed: int = SEED, events_per_token: int = EVENTS_PER_TOKEN,
+                 txs_per_address: int = TXS_PER_ADDRESS):
+        self.faults = faults
+        self.seed = seed
+        self.events_per_token = events_per_token
+        self.txs_per_address = txs_per_address
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.buckets = {}  # api key -> [tokens, last refill]
+        self.counters = {}
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.counters)
+
+    def reset_stats(self):
+        with self.lock:
+            self.counters = {}
+            self.buckets = {}
+
+    def draw(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+    def latency(self) -> float:
+        f = self.faults
+        if f.latency_ms <= 0:
+            return 0.0
+        with self.lock:
+            if f.latency == "uniform":
+                return self.rng.uniform(0, 2 * f.latency_ms) / 1000
+            if f.latency == "lognormal":
+                return self.rng.lognormvariate(math.log(f.latency_ms), f.latency_sigma) / 1000
+        return f.latency_ms / 1000
+
+    def take(self, key: str) -> float:
+        """Take a request slot of `key`; returns 0 or the seconds until the next slot (throttled)."""
+        f = self.faults
+        if f.rate_limit is None:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            tokens, updated = self.buckets.get(key, (f.burst, now))
+            tokens = min(f.burst, tokens + (now - updated) * f.rate_limit)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return 0.0
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / f.rate_limit
+
+    # --- Synthetic data (deterministic per token / address) ---
+
+    def events(self, token_id: str, event_types: List[str]) -> List[Dict[str, Any]]:
+        rng = random.Random(f"{self.seed}:{token_id}")
+        n = max(0, int(rng.expovariate(1 / self.events_per_token))) if self.events_per_token else 0
+        types = ["sale", "transfer", "offer", "listing", "cancel", "redemption"]
+        events = []
+        for i in range(n):
+            kind = rng.choice(types)
+            event = {"event_type": kind, "event_timestamp": 1620000000 + i * 3600,
+                     "order_hash": f"0x{rng.getrandbits(128):032x}",
+                     "payment": {"quantity": str(rng.randint(1, 10 ** 20)), "decimals": 18, "symbol": "ETH"}}
+            if kind in ("offer", "listing"):  # like OpenSea: orders, told apart by order_type
+                event["event_type"] = "order"
+                event["order_type"] = "item_offer" if kind == "offer" else "listing"
+                if kind in event_types or "order" in event_types:
+                    events.append(event)
+            elif kind in event_types:
+                events.append(event)
+        return events
+
+    def transactions(self, address: str, startblock: int) -> List[Dict[str, Any]]:
+        rng = random.Random(f"{self.seed}:{address}")
+        n = max(0, int(rng.expovariate(1 / self.txs_per_address))) if self.txs_per_address else 0
+        txs = [{"blockNumber": str(12000000 + i * 50), "timeStamp": str(1620000000 + i * 600),
+                "hash": f"0x{rng.getrandbits(256):064x}", "from": address, "to": f"0x{rng.getrandbits(160):040x}",
+                "value": str(rng.randint(0, 10 ** 19)), "isError": "0"} for i in range(n)]
+        return [tx for tx in txs if int(tx["blockNumber"]) >= startblock]
+
+
+def encode_cursor(offset: int) -> str:
+    """Opaque cursor like OpenSea's `next`."""
+    return base64.urlsafe_b64encode(f"offset={offset}".encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    return int(base64.urlsafe_b64decode(cursor.encode()).decode().split("=", 1)[1])
+
+
+# === HTTP ===
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, as the real APIs
+
+        def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _faults(self, api: str, key: str) -> bool:
+            """Apply the fault profile; returns True when the request was already answered (or dropped)."""
+            f = state.faults
+            state.count(f"{api}.requests")
+            if key in f.invalid_keys or (f.p401 and state.draw() < f.p401):
+                state.count(f"{api}.401")
+                if api == "etherscan":
+                    self._send(200, {"status": "0", "message": "NOTOK", "result": "Missing/Invalid API Key"})
+                else:
+                    self._send(401, {"detail": "Invalid API key"})
+                return True
+            wait = state.take(key)
+            injected = not wait and f.p429 and state.draw() < f.p429
+            if wait or injected:
+                state.count(f"{api}.429")
+                if api == "etherscan":
+                    self._send(200, {"status": "0", "message": "NOTOK",
+                                     "result": "Max calls per sec rate limit reached"})
+                else:
+                    retry_after = f.retry_after if injected else max(1, math.ceil(wait))
+                    self._send(429, {"detail": "Request was throttled."}, {"Retry-After": f"{retry_after:g}"})
+                return True
+            if f.p_reset and state.draw() < f.p_reset:
+                state.count(f"{api}.reset")
+                self.close_connection = True
+                return True
+            if f.p_timeout and state.draw() < f.p_timeout:
+                state.count(f"{api}.timeout")
+                time.sleep(f.hang_seconds)
+                self.close_connection = True
+                return True
+            delay = state.latency()
+            if delay:
+                time.sleep(delay)
+            return False
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/_stats":
+                self._send(200, {"counters": state.stats(), "faults": state.faults.to_dict()})
+            elif url.path.startswith(OPENSEA_PATH) and "/nfts/" in url.path:
+                if self._faults("opensea", self.headers.get("x-api-key", "")):
+                    return
+                token_id = url.path.rsplit("/", 1)[1]
+                event_types = query.get("event_type", ["sale"])  # the API returns sales without a filter
+                limit = min(int(query.get("limit", ["50"])[0]), 50)
+                offset = decode_cursor(query.get("next", [None])[0])
+                events = state.events(token_id, event_types)
+                page = events[offset:offset + limit]
+                more = offset + limit < len(events)
+                state.count("opensea.pages")
+                state.count("opensea.records", len(page))
+                self._send(200, {"asset_events": page, "next": encode_cursor(offset + limit) if more else None})
+            elif url.path == ETHERSCAN_PATH:
+                if self._faults("etherscan", query.get("apikey", [""])[0]):
+                    return
+                address = query.get("address", [""])[0]
+                page, offset = int(query.get("page", ["1"])[0]), int(query.get("offset", ["100"])[0])
+                txs = state.transactions(address, int(query.get("startblock", ["0"])[0]))
+                result = txs[(page - 1) * offset:page * offset]
+                state.count("etherscan.pages")
+                state.count("etherscan.records", len(result))
+                if result:
+                    self._send(200, {"status": "1", "message": "OK", "result": result})
+                else:
+                    self._send(200, {"status": "0", "message": "No transactions found", "result": []})
+            else:
+                self._send(404, {"detail": "not found"})
+
+        def do_POST(self):
+            if urlparse(self.path).path == "/_reset":
+                state.reset_stats()
+                self._send(200, {"reset": True})
+            else:
+                self._send(404, {"detail": "not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # many concurrent scraper connections
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # clients dropping timed-out connections
+            super().handle_error(request, client_address)
+
+
+class MockServer:
+    """The mock OpenSea / Etherscan API in a background thread."""
+
+    def __init__(self, faults: FaultProfile = None, host: str = HOST, port: int = 0, **data_options):
+        self.state = MockState(faults or FaultProfile(), **data_options)
+        self.server = MockHTTPServer((host, port), make_handler(self.state))
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def opensea_url(self) -> str:
+        """EVENTS_BASE_URL of nft_event_offer.py pointing at this server."""
+        return self.url + OPENSEA_PATH + "0xBC4CA0EdA7647A8aB7C2061c2E118A18a936f13D/nfts/{token_id}"
+
+    @property
+    def etherscan_url(self) -> str:
+        """BASE_URL of Etherscan_User.py pointing at this server."""
+        return self.url + ETHERSCAN_PATH
+
+    def start(self) -> "MockServer":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenSea events and Etherscan txlist APIs.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--rate-limit", type=float, help="requests per second per API key (429 above it)")
+    parser.add_argument("--burst", type=float, help="requests a key may send at once (default: one second's worth)")
+    parser.add_argument("--p429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--p401", type=float, default=0.0)
+    parser.add_argument("--invalid-keys", nargs="*", default=[])
+    parser.add_argument("--p-timeout", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=20.0)
+    parser.add_argument("--p-reset", type=float, default=0.0)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="fixed")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--events-per-token", type=int, default=EVENTS_PER_TOKEN)
+    parser.add_argument("--txs-per-address", type=int, default=TXS_PER_ADDRESS)
+    args = parser.parse_args()
+
+    faults = FaultProfile(rate_limit=args.rate_limit, burst=args.burst, p429=args.p429, retry_after=args.retry_after, p401=args.p401,
+                          invalid_keys=args.invalid_keys, p_timeout=args.p_timeout, hang_seconds=args.hang_seconds,
+                          p_reset=args.p_reset, latency=args.latency, latency_ms=args.latency_ms)
+    server = MockServer(faults, args.host, args.port, events_per_token=args.events_per_token,
+                        txs_per_address=args.txs_per_address)
+    print(f"Mock APIs on {server.url}")
+    print(f"  EVENTS_BASE_URL = \"{server.opensea_url}\"")
+    print(f"  BASE_URL = \"{server.etherscan_url}\"")
+    print(f"  GET {server.url}/_stats for the request counters")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+if __name__ == "__main__":
+    main()
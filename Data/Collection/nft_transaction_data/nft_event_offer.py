@@ -1,225 +1,555 @@
 import os
+import sys
 import time
 import json
+import asyncio
 import requests
-from collections import deque
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, List
 from urllib.parse import urlencode
 from tqdm import tqdm
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+try:
+    import aiohttp
+except ImportError:  # aiohttp is only needed for the async collection mode
+    aiohttp = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from key_pool import KeyPool
+from progress_journal import ProgressJournal
+from page_checkpoint import PageCheckpoint
+from event_storage import open_page_sink
+from scrape_metrics import Metrics, COUNT_BUCKETS
+
 # Configuration
-OUTPUT_DIR = "NFT_Event_Offer"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Event types collected in one run; each type gets its own output folder, progress journal and checkpoints.
+ALL_EVENT_TYPES = ["sale", "transfer", "offer", "order", "listing", "cancel", "redemption"]
+EVENT_TYPES = ALL_EVENT_TYPES
+OUTPUT_DIR_FORMAT = "NFT_Event_{}"  # e.g. NFT_Event_Offer, NFT_Event_Sale (the folders ingest_events.py reads)
+SHARED_PAGINATION = True  # One paginated request stream per token for all pending types; False: one stream per type
 INPUT_JSON = "data/final_collection.json"
-API_RATE_LIMIT = 4  # Requests per second
+API_RATE_LIMIT = 4  # Requests per second, per API key
+USE_ASYNC = True  # Async mode: every in-flight page request is scheduled through the shared key pool
+MAX_CONCURRENCY = 16  # Number of tokens paginated at the same time in async mode
+STORAGE_FORMAT = "gzip"  # "gzip"/"zstd": events streamed to compressed NDJSON page by page; "json": original indent=2 file
+RETRY_FAILED_ONLY = False  # Only process the tokens listed in failed_tokens.json (they resume from their checkpoints)
+REQUEST_TIMEOUT = 15  # Seconds per page request
+RETRY_DELAY = 5  # Seconds to wait before retrying a page after a request error
+MAX_REJECTED_RETRIES = 10  # 401/429 responses for one page before the token is marked failed
+VERBOSE = False  # Print every page, retry and skip; otherwise only failures and a periodic status line
+METRICS_DIR = "NFT_Event_Metrics"  # nft_events.json / nft_events.prom snapshots of the run's metrics
+METRICS_INTERVAL = 30  # Seconds between metrics snapshots and status lines
 
-# API Configuration (This is for Offer events specifically, but for other event types please modify according to the API document)
-# in this case, the offer data is the largest chunk of the whole data that was collected. Therefore, you see this example. 
+# API Configuration. The event types are sent as repeated event_type query parameters.
 EVENTS_BASE_URL = ("https://api.opensea.io/api/v2/events/chain/ethereum/"
-                   "contract/0xBC4CA0EdA7647A8aB7C2061c2E118A18a936f13D/nfts/{token_id}"
-                   "?event_type=offer")
-# If you have multiple API keys, list them here.
-API_KEYS = deque([
+                   "contract/0xBC4CA0EdA7647A8aB7C2061c2E118A18a936f13D/nfts/{token_id}")
+# If you have multiple API keys, list them here. Requests are spread across all keys at once.
+API_KEYS = [
     "your_api_key_1",
     "your_api_key_2",
     "your_api_key_3"
-])
+]
 HEADERS = {"accept": "application/json"}
 
-class EventScraper:
-    def __init__(self):
-        self.current_key = API_KEYS[0]
-        self.failed_tokens = []
+def route_event(event: Dict[str, Any], event_types) -> List[str]:
+    """
+    Event types whose outputs receive `event`. Offers and listings come back as
+    "order" events, so those are routed on their order_type; the "order" output
+    keeps every order too, as it does when it is paginated on its own.
+    """
+    kind = event.get("event_type")
+    targets = [kind] if kind in event_types else []
+    if kind == "order":
+        order_type = json.dumps(event.get("order_type")) if isinstance(event.get("order_type"), dict) \
+            else str(event.get("order_type") or "")
+        if "offer" in order_type and "offer" in event_types:
+            targets.append("offer")
+        elif "listing" in order_type and "listing" in event_types:
+            targets.append("listing")
+    return targets
+
+
+def log(message: str):
+    """Per-page, per-retry and per-token progress; printed only with VERBOSE."""
+    if VERBOSE:
+        print(message)
+
+
+class EventStream:
+    """Output folder, progress journal, checkpoints and failed tokens of one event type."""
+    
+    def __init__(self, event_type: str):
+        self.event_type = event_type
+        self.output_dir = OUTPUT_DIR_FORMAT.format(event_type.capitalize())
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.journal = ProgressJournal(os.path.join(self.output_dir, "progress.jsonl"),
+                                       legacy_path=os.path.join(self.output_dir, "progress.json"))
         self.processed = self._load_progress()
-        self.lock = threading.Lock()  # Protects shared data (processed, failed_tokens)
+        self.checkpoints = PageCheckpoint(os.path.join(self.output_dir, "checkpoints"))  # Resume points for unfinished tokens
+        self.failed_tokens = []
     
     def _load_progress(self) -> set:
-        """Load processed token IDs from disk."""
-        progress_path = os.path.join(OUTPUT_DIR, "progress.json")
+        """Replay the progress journal to get the processed token IDs."""
         try:
-            if os.path.exists(progress_path):
-                with open(progress_path) as f:
-                    return set(json.load(f))
+            return self.journal.replay()
         except Exception as e:
-            print(f"Error loading progress: {str(e)}")
+            print(f"Error loading {self.event_type} progress: {str(e)}")
         return set()
     
-    def _save_progress(self):
-        """Atomically save processing progress."""
-        progress_path = os.path.join(OUTPUT_DIR, "progress.json")
-        temp_path = f"{progress_path}.tmp"
+    def save_progress(self, token_id: str):
+        """Append a finished token to the progress journal."""
         try:
-            with self.lock:
-                with open(temp_path, "w") as f:
-                    json.dump(list(self.processed), f)
-                os.replace(temp_path, progress_path)
+            self.journal.append(token_id)
         except Exception as e:
-            print(f"Failed to save progress: {str(e)}")
+            print(f"Failed to save {self.event_type} progress: {str(e)}")
     
-    def _rotate_key(self):
-        """Cycle through available API keys."""
+    def open_output(self, token_id: str, nft_name: str):
+        """Return the page sink that receives the events of this type for a single NFT as pages arrive."""
+        safe_name = "".join(c if c.isalnum() or c in (' ', '-', '_') else "_" for c in nft_name).strip().replace(" ", "_")
+        base_path = os.path.join(self.output_dir, f"NFT_{safe_name}_{token_id}")
+        return open_page_sink(base_path, token_id, self.checkpoints, STORAGE_FORMAT)
+
+
+class EventScraper:
+    def __init__(self, event_types: List[str] = EVENT_TYPES, pool_size: int = MAX_CONCURRENCY):
+        self.key_pool = KeyPool(API_KEYS, API_RATE_LIMIT, verbose=VERBOSE)  # Per-key rate limits, cooldowns and stats
+        self.metrics = Metrics("nft_events")  # Counters, latency histograms and the time split of the run
+        self.streams = {event_type: EventStream(event_type) for event_type in event_types}
+        self.lock = threading.Lock()  # Protects shared data (processed, failed_tokens)
+        # One keep-alive connection pool for every thread and event type (thread mode).
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)  # local mock API (mock_api.py)
+    
+    @property
+    def processed(self) -> set:
+        """Tokens finished for every event type."""
+        return set.intersection(*(stream.processed for stream in self.streams.values()))
+    
+    @property
+    def failed_tokens(self) -> list:
+        return sorted({token for stream in self.streams.values() for token in stream.failed_tokens})
+    
+    def _pending_types(self, token_id: str) -> List[str]:
         with self.lock:
-            API_KEYS.rotate(-1)
-            self.current_key = API_KEYS[0]
-        print(f"Rotated to new key ending with: ...{self.current_key[-6:]}")
+            return [t for t, stream in self.streams.items() if token_id not in stream.processed]
     
-    def _save_nft_file(self, token_id: str, nft_name: str, events: List[Any]):
-        """Save events for a single NFT into its own file using an atomic write."""
-        safe_name = "".join(c if c.isalnum() or c in (' ', '-', '_') else "_" for c in nft_name).strip().replace(" ", "_")
-        filename = os.path.join(OUTPUT_DIR, f"NFT_{safe_name}_{token_id}.json")
-        temp_path = f"{filename}.tmp"
-        
-        data_to_save = {
+    def _pagination_groups(self, pending: List[str]) -> List[List[str]]:
+        """Event types paginated together: all pending types at once, or one type per stream."""
+        return [pending] if SHARED_PAGINATION else [[t] for t in pending]
+    
+    def _mark_failed(self, token_id: str, event_types: List[str]):
+        with self.lock:
+            for t in event_types:
+                self.streams[t].failed_tokens.append(token_id)
+    
+    def _request_params(self, event_types: List[str], cursor) -> list:
+        params = [("limit", 50)] + [("event_type", t) for t in event_types]
+        if cursor:
+            params.append(("next", cursor))
+        return params
+    
+    def _route_page(self, events: List[Dict[str, Any]], outputs: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """Split a page over the outputs; a single-type stream keeps every event, as before."""
+        routed = {t: [] for t in outputs}
+        if len(outputs) == 1:
+            routed[next(iter(outputs))] = events
+            return routed
+        dropped = 0
+        for event in events:
+            targets = route_event(event, outputs)
+            if not targets:
+                dropped += 1
+            for target in targets:
+                routed[target].append(event)
+        if dropped:
+            self.metrics.inc("dropped_events_total", dropped)
+            log(f"{dropped} events on this page match none of {', '.join(outputs)}; they are not stored.")
+        return routed
+    
+    def _save_nft_file(self, token_id: str, nft_name: str, event_type: str, output) -> bool:
+        """Save events of one type for a single NFT into its own file using an atomic write. Returns True on success."""
+        header = {
             "metadata": {
                 "token_id": token_id,
                 "nft_name": nft_name,
-                "event_count": len(events),
+                "event_type": event_type,
+                "event_count": output.count,
                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ")
-            },
-            "events": events
+            }
         }
         
         try:
-            with open(temp_path, "w") as f:
-                json.dump(data_to_save, f, indent=2)
-            os.replace(temp_path, filename)
-            print(f"Saved NFT {nft_name} (Token ID: {token_id}) with {len(events)} events.")
+            output.finish(header, "events")
+            log(f"Saved NFT {nft_name} (Token ID: {token_id}) with {output.count} {event_type} events.")
+            return True
         except Exception as e:
-            print(f"Failed to save NFT {nft_name} (Token ID: {token_id}): {str(e)}")
+            print(f"Failed to save {event_type} events of NFT {nft_name} (Token ID: {token_id}): {str(e)}")
+            return False
+    
+    def _resume_from_checkpoint(self, token_id: str, token_index: int, total: int, outputs: Dict[str, Any]):
+        """
+        Restore the checkpoints of a token into `outputs`: (next cursor, pages done, finished).
+        Outputs sharing a pagination resume together; if a crash left them at
+        different pages, the token starts over for all of them.
+        """
+        states = {t: output.resume() for t, output in outputs.items()}
+        if len(set(states.values())) > 1:
+            print(f"Token {token_id} ({token_index}/{total}): Checkpoints of {', '.join(outputs)} disagree. Starting over.")
+            for output in outputs.values():
+                output.checkpoints.clear(output.item)
+                output.resume()
+            return None, 0, False
+        cursor, page_count, complete = next(iter(states.values()))
+        if page_count:
+            log(f"Token {token_id} ({token_index}/{total}): Resuming from checkpoint after page {page_count} "
+                  f"({sum(output.count for output in outputs.values())} events).")
+        return cursor, page_count, complete
     
-    def _handle_pagination(self, token_id: str, token_index: int, total: int) -> List[Any]:
+    def _handle_pagination(self, token_id: str, token_index: int, total: int, outputs: Dict[str, Any]) -> bool:
         """
-        Process all pages for a single token ID and return collected events.
+        Process all pages of the event types in `outputs` for a single token ID,
+        routing the events of each page to the output of their type.
+        Returns True once the last page has been fetched.
         This method includes a retry mechanism and prints progress including token index info.
+        Every page is checkpointed, so a token that fails part-way resumes from its last good page.
         """
-        events_for_nft = []
-        cursor = None
-        page_count = 0
+        cursor, page_count, complete = self._resume_from_checkpoint(token_id, token_index, total, outputs)
+        if complete:
+            return True
+        url = EVENTS_BASE_URL.format(token_id=token_id)
+        fetched = 0  # pages fetched in this run (page_count also counts resumed pages)
         while True:
             page_count += 1
-            params = {"limit": 50}
-            if cursor:
-                params["next"] = cursor
+            params = self._request_params(list(outputs), cursor)
             
             # Retry logic for each page request
             max_retries = 3
             retry_count = 0
-            while retry_count < max_retries:
+            rejected = 0  # 401/429 responses for this page
+            while retry_count < max_retries and rejected < MAX_REJECTED_RETRIES:
+                try:
+                    with self.metrics.phase("key_wait"):
+                        api_key = self.key_pool.acquire()
+                except RuntimeError as e:  # every key has been disabled
+                    print(f"Token {token_id} ({token_index}/{total}): {e}")
+                    self._mark_failed(token_id, list(outputs))
+                    return False
+                start = time.monotonic()
                 try:
-                    url = EVENTS_BASE_URL.format(token_id=token_id)
-                    response = requests.get(
+                    response = self.session.get(
                         url,
-                        headers={**HEADERS, "x-api-key": self.current_key},
+                        headers={"x-api-key": api_key},
                         params=params,
-                        timeout=15
+                        timeout=REQUEST_TIMEOUT
                     )
+                    latency = time.monotonic() - start
+                    self.key_pool.report(api_key, response.status_code, latency,
+                                         response.headers.get("Retry-After"))
+                    self.metrics.request("events", api_key, latency, response.status_code, len(response.content))
+                    if response.status_code in (401, 429):
+                        # The key pool has already cooled down or disabled the key; retry the page with another one.
+                        self.metrics.inc("retries_total", reason=response.status_code)
+                        rejected += 1
+                        continue
                     break  # Got a response, exit retry loop
                 except Exception as e:
+                    self.key_pool.report(api_key, None, time.monotonic() - start)
+                    self.metrics.request("events", api_key, time.monotonic() - start, "error")
+                    self.metrics.inc("retries_total", reason="error")
                     retry_count += 1
-                    print(f"Token {token_id} ({token_index}/{total}): Request error: {e}. "
-                          f"Retrying {retry_count}/{max_retries} after delay...")
-                    time.sleep(5)
+                    log(f"Token {token_id} ({token_index}/{total}): Request error: {e}. "
+                        f"Retrying {retry_count}/{max_retries} after delay...")
+                    with self.metrics.phase("backoff"):
+                        time.sleep(RETRY_DELAY)
             
-            if retry_count == max_retries:
+            if retry_count == max_retries or rejected == MAX_REJECTED_RETRIES:
                 print(f"Token {token_id} ({token_index}/{total}): Max retries reached for page {page_count}. Aborting token.")
-                with self.lock:
-                    self.failed_tokens.append(token_id)
-                break
-            
-            if response.status_code == 401:
-                self._rotate_key()
-                continue
-                
-            if response.status_code == 429:
-                retry_after = int(response.headers.get("Retry-After", 30))
-                print(f"Token {token_id} ({token_index}/{total}): Rate limited. Waiting {retry_after} seconds...")
-                time.sleep(retry_after)
-                continue
+                self._mark_failed(token_id, list(outputs))
+                return False
                 
             if response.status_code != 200:
                 print(f"Token {token_id} ({token_index}/{total}): Request failed: HTTP {response.status_code}")
-                with self.lock:
-                    self.failed_tokens.append(token_id)
-                break
+                self._mark_failed(token_id, list(outputs))
+                return False
             
-            data = response.json()
+            with self.metrics.phase("json_decode"):
+                data = response.json()
             events = data.get("asset_events", [])
-            events_for_nft.extend(events)
+            self.metrics.inc("pages_total")
+            fetched += 1
+            self.metrics.inc("records_total", len(events))
             
-            print(f"Token {token_id} ({token_index}/{total}): Processed page {page_count}. "
-                  f"Received {len(events)} events, total so far: {len(events_for_nft)}.")
+            log(f"Token {token_id} ({token_index}/{total}): Processed page {page_count}. "
+                f"Received {len(events)} events, total so far: "
+                f"{sum(output.count for output in outputs.values()) + len(events)}.")
             
             # If no events are returned, assume no more pages.
             if len(events) == 0:
-                print(f"Token {token_id} ({token_index}/{total}): Received 0 events on page {page_count}. Stopping further requests.")
+                log(f"Token {token_id} ({token_index}/{total}): Received 0 events on page {page_count}. Stopping further requests.")
                 break
             
             cursor = data.get("next")
+            # Every output records every page (possibly empty), so their checkpoints stay in step.
+            with self.metrics.phase("disk_write"):
+                for t, page in self._route_page(events, outputs).items():
+                    outputs[t].add_page(page, cursor or None)
             if not cursor:
-                print(f"Token {token_id} ({token_index}/{total}): No more pages. Finished collection.")
+                log(f"Token {token_id} ({token_index}/{total}): No more pages. Finished collection.")
                 break
             else:
-                print(f"Token {token_id} ({token_index}/{total}): More pages to fetch...")
+                log(f"Token {token_id} ({token_index}/{total}): More pages to fetch...")
+        
+        self.metrics.observe("pages_per_item", fetched, COUNT_BUCKETS)
+        return True
+    
+    async def _handle_pagination_async(self, session: "aiohttp.ClientSession", token_id: str,
+                                       token_index: int, total: int, outputs: Dict[str, Any]) -> bool:
+        """
+        Async counterpart of _handle_pagination. Every page request is scheduled
+        through the shared key pool, so each key stays under its rate limit no
+        matter how many tokens are in flight.
+        """
+        cursor, page_count, complete = await asyncio.to_thread(self._resume_from_checkpoint, token_id,
+                                                                token_index, total, outputs)
+        if complete:
+            return True
+        url = EVENTS_BASE_URL.format(token_id=token_id)
+        fetched = 0  # pages fetched in this run (page_count also counts resumed pages)
+        while True:
+            page_count += 1
+            params = self._request_params(list(outputs), cursor)
+            
+            # Retry logic for each page request
+            max_retries = 3
+            retry_count = 0
+            rejected = 0  # 401/429 responses for this page
+            while retry_count < max_retries and rejected < MAX_REJECTED_RETRIES:
+                try:
+                    with self.metrics.phase("key_wait"):
+                        api_key = await self.key_pool.acquire_async()
+                except RuntimeError as e:  # every key has been disabled
+                    print(f"Token {token_id} ({token_index}/{total}): {e}")
+                    self._mark_failed(token_id, list(outputs))
+                    return False
+                start = time.monotonic()
+                try:
+                    async with session.get(url, headers={"x-api-key": api_key}, params=params) as response:
+                        status = response.status
+                        body = await response.read() if status == 200 else b""
+                    latency = time.monotonic() - start
+                    with self.metrics.phase("json_decode"):
+                        data = json.loads(body) if status == 200 else None
+                    self.key_pool.report(api_key, status, latency, response.headers.get("Retry-After"))
+                    self.metrics.request("events", api_key, latency, status, len(body))
+                    if status in (401, 429):
+                        self.metrics.inc("retries_total", reason=status)
+                        rejected += 1
+                        continue
+                    break  # Got a response, exit retry loop
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    self.key_pool.report(api_key, None, time.monotonic() - start)
+                    self.metrics.request("events", api_key, time.monotonic() - start, "error")
+                    self.metrics.inc("retries_total", reason="error")
+                    retry_count += 1
+                    log(f"Token {token_id} ({token_index}/{total}): Request error: {e}. "
+                        f"Retrying {retry_count}/{max_retries} after delay...")
+                    with self.metrics.phase("backoff"):
+                        await asyncio.sleep(RETRY_DELAY)
+            
+            if retry_count == max_retries or rejected == MAX_REJECTED_RETRIES:
+                print(f"Token {token_id} ({token_index}/{total}): Max retries reached for page {page_count}. Aborting token.")
+                self._mark_failed(token_id, list(outputs))
+                return False
+            
+            if status != 200:
+                print(f"Token {token_id} ({token_index}/{total}): Request failed: HTTP {status}")
+                self._mark_failed(token_id, list(outputs))
+                return False
+            
+            events = data.get("asset_events", [])
+            self.metrics.inc("pages_total")
+            fetched += 1
+            self.metrics.inc("records_total", len(events))
+            
+            log(f"Token {token_id} ({token_index}/{total}): Processed page {page_count}. "
+                f"Received {len(events)} events, total so far: "
+                f"{sum(output.count for output in outputs.values()) + len(events)}.")
+            
+            if len(events) == 0:
+                log(f"Token {token_id} ({token_index}/{total}): Received 0 events on page {page_count}. Stopping further requests.")
+                break
             
-            time.sleep(1 / API_RATE_LIMIT)
+            cursor = data.get("next")
+            with self.metrics.phase("disk_write"):
+                for t, page in self._route_page(events, outputs).items():
+                    await asyncio.to_thread(outputs[t].add_page, page, cursor or None)
+            if not cursor:
+                log(f"Token {token_id} ({token_index}/{total}): No more pages. Finished collection.")
+                break
         
-        return events_for_nft
+        self.metrics.observe("pages_per_item", fetched, COUNT_BUCKETS)
+        return True
     
     def process_token(self, token: Dict[str, Any], token_index: int, total: int):
         """
-        Process events for a single NFT.
+        Process events for a single NFT: every event type it still lacks, with
+        shared pagination when SHARED_PAGINATION is set.
         """
         token_id = str(token["token_id"])
         nft_name = token.get("name", token_id)
+        self.metrics.add_gauge("queue_depth", -1)
         
-        with self.lock:
-            if token_id in self.processed:
-                print(f"Skipping token {token_id} ({token_index}/{total}) - already processed.")
-                return
+        pending = self._pending_types(token_id)
+        if not pending:
+            self.metrics.inc("items_total", result="skipped")
+            log(f"Skipping token {token_id} ({token_index}/{total}) - already processed.")
+            return
 
-        print(f"\nProcessing NFT {nft_name} (Token ID: {token_id}) ({token_index}/{total})")
-        events = self._handle_pagination(token_id, token_index, total)
-        self._save_nft_file(token_id, nft_name, events)
-        with self.lock:
-            self.processed.add(token_id)
-        self._save_progress()
+        log(f"\nProcessing NFT {nft_name} (Token ID: {token_id}) ({token_index}/{total}): {', '.join(pending)}")
+        with self.metrics.worker():
+            complete = True
+            for group in self._pagination_groups(pending):
+                outputs = {t: self.streams[t].open_output(token_id, nft_name) for t in group}
+                # Unfinished tokens keep their checkpoints and are picked up again on the next run.
+                if not self._handle_pagination(token_id, token_index, total, outputs):
+                    complete = False
+                    continue
+                for t, output in outputs.items():
+                    complete &= self._finish_type(token_id, nft_name, t, output)
+        self.metrics.inc("items_total", result="done" if complete else "failed")
+    
+    def _finish_type(self, token_id: str, nft_name: str, event_type: str, output) -> bool:
+        """Write the file of one event type and record the token in that type's journal. Returns True on success."""
+        with self.metrics.phase("disk_write"):
+            if not self._save_nft_file(token_id, nft_name, event_type, output):
+                return False
+            stream = self.streams[event_type]
+            with self.lock:
+                stream.processed.add(token_id)
+            stream.save_progress(token_id)
+        return True
+    
+    async def process_token_async(self, session: "aiohttp.ClientSession", token: Dict[str, Any],
+                                  token_index: int, total: int):
+        """Async counterpart of process_token; disk writes run in a worker thread."""
+        token_id = str(token["token_id"])
+        nft_name = token.get("name", token_id)
+        self.metrics.add_gauge("queue_depth", -1)
+        
+        pending = self._pending_types(token_id)
+        if not pending:
+            self.metrics.inc("items_total", result="skipped")
+            log(f"Skipping token {token_id} ({token_index}/{total}) - already processed.")
+            return
+
+        log(f"\nProcessing NFT {nft_name} (Token ID: {token_id}) ({token_index}/{total}): {', '.join(pending)}")
+        with self.metrics.worker():
+            complete = True
+            for group in self._pagination_groups(pending):
+                outputs = {t: self.streams[t].open_output(token_id, nft_name) for t in group}
+                if not await self._handle_pagination_async(session, token_id, token_index, total, outputs):
+                    complete = False
+                    continue
+                for t, output in outputs.items():
+                    complete &= await asyncio.to_thread(self._finish_type, token_id, nft_name, t, output)
+        self.metrics.inc("items_total", result="done" if complete else "failed")
+    
+    async def run_async(self, tokens: List[Dict[str, Any]], concurrency: int = MAX_CONCURRENCY):
+        """Collect all tokens with `concurrency` coroutines sharing one HTTP session."""
+        if aiohttp is None:
+            raise RuntimeError("Async collection mode requires aiohttp: pip install aiohttp")
+        
+        total = len(tokens)
+        self.metrics.set_gauge("workers", concurrency)
+        self.metrics.set_gauge("queue_depth", total)
+        queue = asyncio.Queue()
+        for idx, token in enumerate(tokens, 1):
+            queue.put_nowait((idx, token))
+        
+        async def worker():
+            while True:
+                try:
+                    idx, token = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await self.process_token_async(session, token, idx, total)
+                except Exception as e:
+                    print(f"Error processing token: {e}")
+        
+        timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout, connector=connector) as session:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
     
     def finalize_operation(self):
-        """Finalize operation by saving the list of failed tokens."""
-        failed_path = os.path.join(OUTPUT_DIR, "failed_tokens.json")
-        try:
-            with open(failed_path, "w") as f:
-                json.dump(self.failed_tokens, f, indent=2)
-            print("Finalized operation. Failed tokens saved.")
-        except Exception as e:
-            print(f"Failed to save failed tokens: {str(e)}")
+        """Finalize operation by closing the progress journals and saving the failed tokens of each event type."""
+        self.session.close()
+        for stream in self.streams.values():
+            stream.journal.close()
+            failed_path = os.path.join(stream.output_dir, "failed_tokens.json")
+            try:
+                with open(failed_path, "w") as f:
+                    json.dump(stream.failed_tokens, f, indent=2)
+            except Exception as e:
+                print(f"Failed to save failed {stream.event_type} tokens: {str(e)}")
+        print("Finalized operation. Failed tokens saved.")
+
+def collect(tokens: List[Dict[str, Any]]) -> EventScraper:
+    """Collect the events of every token with the configured mode; returns the finalized scraper."""
+    total_tokens = len(tokens)
+    max_workers = 4 * len(API_KEYS)  # Enough threads to keep every key busy (thread mode)
+    scraper = EventScraper(EVENT_TYPES, pool_size=MAX_CONCURRENCY if USE_ASYNC else max_workers)
+    scraper.metrics.start_reporter(METRICS_DIR, METRICS_INTERVAL)
+    
+    if USE_ASYNC:
+        asyncio.run(scraper.run_async(tokens, MAX_CONCURRENCY))
+    else:
+        scraper.metrics.set_gauge("workers", max_workers)
+        scraper.metrics.set_gauge("queue_depth", total_tokens)
+        # Use ThreadPoolExecutor to process multiple NFTs concurrently.
+        # Adjust max_workers according to your allowed concurrency.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Submit tasks for each token
+            futures = [executor.submit(scraper.process_token, token, idx, total_tokens)
+                       for idx, token in enumerate(tokens, 1)]
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error processing token: {e}")
+    
+    scraper.finalize_operation()
+    scraper.metrics.stop_reporter(METRICS_DIR)
+    return scraper
 
 def main():
     with open(INPUT_JSON) as f:
         token_data = json.load(f)
         tokens = token_data["nfts"]
     
-    total_tokens = len(tokens)
-    scraper = EventScraper()
-    
-    # Use ThreadPoolExecutor to process multiple NFTs concurrently.
-    # Adjust max_workers according to your allowed concurrency.
-    max_workers = 5  # For example, 5 concurrent threads
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit tasks for each token
-        futures = [executor.submit(scraper.process_token, token, idx, total_tokens)
-                   for idx, token in enumerate(tokens, 1)]
-        for future in as_completed(futures):
-            try:
-                future.result()
-            except Exception as e:
-                print(f"Error processing token: {e}")
+    if RETRY_FAILED_ONLY:
+        failed = set()
+        for event_type in EVENT_TYPES:
+            failed_path = os.path.join(OUTPUT_DIR_FORMAT.format(event_type.capitalize()), "failed_tokens.json")
+            if os.path.exists(failed_path):
+                with open(failed_path) as f:
+                    failed.update(map(str, json.load(f)))
+        tokens = [token for token in tokens if str(token["token_id"]) in failed]
+        print(f"Retrying {len(tokens)} failed tokens.")
     
-    scraper.finalize_operation()
+    scraper = collect(tokens)
+    scraper.key_pool.print_summary()
+    scraper.metrics.print_summary()
     print("\nOperation completed successfully!")
-    print(f"Total tokens processed: {len(scraper.processed)}")
+    print(f"Total tokens processed (all event types): {len(scraper.processed)}")
+    for event_type, stream in scraper.streams.items():
+        print(f"  {event_type}: {len(stream.processed)} processed, {len(stream.failed_tokens)} failed")
     print(f"Failed token count: {len(scraper.failed_tokens)}")
 
 if __name__ == "__main__":
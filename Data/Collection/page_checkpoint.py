@@ -0,0 +1,68 @@
+import os
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class PageCheckpoint:
+    """
+    Per-item pagination checkpoints, so an interrupted token or address resumes
+    from its last good page instead of page 1.
+
+    Every fetched page appends one line to `<directory>/<item>.jsonl` holding the
+    page's records and the cursor of the next page (the OpenSea `next` cursor or
+    the Etherscan page number). A cursor of None marks a finished pagination.
+    Writers that spool records elsewhere store an empty record list and their
+    own `position` instead. The file is removed once the item's output file has
+    been written.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, item: str) -> str:
+        return os.path.join(self.directory, f"{item}.jsonl")
+
+    def load(self, item: str) -> Tuple[List[Any], Any, int, bool, Optional[Dict[str, Any]]]:
+        """
+        Return (records, next_cursor, pages, complete, position) for `item`.
+        With no checkpoint this is ([], None, 0, False, None).
+        """
+        records, cursor, pages, position = [], None, 0, None
+        path = self._path(item)
+        if not os.path.exists(path):
+            return records, cursor, pages, False, position
+        good_bytes = 0
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # torn last line from a crash; resume from the page before it
+                    page = json.loads(line)
+                    records.extend(page["records"])
+                    cursor = page["next"]
+                    position = page.get("position")
+                    pages += 1
+                    good_bytes += len(line)
+            if good_bytes < os.path.getsize(path):
+                os.truncate(path, good_bytes)  # so later appends start on a clean line
+        except Exception as e:
+            print(f"Error loading checkpoint for {item}: {e}")
+            return [], None, 0, False, None
+        return records, cursor, pages, pages > 0 and cursor is None, position
+
+    def append(self, item: str, records: List[Any], next_cursor: Any,
+               position: Optional[Dict[str, Any]] = None):
+        """Record one fetched page and the cursor needed to fetch the page after it."""
+        page = {"next": next_cursor, "records": records}
+        if position is not None:
+            page["position"] = position
+        with open(self._path(item), "a") as f:
+            f.write(json.dumps(page) + "\n")
+
+    def clear(self, item: str):
+        """Drop the checkpoint of an item whose output has been saved."""
+        try:
+            os.remove(self._path(item))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import threading
+from typing import Optional
+
+
+class ProgressJournal:
+    """
+    Append-only record of completed items (token IDs, addresses, ...).
+
+    Each completed item costs one short line written to the end of the journal,
+    instead of rewriting the whole processed set. Lines are flushed to the OS
+    immediately and fsynced in batches, so a crashed process loses nothing and a
+    crashed machine loses at most one batch (those items are simply fetched
+    again). On startup the journal is replayed and compacted to one line per item.
+    """
+
+    def __init__(self, path: str, legacy_path: Optional[str] = None,
+                 fsync_every: int = 50, fsync_interval: float = 5.0):
+        self.path = path
+        self.legacy_path = legacy_path  # old progress.json (a JSON list), migrated on replay
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def replay(self) -> set:
+        """
+        Read every completed item, compact the journal and open it for appending.
+        The journal is opened even if reading or compacting fails, so later
+        appends are still recorded; a failed compaction keeps the journal as is.
+        """
+        items = set()
+        try:
+            if self.legacy_path and os.path.exists(self.legacy_path):
+                try:
+                    with open(self.legacy_path) as f:
+                        items.update(json.load(f))
+                except Exception as e:
+                    print(f"Error loading progress from {self.legacy_path}: {e}")
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    for line in f:
+                        try:
+                            items.add(json.loads(line))
+                        except ValueError:
+                            pass  # torn last line from a crash
+            try:
+                self._compact(items)
+            except OSError as e:
+                print(f"Error compacting {self.path}, keeping it uncompacted: {e}")
+            else:
+                if self.legacy_path and os.path.exists(self.legacy_path):
+                    os.remove(self.legacy_path)  # its items now live in the compacted journal
+        finally:
+            self._file = open(self.path, "a")
+        return items
+
+    def _compact(self, items: set):
+        """Atomically rewrite the journal with one line per item."""
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            for item in items:
+                f.write(json.dumps(item) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def append(self, item):
+        """Record one completed item."""
+        line = json.dumps(item) + "\n"
+        with self._lock:
+            if self._file is None:  # appended to before replay
+                self._file = open(self.path, "a")
+            self._file.write(line)
+            self._file.flush()
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """Flush and fsync outstanding entries and close the journal."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._sync()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,73 @@
+import time
+import asyncio
+import threading
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by every worker that uses the same API key.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. A caller
+    that finds the bucket empty reserves the next free slot and sleeps until it
+    arrives, so concurrent callers are paced one after another instead of each
+    sleeping on its own. Works from threads (`acquire`) and asyncio tasks
+    (`acquire_async`).
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available, without taking it."""
+        with self._lock:
+            tokens = min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+            return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def reserve(self) -> float:
+        """Take one token and return how many seconds the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def set_rate(self, rate: float):
+        """Change the refill rate; tokens accrued so far are kept."""
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            self.rate = float(rate)
+
+    def pause(self, until: float):
+        """
+        Hand out no slot before `until` (a time.monotonic() value), e.g. while the
+        key is throttled. Slots reserved before the pause are dropped: their
+        callers reserve again, and the next slots follow one another from `until`.
+        """
+        with self._lock:
+            if until > max(time.monotonic(), self._updated):
+                self._tokens = min(self.capacity, 1.0)
+                self._updated = until
+
+    def acquire(self) -> float:
+        """Block the calling thread until a request may be sent. Returns the time waited."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self) -> float:
+        """Suspend the calling task until a request may be sent. Returns the time waited."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextlib
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Upper bounds (seconds) of the latency / phase histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Upper bounds of the pages-per-item histogram buckets
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+# Where the time of a scraper goes: waiting for a key slot, the HTTP round trip,
+# JSON decoding, writing pages/files/journals, and sleeping before a retry
+PHASES = ("key_wait", "network", "json_decode", "disk_write", "backoff")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _label_text(labels: Labels) -> str:
+    return ",".join(f"{name}={value}" for name, value in labels)
+
+
+class Histogram:
+    """Bucketed distribution with count, sum and max (cumulative buckets in the Prometheus export)."""
+
+    def __init__(self, buckets: Iterable[float]):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # the last bucket holds everything above the largest bound
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (capped at the observed max)."""
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.bounds + (self.max,), self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 6),
+        }
+
+
+class Metrics:
+    """
+    Counters, gauges and histograms of one collection run, shared by the
+    threads / coroutines of a scraper. A series is a metric name plus labels,
+    e.g. requests_total{endpoint="events",status="200"}. Snapshots are written
+    as JSON and Prometheus text, periodically by start_reporter and once more
+    at the end of the run.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self.started = time.monotonic()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.gauges: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reporter = None
+
+    # --- Recording ---
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def add_gauge(self, name: str, delta: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self.gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + delta
+
+    def observe(self, name: str, value: float, buckets: Iterable[float] = LATENCY_BUCKETS, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the seconds spent in the block (works around `await` too)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def phase(self, phase: str):
+        """Time the block as one of PHASES."""
+        return self.timer("phase_seconds", phase=phase)
+
+    def request(self, endpoint: str, key: str, seconds: float, status: Any, nbytes: int = 0):
+        """Record one HTTP request: latency per endpoint and key, status and bytes received."""
+        self.observe("request_seconds", seconds, endpoint=endpoint, key=f"...{key[-6:]}")
+        self.observe("phase_seconds", seconds, phase="network")
+        self.inc("requests_total", endpoint=endpoint, status=status)
+        if nbytes:
+            self.inc("bytes_received_total", nbytes, endpoint=endpoint)
+
+    @contextlib.contextmanager
+    def worker(self):
+        """Mark one worker busy for the block; utilization is busy time over workers x elapsed time."""
+        self.add_gauge("workers_busy", 1)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_gauge("workers_busy", -1)
+            self.inc("worker_busy_seconds_total", time.perf_counter() - start)
+
+    # --- Reading ---
+
+    def counter(self, name: str, **labels) -> float:
+        """Sum of the series of a counter whose labels include `labels`."""
+        wanted = set(_labels(labels))
+        with self._lock:
+            return sum(v for key, v in self.counters.get(name, {}).items() if wanted <= set(key))
+
+    def gauge(self, name: str, **labels) -> float:
+        with self._lock:
+            return self.gauges.get(name, {}).get(_labels(labels), 0)
+
+    def utilization(self) -> float:
+        elapsed = time.monotonic() - self.started
+        workers = self.gauge("workers")
+        busy = self.counter("worker_busy_seconds_total")
+        return round(busy / (workers * elapsed), 4) if workers and elapsed else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every series as plain JSON; labels are flattened to "name=value,..." keys."""
+        utilization = self.utilization()
+        with self._lock:
+            return {
+                "namespace": self.namespace,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "elapsed_seconds": round(time.monotonic() - self.started, 3),
+                "worker_utilization": utilization,
+                "counters": {name: {_label_text(k): v for k, v in series.items()}
+                             for name, series in self.counters.items()},
+                "gauges": {name: {_label_text(k): v for k, v in series.items()}
+                           for name, series in self.gauges.items()},
+                "histograms": {name: {_label_text(k): h.to_dict() for k, h in series.items()}
+                               for name, series in self.histograms.items()},
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        def series_name(name, labels, extra=()):
+            pairs = [f'{n}="{v}"' for n, v in labels + tuple(extra)]
+            return f"{self.namespace}_{name}" + (f"{{{','.join(pairs)}}}" if pairs else "")
+
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {self.namespace}_{name} counter")
+                lines += [f"{series_name(name, k)} {v:g}" for k, v in sorted(series.items())]
+            for name, series in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {self.namespace}_{name} gauge")
+                lines += [f"{series_name(name, k)} {v:g}" for k, v in sorted(series.items())]
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {self.namespace}_{name} histogram")
+                for k, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(h.bounds + (float("inf"),), h.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{series_name(name + '_bucket', k, [('le', le)])} {cumulative}")
+                    lines.append(f"{series_name(name + '_sum', k)} {h.sum:.6f}")
+                    lines.append(f"{series_name(name + '_count', k)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    # --- Export ---
+
+    def write(self, directory: str):
+        """Atomically write <namespace>.json and <namespace>.prom into `directory`."""
+        os.makedirs(directory, exist_ok=True)
+        for ext, text in ((".json", json.dumps(self.snapshot(), indent=2)), (".prom", self.to_prometheus())):
+            path = os.path.join(directory, self.namespace + ext)
+            with open(path + ".tmp", "w") as f:
+                f.write(text)
+            os.replace(path + ".tmp", path)
+
+    def status_line(self) -> str:
+        elapsed = time.monotonic() - self.started
+        pages = self.counter("pages_total")
+        return (f"[{elapsed:7.0f}s] {self.counter('items_total', result='done'):.0f} done, "
+                f"{self.counter('items_total', result='failed'):.0f} failed, "
+                f"{self.counter('items_total', result='skipped'):.0f} skipped, "
+                f"{self.gauge('queue_depth'):.0f} queued | {pages:.0f} pages ({pages / elapsed:.1f}/s), "
+                f"{self.counter('requests_total'):.0f} requests, {self.counter('retries_total'):.0f} retries | "
+                f"utilization {self.utilization():.0%}")
+
+    def start_reporter(self, directory: str, interval: float):
+        """Write a snapshot and print a status line every `interval` seconds until stop_reporter."""
+        def report():
+            while not self._stop.wait(interval):
+                try:
+                    self.write(directory)
+                except OSError as e:
+                    print(f"Failed to write metrics: {e}")
+                print(self.status_line())
+
+        self._stop.clear()
+        self._reporter = threading.Thread(target=report, daemon=True)
+        self._reporter.start()
+
+    def stop_reporter(self, directory: Optional[str] = None):
+        """Stop the periodic reporter and write the final snapshot."""
+        self._stop.set()
+        if self._reporter is not None:
+            self._reporter.join()
+            self._reporter = None
+        if directory is not None:
+            self.write(directory)
+
+    def print_summary(self):
+        """Print the end-of-run summary: totals, phase split and latency per endpoint and key."""
+        snap = self.snapshot()
+        elapsed = snap["elapsed_seconds"]
+        pages = self.counter("pages_total")
+        print(f"\nCollection metrics ({self.namespace}):")
+        print(f"  {self.status_line()}")
+        print(f"  {self.counter('records_total'):.0f} records, "
+              f"{self.counter('bytes_received_total') / 1e6:.1f} MB received, "
+              f"{pages / elapsed if elapsed else 0:.1f} pages/s over {elapsed:.1f}s")
+        retries = snap["counters"].get("retries_total", {})
+        if retries:
+            print("  Retries: " + ", ".join(f"{k.split('=', 1)[1]} {v:.0f}" for k, v in sorted(retries.items())))
+        per_item = snap["histograms"].get("pages_per_item", {}).get("")
+        if per_item:
+            print(f"  Pages per item: mean {per_item['mean']:.1f}, p90 <= {per_item['p90']:g}, max {per_item['max']:g}")
+        phases = snap["histograms"].get("phase_seconds", {})
+        total = sum(h["sum"] for h in phases.values()) or 1.0
+        print("  Time by phase (thread-seconds):")
+        for phase in PHASES:
+            h = phases.get(f"phase={phase}")
+            if h:
+                print(f"    {phase:<12} {h['sum']:9.2f}s ({h['sum'] / total:5.1%}), {h['count']} calls, "
+                      f"p50 <= {h['p50']:g}s, p99 <= {h['p99']:g}s")
+        print("  Request latency:")
+        for labels, h in sorted(snap["histograms"].get("request_seconds", {}).items()):
+            print(f"    {labels}: {h['count']} requests, mean {h['mean']:.3f}s, "
+                  f"p50 <= {h['p50']:g}s, p90 <= {h['p90']:g}s, p99 <= {h['p99']:g}s")
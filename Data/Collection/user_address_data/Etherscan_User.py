@@ -1,181 +1,328 @@
 import os
+import sys
 import time
 import json
 import requests
 import itertools
 import threading
-from collections import deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from key_pool import KeyPool
+from progress_journal import ProgressJournal
+from page_checkpoint import PageCheckpoint
+from event_storage import STORAGE_FORMATS, open_page_sink, read_event_file
+from scrape_metrics import Metrics, COUNT_BUCKETS
+
 # === Configuration ===
 
 OUTPUT_DIR = "Address_Data"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 CSV_INPUT = r"df_table1.csv"  # Path to the df_table1.csv file, it is used to get the list of addresses for collection. 
-API_RATE_LIMIT = 4  # maximum requests per second
+API_RATE_LIMIT = 4  # maximum requests per second, per API key
+STORAGE_FORMAT = "gzip"  # "gzip"/"zstd": transactions streamed to compressed NDJSON page by page; "json": original indent=2 file
+RETRY_FAILED_ONLY = False  # Only process the addresses in failed_addresses.json (they resume from their checkpoints)
+INCREMENTAL_REFRESH = False  # Refresh addresses that already have a file: fetch only blocks from the last stored transaction on
+REQUEST_TIMEOUT = 15  # Seconds per page request
+RETRY_DELAY = 5  # Seconds to wait before retrying a page after a request error
+MAX_REJECTED_RETRIES = 10  # 401/429 responses for one page before the address is marked failed
+VERBOSE = False  # Print every page, retry and skip; otherwise only failures and a periodic status line
+METRICS_INTERVAL = 30  # Seconds between the etherscan.json / etherscan.prom snapshots in OUTPUT_DIR
 
 # Etherscan API Base URL (for V2 endpoints)
 BASE_URL = "https://api.etherscan.io/v2/api"
 
-# Define a pool of API keys.
-API_KEYS = deque([
+# Define a pool of API keys. Requests are spread across all keys at once.
+API_KEYS = [
     "your_api_key_1",
     "your_api_key_2",
     "your_api_key_3"
-])
+]
 HEADERS = {"accept": "application/json"}
 
+
+def etherscan_status(data: dict) -> int:
+    """
+    Etherscan reports throttling and bad keys inside a HTTP 200 body.
+    Map them to the HTTP status codes KeyPool understands.
+    """
+    if data.get("status") == "1":
+        return 200
+    message = f"{data.get('message', '')} {data.get('result', '')}".lower()
+    if "rate limit" in message:
+        return 429
+    if "invalid api key" in message or "missing/invalid" in message:
+        return 401
+    return 200  # Other API errors (e.g. "No transactions found") are not the key's fault
+
+
+def log(message: str):
+    """Per-page, per-retry and per-address progress; printed only with VERBOSE."""
+    if VERBOSE:
+        print(message)
+
 # === Class Definition ===
 
 class EtherscanScraper:
     def __init__(self):
-        self.current_key = API_KEYS[0]
+        # Etherscan does not send Retry-After; its limits reset every second.
+        self.key_pool = KeyPool(API_KEYS, API_RATE_LIMIT, default_cooldown=1.0, verbose=VERBOSE)
+        self.metrics = Metrics("etherscan")  # counters, latency histograms and the time split of the run
         self.failed_addresses = []  # stores addresses that failed processing
+        self.journal = ProgressJournal(os.path.join(OUTPUT_DIR, "progress.jsonl"),
+                                       legacy_path=os.path.join(OUTPUT_DIR, "progress.json"))
         self.processed = self._load_progress()  # load addresses already processed
+        self.checkpoints = PageCheckpoint(os.path.join(OUTPUT_DIR, "checkpoints"))  # resume points for unfinished addresses
         self.lock = threading.Lock()  # to protect shared data
 
     def _load_progress(self) -> set:
-        """Load processed addresses from disk."""
-        progress_path = os.path.join(OUTPUT_DIR, "progress.json")
-        if os.path.exists(progress_path):
-            try:
-                with open(progress_path, "r") as f:
-                    return set(json.load(f))
-            except Exception as e:
-                print(f"Error loading progress: {e}")
+        """Replay the progress journal to get the processed addresses."""
+        try:
+            return self.journal.replay()
+        except Exception as e:
+            print(f"Error loading progress: {e}")
         return set()
 
-    def _save_progress(self):
-        """Atomically save processing progress to disk."""
-        progress_path = os.path.join(OUTPUT_DIR, "progress.json")
-        temp_path = f"{progress_path}.tmp"
-        with self.lock:
-            try:
-                with open(temp_path, "w") as f:
-                    json.dump(list(self.processed), f, indent=2)
-                os.replace(temp_path, progress_path)
-            except Exception as e:
-                print(f"Error saving progress: {e}")
+    def _save_progress(self, address: str):
+        """Append a finished address to the progress journal."""
+        try:
+            self.journal.append(address)
+        except Exception as e:
+            print(f"Error saving progress: {e}")
 
-    def _rotate_key(self):
-        """Cycle through available API keys."""
-        with self.lock:
-            API_KEYS.rotate(-1)
-            self.current_key = API_KEYS[0]
-        print(f"Rotated API key. New key ending with: ...{self.current_key[-6:]}")
-
-    def _save_address_file(self, address: str, tx_data: list):
-        """Save the buyer's transaction data to an atomic JSON file."""
-        filename = os.path.join(OUTPUT_DIR, f"{address}.json")
-        temp_path = f"{filename}.tmp"
-        data_to_save = {
+    def _open_address_output(self, address: str):
+        """Return the page sink that receives the transactions of an address as pages arrive."""
+        return open_page_sink(os.path.join(OUTPUT_DIR, address), address, self.checkpoints, STORAGE_FORMAT)
+
+    def _save_address_file(self, address: str, output) -> bool:
+        """Save the buyer's transaction data to an atomic file. Returns True on success."""
+        header = {
             "address": address,
-            "transaction_count": len(tx_data),
-            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "transactions": tx_data
+            "transaction_count": output.count,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ")
         }
         try:
-            with open(temp_path, "w") as f:
-                json.dump(data_to_save, f, indent=2)
-            os.replace(temp_path, filename)
-            print(f"Saved data for address {address} with {len(tx_data)} transactions.")
+            output.finish(header, "transactions")
+            log(f"Saved data for address {address} with {output.count} transactions.")
+            return True
         except Exception as e:
             print(f"Failed to save data for address {address}: {e}")
+            return False
+
+    def _find_address_file(self, address: str):
+        """Return the path of the stored file of an address in any storage format (the newest if several), or None."""
+        paths = [os.path.join(OUTPUT_DIR, address + ext) for ext in STORAGE_FORMATS.values()]
+        paths = [path for path in paths if os.path.exists(path)]
+        if paths:
+            return max(paths, key=os.path.getmtime)
+        return None
 
-    def get_all_txlist_for_address(self, address: str) -> list:
+    def get_all_txlist_for_address(self, address: str, output, startblock: int = 0,
+                                   seen_hashes: set = None) -> bool:
         """
-        Fetch all transactions for a given address using pagination.
+        Fetch all transactions for a given address using pagination, handing each page to `output`.
         Implements a retry mechanism for each page request.
-        Returns a list of transactions.
+        Returns True once every page was retrieved, False if the address could not be fully retrieved.
+        Every page is checkpointed, so a failed address resumes from its last good page.
+        Transactions whose hash is in `seen_hashes` are dropped (used by incremental refreshes).
         """
-        all_tx = []
-        page = 1
+        next_page, pages_done, complete = output.resume()
+        if complete:
+            return True
+        if pages_done:
+            log(f"Address {address}: Resuming from checkpoint at page {next_page} ({output.count} transactions).")
+        page = next_page or 1
         offset = 100  # Number of transactions per page; adjust as needed.
         max_retries = 3
+        fetched = 0  # pages fetched in this run
 
         while True:
             success = False
-            for attempt in range(1, max_retries + 1):
-                apikey = self.current_key
+            attempt = 0
+            rejected = 0  # 401/429 responses for this page
+            while attempt < max_retries and rejected < MAX_REJECTED_RETRIES:
+                try:
+                    with self.metrics.phase("key_wait"):
+                        apikey = self.key_pool.acquire()
+                except RuntimeError as e:  # every key has been disabled
+                    print(f"Address {address}: {e}")
+                    return False
                 params = {
                     "chainid": 1,
                     "module": "account",
                     "action": "txlist",
                     "address": address,
-                    "startblock": 0,
+                    "startblock": startblock,
                     "endblock": 99999999,
                     "page": page,
                     "offset": offset,
                     "sort": "asc",
                     "apikey": apikey
                 }
+                start = time.monotonic()
                 try:
-                    response = requests.get(BASE_URL, headers=HEADERS, params=params, timeout=15)
-                    response.raise_for_status()
-                    data = response.json()
-                    if data.get("status") == "1":
+                    response = requests.get(BASE_URL, headers=HEADERS, params=params, timeout=REQUEST_TIMEOUT)
+                    latency = time.monotonic() - start
+                    with self.metrics.phase("json_decode"):
+                        data = response.json() if response.status_code == 200 else {}
+                except (requests.RequestException, ValueError) as e:
+                    self.key_pool.report(apikey, None, time.monotonic() - start)
+                    self.metrics.request("txlist", apikey, time.monotonic() - start, "error")
+                    self.metrics.inc("retries_total", reason="error")
+                    log(f"HTTP error for address {address} on page {page} (attempt {attempt + 1}/{max_retries}): {e}")
+                else:
+                    status = etherscan_status(data) if response.status_code == 200 else response.status_code
+                    self.key_pool.report(apikey, status, latency, response.headers.get("Retry-After"))
+                    self.metrics.request("txlist", apikey, latency, status, len(response.content))
+                    if status in (401, 429):
+                        self.metrics.inc("retries_total", reason=status)
+                        rejected += 1
+                        continue  # The key pool has cooled down or disabled this key; retry with another one.
+                    if response.status_code != 200:
+                        self.metrics.inc("retries_total", reason="error")
+                        log(f"HTTP {response.status_code} for address {address} on page {page} (attempt {attempt + 1}/{max_retries})")
+                    # An address without any transactions is a valid, empty result.
+                    elif data.get("status") == "1" or data.get("message") == "No transactions found":
                         success = True
                         break
                     else:
-                        print(f"API returned error for address {address} on page {page} (attempt {attempt}/{max_retries}): {data.get('message')}")
-                except requests.RequestException as e:
-                    print(f"HTTP error for address {address} on page {page} (attempt {attempt}/{max_retries}): {e}")
-                time.sleep(5)  # Wait before retrying
+                        self.metrics.inc("retries_total", reason="api_error")
+                        log(f"API returned error for address {address} on page {page} (attempt {attempt + 1}/{max_retries}): {data.get('message')}")
+                attempt += 1
+                with self.metrics.phase("backoff"):
+                    time.sleep(RETRY_DELAY)  # Wait before retrying
 
             if not success:
                 print(f"Max retries reached for address {address} on page {page}. Aborting retrieval for this address.")
-                break
+                return False
 
             tx_list = data.get("result", [])
             if not isinstance(tx_list, list):
                 print(f"Unexpected result format for address {address} on page {page}.")
-                break
+                return False
+
+            last_page = len(tx_list) < offset
+            fetched += 1
+            self.metrics.inc("pages_total")
+            self.metrics.inc("records_total", len(tx_list))
+            if seen_hashes is not None:
+                tx_list = [tx for tx in tx_list if tx.get("hash") not in seen_hashes]
+                seen_hashes.update(tx.get("hash") for tx in tx_list)
 
-            all_tx.extend(tx_list)
-            print(f"Address {address}: Retrieved {len(tx_list)} transactions on page {page}. Total so far: {len(all_tx)}")
-            if len(tx_list) < offset:
+            log(f"Address {address}: Retrieved {len(tx_list)} transactions on page {page}. Total so far: {output.count + len(tx_list)}")
+            with self.metrics.phase("disk_write"):
+                output.add_page(tx_list, None if last_page else page + 1)
+            if last_page:
                 break  # Last page reached
 
             page += 1
-            time.sleep(1 / API_RATE_LIMIT)  # Respect the rate limit
 
-        return all_tx
+        self.metrics.observe("pages_per_item", fetched, COUNT_BUCKETS)
+        return True
+
+    def refresh_address(self, address: str, stored_path: str) -> bool:
+        """
+        Bring a stored address file up to date without refetching its history.
+        The query starts at the highest stored blockNumber (that block may have
+        been stored only partly), new transactions are de-duplicated by hash,
+        and the stored plus new transactions are rewritten in STORAGE_FORMAT.
+        Returns True once the updated file has been saved.
+        """
+        try:
+            last_block, seen_hashes, stored_count = 0, set(), 0
+            _, stored = read_event_file(stored_path)
+            for tx in stored:
+                last_block = max(last_block, int(tx.get("blockNumber", 0)))
+                seen_hashes.add(tx.get("hash"))
+                stored_count += 1
+
+            # The refresh has its own checkpoint; its first pages are the stored transactions.
+            # Page cursor 0 marks a copy still in progress, 1 the first Etherscan page to fetch.
+            output = open_page_sink(os.path.join(OUTPUT_DIR, address), f"{address}.refresh",
+                                    self.checkpoints, STORAGE_FORMAT)
+            next_page, pages_done, _ = output.resume()
+            if pages_done and next_page == 0:
+                self.checkpoints.clear(output.item)  # interrupted while copying; copy again
+                next_page, pages_done, _ = output.resume()
+            if not pages_done and stored_count:
+                _, stored = read_event_file(stored_path)
+                copied = 0
+                while copied < stored_count:
+                    chunk = list(itertools.islice(stored, 1000))
+                    copied += len(chunk)
+                    output.add_page(chunk, 1 if copied >= stored_count else 0)
+        except Exception as e:
+            print(f"Failed to read stored transactions of {address}: {e}")
+            return False
+
+        log(f"Address {address}: {stored_count} stored transactions, refreshing from block {last_block}.")
+        if not self.get_all_txlist_for_address(address, output, startblock=last_block, seen_hashes=seen_hashes):
+            return False
+        with self.metrics.phase("disk_write"):
+            if not self._save_address_file(address, output):
+                return False
+            if os.path.abspath(stored_path) != os.path.abspath(output.path):
+                os.remove(stored_path)  # replaced by the file in the current STORAGE_FORMAT
+        log(f"Address {address}: {output.count - stored_count} new transactions.")
+        return True
 
     def process_address(self, address: str, idx: int, total: int):
         """
         Process a single address:
-         - Skip if already processed or if a buyer file already exists.
+         - Skip if already processed or if a buyer file already exists
+           (with INCREMENTAL_REFRESH, an existing file is refreshed instead).
          - Retrieve all transactions via pagination with retries.
          - Save the result.
          - Update progress.
         """
-        filename = os.path.join(OUTPUT_DIR, f"{address}.json")
-        if os.path.exists(filename):
-            print(f"Skipping {address} (file exists).")
+        self.metrics.add_gauge("queue_depth", -1)
+        stored_path = self._find_address_file(address)
+        if stored_path and INCREMENTAL_REFRESH:
+            log(f"Refreshing address {address} ({idx}/{total})")
+            with self.metrics.worker():
+                refreshed = self.refresh_address(address, stored_path)
+            self.metrics.inc("items_total", result="done" if refreshed else "failed")
+            if refreshed:
+                with self.lock:
+                    self.processed.add(address)
+            else:
+                with self.lock:
+                    self.failed_addresses.append(address)
+            return
+
+        if stored_path:
+            log(f"Skipping {address} (file exists).")
+            self.metrics.inc("items_total", result="skipped")
             with self.lock:
                 self.processed.add(address)
             return
 
         with self.lock:
             if address in self.processed:
-                print(f"Skipping {address} (already processed).")
+                log(f"Skipping {address} (already processed).")
+                self.metrics.inc("items_total", result="skipped")
                 return
 
-        print(f"Processing address {address} ({idx}/{total})")
-        tx_data = self.get_all_txlist_for_address(address)
-        if tx_data is not None:
-            self._save_address_file(address, tx_data)
-            with self.lock:
-                self.processed.add(address)
-            self._save_progress()
-        else:
+        log(f"Processing address {address} ({idx}/{total})")
+        with self.metrics.worker():
+            output = self._open_address_output(address)
+            done = self.get_all_txlist_for_address(address, output)
+            if done:
+                with self.metrics.phase("disk_write"):
+                    done = self._save_address_file(address, output)
+                    if done:
+                        with self.lock:
+                            self.processed.add(address)
+                        self._save_progress(address)
+        self.metrics.inc("items_total", result="done" if done else "failed")
+        if not done:
             with self.lock:
                 self.failed_addresses.append(address)
-        time.sleep(1 / API_RATE_LIMIT)
 
     def finalize(self):
-        """Save the failed addresses to a JSON file."""
+        """Close the progress journal and save the failed addresses to a JSON file."""
+        self.journal.close()
         failed_path = os.path.join(OUTPUT_DIR, "failed_addresses.json")
         try:
             with open(failed_path, "w") as f:
@@ -184,6 +331,27 @@ class EtherscanScraper:
         except Exception as e:
             print(f"Failed to save failed addresses: {e}")
 
+def collect(addresses) -> EtherscanScraper:
+    """Collect the transactions of every address concurrently; returns the finalized scraper."""
+    total = len(addresses)
+    scraper = EtherscanScraper()
+    max_workers = 4 * len(API_KEYS)  # Enough threads to keep every key busy.
+    scraper.metrics.set_gauge("workers", max_workers)
+    scraper.metrics.set_gauge("queue_depth", total)
+    scraper.metrics.start_reporter(OUTPUT_DIR, METRICS_INTERVAL)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(scraper.process_address, addr, idx, total)
+                   for idx, addr in enumerate(addresses, 1)]
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Exception during processing: {e}")
+
+    scraper.finalize()
+    scraper.metrics.stop_reporter(OUTPUT_DIR)
+    return scraper
+
 # === Main Routine ===
 
 def main():
@@ -197,22 +365,15 @@ def main():
             addresses = df[col].dropna().unique()
             all_addresses.update(addresses)
     print(f"Found {len(all_addresses)} unique addresses from {cols_to_check}.")
-
-    total = len(all_addresses)
-    scraper = EtherscanScraper()
+    if RETRY_FAILED_ONLY:
+        with open(os.path.join(OUTPUT_DIR, "failed_addresses.json")) as f:
+            all_addresses &= set(json.load(f))
+        print(f"Retrying {len(all_addresses)} failed addresses.")
 
     # 2. Process addresses concurrently.
-    max_workers = 5  # Adjust based on system and API constraints.
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(scraper.process_address, addr, idx, total)
-                   for idx, addr in enumerate(all_addresses, 1)]
-        for future in as_completed(futures):
-            try:
-                future.result()
-            except Exception as e:
-                print(f"Exception during processing: {e}")
-
-    scraper.finalize()
+    scraper = collect(all_addresses)
+    scraper.key_pool.print_summary()
+    scraper.metrics.print_summary()
     print(f"Total processed addresses: {len(scraper.processed)}")
     print(f"Total failed addresses: {len(scraper.failed_addresses)}")
 
@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 import os
+import sys
 import time
-import json
 import requests
 import pandas as pd
-import datetime
-from itertools import cycle
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from key_pool import KeyPool
+from event_storage import STORAGE_FORMATS, open_page_sink
+from page_checkpoint import PageCheckpoint
+from Etherscan_User import STORAGE_FORMAT, etherscan_status
 
 # ─── CONFIG ─────────────────────────────────────────────────────────
 DF5_PATH      = r"your_\Model\Analysis_NFT_Sales\df_tables"         # your df_table5.csv
@@ -15,22 +20,24 @@ API_KEYS      = [
     "your_api_key_2",
     "your_api_key_3"
 ]
-RATE_LIMIT    = 4    # requests per second
+RATE_LIMIT    = 4    # requests per second, per API key
 MAX_RETRIES   = 3
+MAX_REJECTED  = 10   # 401/429 responses per page before giving up on the address
 PAGE_SIZE     = 100
 BASE_URL      = "https://api.etherscan.io/api"
 # ────────────────────────────────────────────────────────────────────
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def get_txlist(address, api_keys):
-    """Fetch all txs for `address` using pagination. Rotates keys on API errors."""
+def get_txlist(address, key_pool):
+    """
+    Fetch all txs for `address` using pagination. Each request uses the key the pool schedules next.
+    Returns (txs, complete); complete is False if a page was given up on.
+    """
     all_txs = []
     page = 1
-    key_cycle = cycle(api_keys)
 
     while True:
-        apikey = next(key_cycle)
         params = {
             "module": "account",
             "action": "txlist",
@@ -39,52 +46,79 @@ def get_txlist(address, api_keys):
             "endblock": 99999999,
             "page": page,
             "offset": PAGE_SIZE,
-            "sort": "asc",
-            "apikey": apikey
+            "sort": "asc"
         }
-        for attempt in range(1, MAX_RETRIES+1):
+        attempt = 0
+        rejected = 0
+        while attempt < MAX_RETRIES and rejected < MAX_REJECTED:
+            params["apikey"] = key_pool.acquire()
+            start = time.monotonic()
             try:
                 r = requests.get(BASE_URL, params=params, timeout=15)
-                r.raise_for_status()
-                data = r.json()
-                if data.get("status") == "1" and isinstance(data.get("result"), list):
-                    txs = data["result"]
+                data = r.json() if r.status_code == 200 else {}
+            except Exception as e:
+                key_pool.report(params["apikey"], None, time.monotonic() - start)
+                print(f"{address}: HTTP error on page {page} (attempt {attempt + 1}): {e}")
+            else:
+                status = etherscan_status(data) if r.status_code == 200 else r.status_code
+                key_pool.report(params["apikey"], status, time.monotonic() - start, r.headers.get("Retry-After"))
+                if status in (401, 429):
+                    rejected += 1
+                    continue  # key is cooling down or disabled; the pool hands out another one
+                if r.status_code != 200:
+                    print(f"{address}: HTTP {r.status_code} on page {page} (attempt {attempt + 1})")
+                elif data.get("status") == "1" and isinstance(data.get("result"), list) \
+                        or data.get("message") == "No transactions found":  # a valid, empty result
+                    txs = data["result"] if isinstance(data.get("result"), list) else []
                     all_txs.extend(txs)
                     print(f"{address}: page {page} → {len(txs)} txs")
                     break
                 else:
                     msg = data.get("message") or data.get("result")
-                    print(f"{address}: API error on page {page} (attempt {attempt}): {msg}")
-            except Exception as e:
-                print(f"{address}: HTTP error on page {page} (attempt {attempt}): {e}")
+                    print(f"{address}: API error on page {page} (attempt {attempt + 1}): {msg}")
+            attempt += 1
             time.sleep(1)  # back‐off
         else:
             print(f"{address}: giving up after {MAX_RETRIES} retries on page {page}")
-            break
+            return all_txs, False
 
         if len(txs) < PAGE_SIZE:
             # last page
             break
         page += 1
-        time.sleep(1.0 / RATE_LIMIT)
 
-    return all_txs
+    return all_txs, True
 
-def save_json(address, txs):
-    """Atomically write out the JSON file for `address`."""
-    timestamp = datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
-    payload = {
+def save_address_file(address, txs, complete, checkpoints, staging):
+    """
+    Atomically write the file for `address` in Etherscan_User's STORAGE_FORMAT
+    and remove the copies in other formats, so each address keeps one file.
+    The file is built in the staging folder. Etherscan_User's checkpoint and
+    spool of the address are dropped only if it was fetched completely;
+    otherwise Etherscan_User can still resume it.
+    """
+    staging.clear(address)  # leftovers of an interrupted fix run
+    output = open_page_sink(os.path.join(staging.directory, address), address, staging, STORAGE_FORMAT)
+    output.resume()
+    output.add_page(txs, None)
+    output.finish({
         "address": address,
         "transaction_count": len(txs),
-        "timestamp": timestamp,
-        "transactions": txs
-    }
-    fname = os.path.join(OUTPUT_DIR, f"{address}.json")
-    tmp   = fname + ".tmp"
-    with open(tmp, "w") as f:
-        json.dump(payload, f, indent=2)
-    os.replace(tmp, fname)
-    print(f"→ saved {address}.json with {len(txs)} txs")
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    }, "transactions")
+    path = os.path.join(OUTPUT_DIR, os.path.basename(output.path))
+    os.replace(output.path, path)
+    for ext in STORAGE_FORMATS.values():
+        old_path = os.path.join(OUTPUT_DIR, address + ext)
+        if old_path != path and os.path.exists(old_path):
+            os.remove(old_path)
+    if complete:
+        checkpoints.clear(address)  # the transactions were refetched from the first page
+        if os.path.exists(path + ".spool"):
+            os.remove(path + ".spool")
+        print(f"→ saved {os.path.basename(path)} with {len(txs)} txs")
+    else:
+        print(f"→ saved {os.path.basename(path)} with {len(txs)} txs (incomplete; checkpoint kept)")
 
 def main():
     # 1) load df_table5 and pick zero‐tx addresses
@@ -98,14 +132,25 @@ def main():
     )
     print(f"Found {len(zeros)} addresses with transaction_count == 0")
 
-    # 2) re‐fetch each one
-    for addr in zeros:
-        try:
-            print(f"\nFetching {addr} …")
-            txs = get_txlist(addr, API_KEYS)
-            save_json(addr, txs)
-        except Exception as e:
-            print(f"!!! failed for {addr}: {e}")
+    # 2) re‐fetch each one, with every key in use at the same time
+    key_pool = KeyPool(API_KEYS, RATE_LIMIT, default_cooldown=1.0)
+    checkpoints = PageCheckpoint(os.path.join(OUTPUT_DIR, "checkpoints"))
+    staging = PageCheckpoint(os.path.join(OUTPUT_DIR, "fix_staging"))
+
+    def refetch(addr):
+        print(f"\nFetching {addr} …")
+        txs, complete = get_txlist(addr, key_pool)
+        save_address_file(addr, txs, complete, checkpoints, staging)
+
+    with ThreadPoolExecutor(max_workers=4 * len(API_KEYS)) as executor:
+        futures = {executor.submit(refetch, addr): addr for addr in zeros}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"!!! failed for {futures[future]}: {e}")
+
+    key_pool.print_summary()
 
 if __name__ == "__main__":
     main()
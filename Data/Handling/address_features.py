@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Collection"))
+from event_storage import STORAGE_FORMATS, read_event_file
+
+# === Configuration ===
+
+ADDRESS_DIR = r"C:\Emory\Research\NFT\Project\Address_Data"  # Etherscan_User.py output
+END_DATE = datetime.datetime(2025, 3, 10, tzinfo=datetime.timezone.utc)  # end of the address active_period
+END_TIMESTAMP = int(END_DATE.timestamp())
+WORKERS = os.cpu_count() or 4  # worker processes that parse address files
+BATCH_SIZE = 200  # address files per worker task
+
+# Address tables: file, address column, df_table1 column the addresses come from
+ROLE_TABLES = [
+    ("df_table4.csv", "buyer_n_address", "buyer_n_sale"),
+    ("df_table5.csv", "seller_n_address", "seller_n_sale"),
+    ("df_table6.csv", "buyer_n-1_address", "buyer_n-1_sale"),
+    ("df_table7.csv", "seller_n-1_address", "seller_n-1_sale"),
+]
+ADDRESS_METRICS = {
+    "transaction_count": pl.Int64,
+    "active_period": pl.Float64,
+    "total_value": pl.Float64,
+    "total_gasUsed": pl.Int64,
+    "avg_gasPrice": pl.Float64,
+    "avg_gasLimit": pl.Float64,
+    "rolling_avg_value_last10": pl.Float64,
+    "rolling_std_value_last10": pl.Float64,
+}
+
+# Etherscan transaction fields used by the metrics, kept as strings until they are cast in bulk
+RAW_FIELDS = ["value", "gasUsed", "gasPrice", "gas", "timeStamp"]
+RAW_SCHEMA = {"address": pl.String, **{field: pl.String for field in RAW_FIELDS}}
+
+
+def read_address_batch(items: List[Tuple[str, str]]) -> pl.DataFrame:
+    """Worker task: the raw transaction fields of a batch of (address, path) files."""
+    columns = {name: [] for name in RAW_SCHEMA}
+    for address, path in items:
+        try:
+            _, transactions = read_event_file(path)
+            rows = [[tx.get(field) for field in RAW_FIELDS] for tx in transactions]
+        except Exception as e:
+            print(f"Error processing {address}: {e}")
+            continue
+        columns["address"].extend([address] * len(rows))
+        for i, field in enumerate(RAW_FIELDS):
+            columns[field].extend(row[i] for row in rows)
+    return pl.DataFrame(columns, schema=RAW_SCHEMA)
+
+
+def load_transactions(files: Dict[str, str], workers: int = WORKERS, batch_size: int = BATCH_SIZE) -> pl.DataFrame:
+    """
+    Load the transactions of every address in `files` (address -> path) once into
+    one typed table. Values stay in wei as Int128, so sums are exact.
+    """
+    items = sorted(files.items())
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(read_address_batch, batches))
+    else:
+        frames = [read_address_batch(batch) for batch in batches]
+    raw = pl.concat(frames) if frames else pl.DataFrame(schema=RAW_SCHEMA)
+    typed = raw.select(
+        "address",
+        pl.col("value").fill_null("").str.strip_chars().replace("", "0").cast(pl.Int128, strict=False).alias("value_wei"),
+        pl.col("gasUsed").cast(pl.Int64, strict=False),
+        pl.col("gasPrice").cast(pl.Int64, strict=False),
+        pl.col("gas").cast(pl.Int64, strict=False),
+        pl.col("timeStamp").cast(pl.Int64, strict=False),
+    )
+    # A field that is present but not an integer fails its cast; such transactions are dropped and reported
+    bad = pl.col("value_wei").is_null()
+    for field in RAW_FIELDS[1:]:
+        bad = bad | (raw[field].is_not_null() & pl.col(field).is_null())
+    invalid = typed.filter(bad)
+    if invalid.height:
+        counts = invalid.group_by("address").len().sort("len", descending=True)
+        print(f"Dropped {invalid.height} transactions with non-numeric fields from {counts.height} addresses "
+              f"(most: {', '.join(f'{a} ({n})' for a, n in counts.head(5).iter_rows())}).")
+    return typed.filter(~bad)
+
+
+def address_features(transactions: pl.DataFrame, end_timestamp: int = END_TIMESTAMP) -> pl.DataFrame:
+    """
+    The df_table4-7 metrics of every address in `transactions`, in one group-by.
+    Addresses without transactions get no row, as in Table_NFTs.ipynb.
+    """
+    value_eth = pl.col("value_wei").cast(pl.Float64) / 10**18
+    last10 = value_eth.tail(10)  # rows are sorted by timeStamp within each address
+    return (transactions.lazy()
+            .sort("address", "timeStamp", maintain_order=True)
+            .group_by("address", maintain_order=True)
+            .agg(
+                pl.len().cast(pl.Int64).alias("transaction_count"),
+                ((end_timestamp - pl.col("timeStamp").min()).clip(lower_bound=0) / (24 * 3600))
+                .cast(pl.Float64).alias("active_period"),
+                (pl.col("value_wei").sum().cast(pl.Float64) / 10**18).alias("total_value"),
+                pl.col("gasUsed").sum().alias("total_gasUsed"),
+                pl.col("gasPrice").mean().alias("avg_gasPrice"),
+                pl.col("gas").mean().alias("avg_gasLimit"),
+                last10.mean().alias("rolling_avg_value_last10"),
+                last10.std(ddof=1).alias("rolling_std_value_last10"),
+            )
+            .collect())
+
+
+def role_tables(features: pl.DataFrame, table1: pl.DataFrame) -> Dict[str, pl.DataFrame]:
+    """Project df_table4-7 from the shared address features, one table per buyer/seller role."""
+    tables = {}
+    for file, address_col, sale_col in ROLE_TABLES:
+        addresses = table1.select(pl.col(sale_col).alias("address")).drop_nulls().unique(maintain_order=True)
+        tables[file] = addresses.join(features, on="address", how="inner").rename({"address": address_col})
+    return tables
+
+
+def address_files(address_dir: str) -> Dict[str, str]:
+    """
+    Map address -> transaction file; files are named <address><ext>. An address
+    stored in several formats maps to its most recently written file.
+    """
+    files, mtimes = {}, {}
+    if not os.path.isdir(address_dir):
+        return files
+    for name in sorted(os.listdir(address_dir)):
+        for ext in STORAGE_FORMATS.values():
+            if name.startswith("0x") and name.endswith(ext):
+                address, path = name[:-len(ext)], os.path.join(address_dir, name)
+                mtime = os.path.getmtime(path)
+                if address not in files or mtime > mtimes[address]:
+                    files[address], mtimes[address] = path, mtime
+                break
+    return files
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute df_table4-7 for every buyer/seller address in df_table1.")
+    parser.add_argument("--table1", default="df_table1.csv")
+    parser.add_argument("--addresses", default=ADDRESS_DIR, help="folder with the address transaction files")
+    parser.add_argument("--out", default=".", help="folder for df_table4.csv ... df_table7.csv")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    start = time.time()
+    table1 = pl.read_csv(args.table1, infer_schema_length=None)
+    role_cols = [sale_col for _, _, sale_col in ROLE_TABLES]
+    needed = set(pl.concat([table1[col] for col in role_cols]).drop_nulls())
+    files = {address: path for address, path in address_files(args.addresses).items() if address in needed}
+    print(f"{len(needed)} buyer/seller addresses, {len(needed) - len(files)} without a transaction file.")
+
+    transactions = load_transactions(files, workers=args.workers)
+    features = address_features(transactions)
+    print(f"Loaded {transactions.height} transactions of {features.height} addresses in {time.time() - start:.1f}s")
+    for file, table in role_tables(features, table1).items():
+        table.write_csv(os.path.join(args.out, file))
+        print(f"Saved {file} with {table.height} addresses.")
+
+if __name__ == "__main__":
+    main()
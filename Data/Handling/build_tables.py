@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from typing import Dict, Iterable, Optional, Set
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Collection"))
+from event_storage import STORAGE_FORMATS, read_event_file
+from ingest_events import EVENT_DIRS, EVENT_SCHEMA, find_event_files, flatten_event
+from transfer_chains import build_table2
+from offer_aggregator import build_offer_monthly
+from panel_builder import build_panel_tables
+from address_features import (ADDRESS_DIR, ADDRESS_METRICS, ROLE_TABLES, address_features, address_files,
+                              load_transactions)
+
+# === Configuration ===
+
+TRAITS_CSV = r"C:\Emory\Research\NFT\Project\NFT_Details\full_nft_details_wide.csv"
+TABLES_DIR = r"C:\Emory\Research\NFT\DataAnalysis\Model\Analysis_NFT_Sales"  # df_table1.csv ... Panel_for_Model2.csv
+MANIFEST_FILE = "table_manifest.json"  # kept in TABLES_DIR
+
+TRAIT_COLUMNS = ["token_id", "rarity.rank", "Background", "Clothes", "Earring", "Eyes", "Fur", "Hat", "Mouth"]
+
+
+# === Source manifest ===
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SourceManifest:
+    """
+    Hash, mtime and size of every source file the stored tables were built from,
+    grouped by kind ("sale", "transfer", "offer", "address", "traits") and keyed
+    by token ID or address. A file is only hashed when its mtime or size moved,
+    so an unchanged corpus costs one stat per file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self._scanned = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def diff(self, kind: str, sources: Dict[str, str]) -> Set[str]:
+        """Return the keys of `kind` whose file was added, changed or removed since the last build."""
+        old = self.entries.get(kind, {})
+        scanned, changed = {}, set()
+        for key, path in sources.items():
+            stat = os.stat(path)
+            entry = old.get(key)
+            if entry and entry["path"] == path and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                scanned[key] = entry
+                continue
+            digest = file_hash(path)
+            if not entry or entry["sha256"] != digest:
+                changed.add(key)
+            scanned[key] = {"path": path, "mtime": stat.st_mtime, "size": stat.st_size, "sha256": digest}
+        changed.update(set(old) - set(sources))
+        self._scanned[kind] = scanned
+        return changed
+
+    def save(self):
+        """Record the scanned files as built. Call only once every table has been written."""
+        self.entries.update(self._scanned)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.path)
+
+
+def token_files(json_dir: str) -> Dict[str, str]:
+    """Map token ID -> event file; files are named NFT_<name>_<token_id><ext>."""
+    files = {}
+    for path in find_event_files(json_dir):
+        name = os.path.basename(path)
+        for ext in STORAGE_FORMATS.values():
+            if name.endswith(ext):
+                files[name[:-len(ext)].rsplit("_", 1)[-1]] = path
+                break
+    return files
+
+
+# === Stored tables ===
+
+def read_table(path: str, key: str) -> Optional[pl.DataFrame]:
+    if not os.path.exists(path):
+        return None
+    return pl.read_csv(path, schema_overrides={key: pl.String}, infer_schema_length=None)
+
+
+def write_table(path: str, table: pl.DataFrame):
+    temp_path = f"{path}.tmp"
+    table.write_csv(temp_path, include_header=True, separator=",")
+    os.replace(temp_path, path)
+
+
+def upsert_table(path: str, key: str, rows: pl.DataFrame, replace_keys: Optional[Set[str]]) -> pl.DataFrame:
+    """
+    Replace every stored row whose `key` is in `replace_keys` with `rows` and write
+    the table back sorted by `key`. With replace_keys=None the stored table is
+    replaced entirely. Returns the updated table.
+    """
+    rows = rows.with_columns(pl.col(key).cast(pl.String))
+    stored = read_table(path, key) if replace_keys is not None else None
+    if stored is not None:
+        kept = stored.filter(~pl.col(key).is_in(list(replace_keys)))
+        rows = pl.concat([kept, rows], how="diagonal_relaxed")
+    table = rows.sort([pl.col(key).cast(pl.Int64, strict=False), pl.col(key)], maintain_order=True)
+    write_table(path, table)
+    return table
+
+
+# === Table builders ===
+
+def load_events(paths: Iterable[str]) -> pl.DataFrame:
+    """Read event files into one EVENT_SCHEMA frame."""
+    rows = []
+    for path in paths:
+        try:
+            metadata, events = read_event_file(path)
+            rows.extend(flatten_event(event, metadata, index) for index, event in enumerate(events))
+        except Exception as e:
+            print(f"An error occurred with file {path}: {e}")
+    return pl.DataFrame(rows, schema=EVENT_SCHEMA)
+
+
+def build_table1(sales: pl.DataFrame) -> pl.DataFrame:
+    """df_table1: time, price, buyer and seller of the n, n-1, n-2 and first sale of each token."""
+    price = pl.col("payment_quantity").cast(pl.Float64) / 10**18
+    return sales.sort("token_id", "event_index").group_by("token_id", maintain_order=True).agg([
+        pl.col("event_timestamp").first().alias("time_n_sale"),
+        pl.col("event_timestamp").shift(-1).first().alias("time_n-1_sale"),
+        pl.col("event_timestamp").shift(-2).first().alias("time_n-2_sale"),
+        pl.col("event_timestamp").last().alias("time_1_sale"),
+        price.first().alias("price_n_sale"),
+        price.shift(-1).first().alias("price_n-1_sale"),
+        price.shift(-2).first().alias("price_n-2_sale"),
+        price.last().alias("price_1_sale"),
+        pl.col("buyer").first().alias("buyer_n_sale"),
+        pl.col("seller").first().alias("seller_n_sale"),
+        pl.col("buyer").shift(-1).first().alias("buyer_n-1_sale"),
+        pl.col("seller").shift(-1).first().alias("seller_n-1_sale"),
+        pl.col("event_count").first().alias("event_count"),
+    ])
+
+
+# === Pipeline ===
+
+def build_tables(event_dirs: Dict[str, str], address_dir: str, traits_csv: str, tables_dir: str,
+                 full: bool = False):
+    """
+    Bring every stored table up to date with its sources. Only the tokens and
+    addresses whose files changed since the last build are recomputed and
+    upserted; with `full` (or without a stored df_table1) everything is rebuilt.
+    """
+    start = time.time()
+    table_path = lambda name: os.path.join(tables_dir, name)
+    manifest = SourceManifest(table_path(MANIFEST_FILE))
+    # Tables built before the manifest existed may hold tokens that are no longer collected.
+    full = full or not os.path.exists(manifest.path) or not os.path.exists(table_path("df_table1.csv"))
+    if full:
+        manifest.entries = {}
+
+    sources = {kind: token_files(event_dirs[kind]) for kind in ("sale", "transfer", "offer")}
+    sources["address"] = address_files(address_dir)
+    sources["traits"] = {"traits": traits_csv} if os.path.exists(traits_csv) else {}
+    changed = {kind: manifest.diff(kind, files) for kind, files in sources.items()}
+    print("Changed sources: " + ", ".join(f"{len(keys)} {kind}" for kind, keys in changed.items()))
+
+    def events_of(kind: str, tokens: Set[str]) -> pl.DataFrame:
+        return load_events(sources[kind][token] for token in sorted(tokens) if token in sources[kind])
+
+    def upsert(name: str, key: str, rows: pl.DataFrame, keys: Set[str]) -> pl.DataFrame:
+        return upsert_table(table_path(name), key, rows, None if full else keys)
+
+    # Table 1: sales
+    sale_tokens = changed["sale"]
+    previous_table1 = None if full else read_table(table_path("df_table1.csv"), "token_id")
+    table1 = upsert("df_table1.csv", "token_id", build_table1(events_of("sale", sale_tokens)), sale_tokens)
+
+    # Table 2: transfer chains
+    chain_tokens = sale_tokens | changed["transfer"]
+    upsert("df_table2.csv", "token_id",
+           build_table2(table1.filter(pl.col("token_id").is_in(list(chain_tokens))),
+                        events_of("transfer", chain_tokens)), chain_tokens)
+
+    # Monthly offers
+    offer_tokens = sale_tokens | changed["offer"]
+    offer_monthly = upsert("df_offer_monthly.csv", "token_id",
+                           build_offer_monthly((sources["offer"][token] for token in sorted(offer_tokens)
+                                                if token in sources["offer"]),
+                                               table1.filter(pl.col("token_id").is_in(list(offer_tokens)))),
+                           offer_tokens)
+
+    # Table 3: traits
+    if changed["traits"] and sources["traits"]:
+        traits = pl.read_csv(traits_csv, schema_overrides={"token_id": pl.String}, infer_schema_length=None)
+        write_table(table_path("df_table3.csv"), traits.select(TRAIT_COLUMNS))
+    table3 = read_table(table_path("df_table3.csv"), "token_id")
+    if table3 is None:
+        table3 = pl.DataFrame(schema={"token_id": pl.String})
+
+    # Tables 4-7: buyer/seller addresses, loaded once and shared by the four roles
+    changed_addresses = set()
+    plans = []
+    for file, address_col, sale_col in ROLE_TABLES:
+        stored = None if full else read_table(table_path(file), address_col)
+        stored_set = set(stored[address_col]) if stored is not None else set()
+        role_set = set(table1[sale_col].drop_nulls())
+        previous_set = set(previous_table1[sale_col].drop_nulls()) if previous_table1 is not None else set()
+        compute = ((role_set - previous_set) | (changed["address"] & role_set)) & set(sources["address"])
+        drop = (stored_set - role_set) | ((changed["address"] & stored_set) - set(sources["address"]))
+        plans.append((file, address_col, compute, drop))
+        changed_addresses |= compute | drop
+    compute_all = set().union(*(compute for _, _, compute, _ in plans))
+    features = address_features(load_transactions({address: sources["address"][address] for address in compute_all}))
+    role_tables = {}
+    for file, address_col, compute, drop in plans:
+        rows = (features.filter(pl.col("address").is_in(list(compute)))
+                .select(pl.col("address").alias(address_col), *ADDRESS_METRICS))
+        role_tables[file] = upsert(file, address_col, rows, compute | drop)
+        print(f"{file}: {len(compute)} addresses recomputed, {len(drop - compute)} removed")
+
+    # df_table1_long and Panel_for_Model2, for every token whose inputs moved
+    if full or changed["traits"]:
+        panel_tokens = set(table1["token_id"])
+    else:
+        role_cols = [sale_col for _, _, sale_col in ROLE_TABLES]
+        touched = table1.filter(pl.any_horizontal(pl.col(role_cols).is_in(list(changed_addresses))))
+        panel_tokens = sale_tokens | changed["offer"] | set(touched["token_id"])
+    table1_long, panel = build_panel_tables(table1.filter(pl.col("token_id").is_in(list(panel_tokens))),
+                                            role_tables, offer_monthly, table3)
+    upsert("df_table1_long.csv", "token_id", table1_long, panel_tokens)
+    panel = upsert("Panel_for_Model2.csv", "token_id", panel, panel_tokens)
+    panel.write_parquet(table_path("Panel_for_Model2.parquet"))
+
+    manifest.save()
+    print(f"Tables updated in {time.time() - start:.1f}s: {len(sale_tokens)} sale, {len(chain_tokens)} transfer-chain, "
+          f"{len(offer_tokens)} offer and {len(panel_tokens)} panel tokens, {len(changed_addresses)} addresses.")
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally rebuild df_table1..7, df_offer_monthly and Panel_for_Model2.")
+    for event_type, json_dir in EVENT_DIRS.items():
+        parser.add_argument(f"--{event_type}", default=json_dir, help=f"folder with the {event_type} event files")
+    parser.add_argument("--addresses", default=ADDRESS_DIR, help="folder with the address transaction files")
+    parser.add_argument("--traits", default=TRAITS_CSV, help="full_nft_details_wide.csv")
+    parser.add_argument("--tables", default=TABLES_DIR, help="folder with the stored tables and the manifest")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and rebuild every table")
+    args = parser.parse_args()
+
+    event_dirs = {event_type: getattr(args, event_type) for event_type in EVENT_DIRS}
+    os.makedirs(args.tables, exist_ok=True)
+    build_tables(event_dirs, args.addresses, args.traits, args.tables, full=args.full)
+
+if __name__ == "__main__":
+    main()
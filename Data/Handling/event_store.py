@@ -0,0 +1,321 @@
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple, Union
+import duckdb
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Collection"))
+from event_storage import read_event_file
+from ingest_events import EVENT_DIRS, PARQUET_DIR, ingest_events
+from address_features import ADDRESS_DIR, address_files
+
+# === Configuration ===
+
+DATABASE = r"C:\Emory\Research\NFT\Project\nft_store.duckdb"
+EVENT_TYPES = ["sale", "transfer", "offer"]  # <PARQUET_DIR>/<type>/part-*.parquet written by ingest_events.py
+WORKERS = os.cpu_count() or 4  # worker processes that parse address files
+BATCH_SIZE = 200  # address files per worker task (and per staging Parquet part)
+ROW_GROUP_SIZE = 16384  # rows per row group; each row group keeps min/max per column (zone map)
+
+# Address roles of an OpenSea event, indexed in address_events
+ROLE_COLS = ["seller", "buyer", "from_address", "to_address", "maker", "taker"]
+# Etherscan txlist fields kept in the store; `input` is left out (it is large and unused)
+TX_FIELDS = ["blockNumber", "timeStamp", "hash", "transactionIndex", "from", "to", "value", "gas", "gasPrice",
+             "gasUsed", "isError", "txreceipt_status", "contractAddress", "methodId", "functionName"]
+TX_SCHEMA = {"address": pl.String, **{field: pl.String for field in TX_FIELDS}}
+
+Timestamp = Union[int, str, datetime.datetime]
+
+
+def _quote(path: str) -> str:
+    """SQL string literal of a path."""
+    return "'" + path.replace("'", "''") + "'"
+
+
+def _timestamp(value: Timestamp) -> int:
+    """Unix seconds from an int, a digit string or an ISO date/datetime (UTC unless it has an offset)."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        if value.isdigit():
+            return int(value)
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp())
+
+
+# === Build ===
+
+def convert_address_batch(batch_no: int, items: List[Tuple[str, str]], out_dir: str) -> Dict[str, Any]:
+    """Worker task: the TX_FIELDS of a batch of (address, path) files as one staging Parquet part."""
+    columns = {name: [] for name in TX_SCHEMA}
+    errors = []
+    for address, path in items:
+        try:
+            _, transactions = read_event_file(path)
+            rows = [[tx.get(field) for field in TX_FIELDS] for tx in transactions]
+        except Exception as e:
+            errors.append(f"{path}: {e}")
+            continue
+        columns["address"].extend([address] * len(rows))
+        for i, field in enumerate(TX_FIELDS):
+            columns[field].extend(None if row[i] is None else str(row[i]) for row in rows)
+    if columns["address"]:
+        pl.DataFrame(columns, schema=TX_SCHEMA).write_parquet(os.path.join(out_dir, f"part-{batch_no:05d}.parquet"))
+    return {"files": len(items), "transactions": len(columns["address"]), "errors": errors}
+
+
+def stage_transactions(files: Dict[str, str], out_dir: str, workers: int = WORKERS,
+                       batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """Parse every address file once into `out_dir`/part-*.parquet; returns the counters."""
+    items = sorted(files.items())
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    result = {"files": 0, "transactions": 0, "errors": []}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(convert_address_batch, batch_no, batch, out_dir)
+                   for batch_no, batch in enumerate(batches)]
+        for done, future in enumerate(as_completed(futures), 1):
+            batch_result = future.result()
+            for key in result:
+                result[key] += batch_result[key]
+            print(f"transactions: {done}/{len(batches)} batches, {result['transactions']} transactions")
+    for error in result["errors"]:
+        print(f"Error reading {error}")
+    return result
+
+
+def build_events(con: duckdb.DuckDBPyConnection, parquet_dir: str, event_types: List[str]) -> List[str]:
+    """
+    events (sorted by token_id), address_events (one row per address role,
+    sorted by address) and sales (sorted by event_timestamp) from the Parquet
+    dataset. Returns the event types found.
+    """
+    found = [t for t in event_types if glob.glob(os.path.join(parquet_dir, t, "*.parquet"))]
+    if not found:
+        return found
+    lowered = ", ".join(f"lower({col}) AS {col}" for col in ROLE_COLS)
+    union = " UNION ALL BY NAME ".join(
+        f"SELECT * REPLACE ({lowered}), '{t}' AS source "
+        f"FROM read_parquet({_quote(os.path.join(parquet_dir, t, '*.parquet'))})" for t in found)
+    con.execute(f"CREATE OR REPLACE TABLE store.events AS {union} ORDER BY token_id, event_timestamp, event_index")
+
+    roles = " UNION ALL ".join(
+        f"SELECT {col} AS address, '{col}' AS role, source, token_id, event_timestamp, event_index, event_type, "
+        f"order_hash, \"transaction\", payment_quantity, payment_symbol FROM store.events WHERE {col} IS NOT NULL"
+        for col in ROLE_COLS)
+    con.execute(f"CREATE OR REPLACE TABLE store.address_events AS {roles} ORDER BY address, event_timestamp")
+    con.execute("CREATE OR REPLACE TABLE store.sales AS SELECT * FROM store.events WHERE source = 'sale' "
+                "ORDER BY event_timestamp, token_id")
+    return found
+
+
+def build_transactions(con: duckdb.DuckDBPyConnection, staging_dir: str):
+    """
+    transactions, typed and sorted by address and time, from the staging Parquet
+    parts. A numeric field that does not parse is stored as NULL and reported.
+    """
+    parts = _quote(os.path.join(staging_dir, "*.parquet"))
+    con.execute(f"""
+        CREATE OR REPLACE TABLE store.transactions AS
+        SELECT
+            lower(address) AS address,
+            TRY_CAST(blockNumber AS BIGINT) AS block_number,
+            TRY_CAST(timeStamp AS BIGINT) AS time_stamp,
+            hash,
+            TRY_CAST(transactionIndex AS INTEGER) AS transaction_index,
+            lower("from") AS from_address,
+            lower("to") AS to_address,
+            TRY_CAST(COALESCE(NULLIF(trim(value), ''), '0') AS HUGEINT) AS value_wei,  -- wei does not fit into BIGINT
+            TRY_CAST(gas AS BIGINT) AS gas,
+            TRY_CAST(gasPrice AS BIGINT) AS gas_price,
+            TRY_CAST(gasUsed AS BIGINT) AS gas_used,
+            isError = '1' AS is_error,
+            txreceipt_status,
+            NULLIF(contractAddress, '') AS contract_address,
+            methodId AS method_id,
+            NULLIF(functionName, '') AS function_name
+        FROM read_parquet({parts})
+        ORDER BY address, time_stamp, transaction_index
+    """)
+    numeric = {"blockNumber": "BIGINT", "timeStamp": "BIGINT", "transactionIndex": "INTEGER", "value": "HUGEINT",
+               "gas": "BIGINT", "gasPrice": "BIGINT", "gasUsed": "BIGINT"}
+    checks = " + ".join(f"count(*) FILTER (trim({raw}) <> '' AND TRY_CAST({raw} AS {sql_type}) IS NULL)"
+                        for raw, sql_type in numeric.items())
+    invalid = con.execute(f"SELECT {checks} FROM read_parquet({parts})").fetchone()[0]
+    if invalid:
+        print(f"{invalid} transaction fields that are not valid integers were stored as NULL.")
+
+
+def build_store(database: str, parquet_dir: str = PARQUET_DIR, address_dir: str = ADDRESS_DIR,
+                event_types: List[str] = EVENT_TYPES, workers: int = WORKERS,
+                row_group_size: int = ROW_GROUP_SIZE) -> Dict[str, int]:
+    """
+    Build the DuckDB store at `database` from scratch: the event Parquet dataset
+    of ingest_events.py and the Etherscan address files. Every table is written
+    in sorted order, so the per-row-group min/max of its key column lets a
+    lookup skip all but a few row groups. Returns the row count of every table.
+    """
+    tmp_path = database + ".tmp"
+    staging_dir = database + ".staging"
+    for path in (tmp_path, tmp_path + ".wal"):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    con = duckdb.connect()
+    try:
+        con.execute(f"ATTACH {_quote(tmp_path)} AS store (ROW_GROUP_SIZE {int(row_group_size)})")
+        start = time.time()
+        found = build_events(con, parquet_dir, event_types)
+        print(f"Events of {', '.join(found) or 'no type'} loaded in {time.time() - start:.1f}s")
+
+        start = time.time()
+        files = address_files(address_dir)
+        staged = stage_transactions(files, staging_dir, workers) if files else {"transactions": 0}
+        if staged["transactions"]:
+            build_transactions(con, staging_dir)
+        print(f"Transactions of {len(files)} addresses loaded in {time.time() - start:.1f}s")
+
+        counts = {table: con.execute(f"SELECT count(*) FROM store.{table}").fetchone()[0]
+                  for (table,) in con.execute("SELECT table_name FROM duckdb_tables() "
+                                              "WHERE database_name = 'store' ORDER BY table_name").fetchall()}
+        con.execute("DETACH store")
+    finally:
+        con.close()
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    os.replace(tmp_path, database)
+    return counts
+
+
+# === Query API ===
+
+class EventStore:
+    """
+    Read-only queries over the store written by build_store. Every method
+    returns a Polars frame; lookups by token_id or address only read the row
+    groups whose min/max range contains the key.
+
+        with EventStore(DATABASE) as store:
+            store.events("23", ["sale"])
+    """
+
+    def __init__(self, database: str = DATABASE):
+        self.con = duckdb.connect(database, read_only=True)
+        self.tables = {name for (name,) in self.con.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def sql(self, query: str, params: Optional[List[Any]] = None) -> pl.DataFrame:
+        """Any query against events, address_events, sales and transactions."""
+        return self.con.execute(query, params or []).pl()
+
+    def _require(self, table: str):
+        if table not in self.tables:
+            raise RuntimeError(f"The store has no {table} table; rebuild it with that data.")
+
+    def events(self, token_id: Union[str, int], sources: Optional[List[str]] = None) -> pl.DataFrame:
+        """Every stored event of a token (optionally only some of sale/transfer/offer), oldest first."""
+        self._require("events")
+        query = "SELECT * FROM events WHERE token_id = ?"
+        params = [str(token_id)]
+        if sources:
+            query += " AND source IN (SELECT unnest(?))"
+            params.append(list(sources))
+        return self.sql(query + " ORDER BY event_timestamp, event_index DESC", params)
+
+    def address_events(self, address: str, roles: Optional[List[str]] = None) -> pl.DataFrame:
+        """The events an address took part in, one row per role (seller, buyer, from_address, ...)."""
+        self._require("address_events")
+        query = "SELECT * FROM address_events WHERE address = ?"
+        params = [address.lower()]
+        if roles:
+            query += " AND role IN (SELECT unnest(?))"
+            params.append(list(roles))
+        return self.sql(query + " ORDER BY event_timestamp, event_index DESC", params)
+
+    def transactions(self, address: str, start: Optional[Timestamp] = None,
+                     end: Optional[Timestamp] = None) -> pl.DataFrame:
+        """The Etherscan history of an address, optionally within [start, end)."""
+        self._require("transactions")
+        query = "SELECT * FROM transactions WHERE address = ?"
+        params = [address.lower()]
+        if start is not None:
+            query += " AND time_stamp >= ?"
+            params.append(_timestamp(start))
+        if end is not None:
+            query += " AND time_stamp < ?"
+            params.append(_timestamp(end))
+        return self.sql(query + " ORDER BY time_stamp, transaction_index", params)
+
+    def sales(self, start: Timestamp, end: Timestamp) -> pl.DataFrame:
+        """Every sale with start <= event_timestamp < end (Unix seconds, or ISO dates in UTC)."""
+        self._require("sales")
+        return self.sql("SELECT * FROM sales WHERE event_timestamp >= ? AND event_timestamp < ? "
+                        "ORDER BY event_timestamp, token_id", [_timestamp(start), _timestamp(end)])
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the persistent DuckDB store of events and transactions.")
+    parser.add_argument("--db", default=DATABASE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="(re)build the store")
+    build.add_argument("--parquet", default=PARQUET_DIR, help="Parquet dataset of ingest_events.py")
+    build.add_argument("--addresses", default=ADDRESS_DIR, help="folder with the address transaction files")
+    build.add_argument("--types", nargs="+", choices=list(EVENT_DIRS), default=EVENT_TYPES)
+    build.add_argument("--ingest", action="store_true", help="run ingest_events.py on EVENT_DIRS first")
+    build.add_argument("--workers", type=int, default=WORKERS)
+    build.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    token = commands.add_parser("token", help="events of one token")
+    token.add_argument("token_id")
+    token.add_argument("--sources", nargs="+", choices=EVENT_TYPES)
+    address = commands.add_parser("address", help="events and transactions of one address")
+    address.add_argument("address")
+    sales = commands.add_parser("sales", help="sales within [start, end)")
+    sales.add_argument("start", help="Unix seconds or ISO date")
+    sales.add_argument("end", help="Unix seconds or ISO date")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.time()
+        if args.ingest:
+            ingest_events({t: EVENT_DIRS[t] for t in args.types}, args.parquet, workers=args.workers)
+        counts = build_store(args.db, args.parquet, args.addresses, args.types, args.workers, args.row_group_size)
+        for table, rows in counts.items():
+            print(f"{table}: {rows} rows")
+        print(f"Store written to {args.db} in {time.time() - start:.1f}s")
+        return
+
+    pl.Config.set_tbl_rows(20)
+    with EventStore(args.db) as store:
+        start = time.time()
+        if args.command == "token":
+            frames = {"events": store.events(args.token_id, args.sources)}
+        elif args.command == "address":
+            frames = {"events": store.address_events(args.address), "transactions": store.transactions(args.address)}
+        else:
+            frames = {"sales": store.sales(args.start, args.end)}
+        seconds = time.time() - start
+    for name, frame in frames.items():
+        print(f"{name}: {frame.height} rows")
+        print(frame)
+    print(f"Queried in {seconds * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Collection"))
+from event_storage import STORAGE_FORMATS, read_event_file
+
+# === Configuration ===
+
+# Folders written by the collection scripts, one per event type.
+EVENT_DIRS = {
+    "sale": r"C:\Emory\Research\NFT\Project\NFT_Event_Sale",
+    "transfer": r"C:\Emory\Research\NFT\Project\NFT_Event_Transfer",
+    "offer": r"C:\Emory\Research\NFT\Project\NFT_Event_Offer",
+}
+PARQUET_DIR = r"C:\Emory\Research\NFT\Project\Event_Parquet"  # <PARQUET_DIR>/<event type>/part-*.parquet
+WORKERS = os.cpu_count() or 4  # worker processes
+BATCH_SIZE = 500  # event files per worker task (and per Parquet part file)
+
+# One flat column per event field used by the table builds. Wei amounts stay
+# strings because they do not fit into 64-bit integers.
+EVENT_SCHEMA = {
+    "token_id": pl.String,          # metadata token_id, same as `nft_identifier` in Table_NFTs
+    "nft_name": pl.String,
+    "event_count": pl.Int64,
+    "timestamp": pl.String,         # collection time of the file
+    "event_index": pl.Int32,        # position in the file; OpenSea returns the newest event first
+    "event_type": pl.String,
+    "order_type": pl.String,
+    "order_hash": pl.String,
+    "event_timestamp": pl.Int64,
+    "seller": pl.String,
+    "buyer": pl.String,
+    "from_address": pl.String,
+    "to_address": pl.String,
+    "maker": pl.String,
+    "taker": pl.String,
+    "transaction": pl.String,
+    "quantity": pl.Int64,
+    "payment_quantity": pl.String,
+    "payment_token_address": pl.String,
+    "payment_decimals": pl.Int64,
+    "payment_symbol": pl.String,
+    "start_date": pl.Int64,
+    "expiration_date": pl.Int64,
+    "closing_date": pl.Int64,
+}
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None and value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)  # e.g. an object-valued order_type
+
+
+def flatten_event(event: Dict[str, Any], metadata: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Map one OpenSea event plus its file metadata onto EVENT_SCHEMA."""
+    payment = event.get("payment") or {}
+    return {
+        "token_id": str(metadata.get("token_id")),
+        "nft_name": metadata.get("nft_name"),
+        "event_count": _int(metadata.get("event_count")),
+        "timestamp": metadata.get("timestamp"),
+        "event_index": index,
+        "event_type": event.get("event_type"),
+        "order_type": _text(event.get("order_type")),
+        "order_hash": event.get("order_hash"),
+        "event_timestamp": _int(event.get("event_timestamp")),
+        "seller": event.get("seller"),
+        "buyer": event.get("buyer"),
+        "from_address": event.get("from_address"),
+        "to_address": event.get("to_address"),
+        "maker": event.get("maker"),
+        "taker": event.get("taker"),
+        "transaction": event.get("transaction"),
+        "quantity": _int(event.get("quantity")),
+        "payment_quantity": _text(payment.get("quantity")),
+        "payment_token_address": payment.get("token_address"),
+        "payment_decimals": _int(payment.get("decimals")),
+        "payment_symbol": payment.get("symbol"),
+        "start_date": _int(event.get("start_date")),
+        "expiration_date": _int(event.get("expiration_date")),
+        "closing_date": _int(event.get("closing_date")),
+    }
+
+
+def find_event_files(json_dir: str) -> List[str]:
+    """
+    The per-token event files (NFT_<name>_<token_id><ext>) in `json_dir`, in any
+    storage format. A token stored in several formats maps to its most recently
+    written file, so its events are read once.
+    """
+    files, mtimes = {}, {}
+    for ext in STORAGE_FORMATS.values():
+        for path in glob.glob(os.path.join(json_dir, f"NFT_*_*{ext}")):
+            token_id = os.path.basename(path)[:-len(ext)].rsplit("_", 1)[1]
+            mtime = os.path.getmtime(path)
+            if token_id not in files or mtime > mtimes[token_id]:
+                files[token_id], mtimes[token_id] = path, mtime
+    return sorted(files.values())
+
+
+def convert_batch(event_type: str, batch_no: int, paths: List[str], out_dir: str) -> Dict[str, Any]:
+    """
+    Worker task: read one batch of event files and write them as a single Parquet part.
+    Returns the batch counters and the token IDs whose files hold no events.
+    """
+    rows, empty_tokens, errors = [], [], []
+    for path in paths:
+        try:
+            metadata, events = read_event_file(path)
+            # A file that fails part-way contributes no rows, so a re-run does not half-load its token.
+            file_rows = [flatten_event(event, metadata, index) for index, event in enumerate(events)]
+        except Exception as e:
+            errors.append(f"{path}: {e}")
+            continue
+        rows.extend(file_rows)
+        if not file_rows:
+            empty_tokens.append(str(metadata.get("token_id")))
+
+    if rows:
+        part_path = os.path.join(out_dir, event_type, f"part-{batch_no:05d}.parquet")
+        pl.DataFrame(rows, schema=EVENT_SCHEMA).write_parquet(part_path)
+    return {"files": len(paths), "events": len(rows), "empty_tokens": empty_tokens, "errors": errors}
+
+
+def ingest_events(event_dirs: Dict[str, str], out_dir: str, workers: int = WORKERS,
+                  batch_size: int = BATCH_SIZE) -> Dict[str, Dict[str, Any]]:
+    """
+    Convert the event files of every type in `event_dirs` into `<out_dir>/<type>/part-*.parquet`.
+    Each type is rewritten from scratch. The token IDs without events are saved to
+    `<out_dir>/tokens_without_events.json`. Returns per-type counters.
+    """
+    summary = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for event_type, json_dir in event_dirs.items():
+            start = time.time()
+            files = find_event_files(json_dir)
+            type_dir = os.path.join(out_dir, event_type)
+            shutil.rmtree(type_dir, ignore_errors=True)
+            os.makedirs(type_dir)
+
+            batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+            futures = [executor.submit(convert_batch, event_type, batch_no, batch, out_dir)
+                       for batch_no, batch in enumerate(batches)]
+            result = {"files": 0, "events": 0, "empty_tokens": [], "errors": []}
+            for done, future in enumerate(as_completed(futures), 1):
+                batch_result = future.result()
+                for key in result:
+                    result[key] += batch_result[key]
+                print(f"{event_type}: {done}/{len(batches)} batches, {result['events']} events")
+
+            for error in result["errors"]:
+                print(f"Error reading {error}")
+            result["empty_tokens"].sort()
+            result["seconds"] = round(time.time() - start, 1)
+            summary[event_type] = result
+            print(f"{event_type}: {result['files']} files, {result['events']} events, "
+                  f"{len(result['empty_tokens'])} tokens without events, {len(result['errors'])} errors "
+                  f"in {result['seconds']}s")
+
+    empty_path = os.path.join(out_dir, "tokens_without_events.json")
+    empty = {}
+    if os.path.exists(empty_path):
+        with open(empty_path) as f:
+            empty = json.load(f)
+    empty.update({event_type: result["empty_tokens"] for event_type, result in summary.items()})
+    with open(empty_path, "w") as f:
+        json.dump(empty, f, indent=2)
+    return summary
+
+
+def scan_events(out_dir: str, event_type: str) -> pl.LazyFrame:
+    """Lazily scan the Parquet events of one type, e.g. scan_events(PARQUET_DIR, "sale")."""
+    return pl.scan_parquet(os.path.join(out_dir, event_type, "*.parquet"), schema=EVENT_SCHEMA)
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert per-token NFT event files into a Parquet dataset.")
+    for event_type, json_dir in EVENT_DIRS.items():
+        parser.add_argument(f"--{event_type}", default=json_dir, help=f"folder with the {event_type} event files")
+    parser.add_argument("--types", nargs="+", choices=list(EVENT_DIRS), default=list(EVENT_DIRS),
+                        help="event types to convert")
+    parser.add_argument("--out", default=PARQUET_DIR, help="output folder of the Parquet dataset")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    event_dirs = {event_type: getattr(args, event_type) for event_type in args.types}
+    os.makedirs(args.out, exist_ok=True)
+    ingest_events(event_dirs, args.out, workers=args.workers, batch_size=args.batch_size)
+
+if __name__ == "__main__":
+    main()
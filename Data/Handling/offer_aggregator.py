@@ -0,0 +1,200 @@
+import os
+import sys
+import csv
+import math
+import random
+import time
+import argparse
+import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Collection"))
+from event_storage import read_event_file
+from ingest_events import EVENT_DIRS, find_event_files
+
+# === Configuration ===
+
+OUTPUT_CSV = "df_offer_monthly.csv"
+WINDOWS_DAYS = [7, 14, 30]  # offers_in_<n>d: offers made at most n days before the last sale
+MEDIAN_SAMPLE_SIZE = 10000  # prices kept per token-month for the median; exact up to this many offers
+
+OFFER_MONTHLY_COLUMNS = [
+    "token_id", "year_month", "total_offers", "unique_makers_count",
+    "mean_offer_price", "std_offer_price", "median_offer_price", "highest_offer", "lowest_offer",
+    "mean_price_residual", "std_price_residual", "mean_time_residual_hrs", "std_time_residual_hrs",
+    "offers_above_sale", "offers_below_sale", "duration_offer_days", "time_since_last_offer_hrs",
+] + [f"offers_in_{days}d" for days in WINDOWS_DAYS]
+
+
+class OfferMonth:
+    """
+    Running aggregates of the item offers of one token in one month. Prices are
+    summed in wei and timestamps in seconds as Python ints, so the moments are
+    exact. The median comes from a fixed-size reservoir of the month's prices:
+    it is exact up to MEDIAN_SAMPLE_SIZE offers and a uniform-sample estimate above.
+    """
+    __slots__ = ("count", "wei_sum", "wei_squares", "ts_sum", "ts_squares", "min_wei", "max_wei",
+                 "first_ts", "last_ts", "above", "below", "in_window", "makers", "prices", "sampler")
+
+    def __init__(self):
+        self.count = 0
+        self.wei_sum = self.wei_squares = 0
+        self.ts_sum = self.ts_squares = 0
+        self.min_wei = self.max_wei = None
+        self.first_ts = self.last_ts = None
+        self.above = self.below = 0
+        self.in_window = [0] * len(WINDOWS_DAYS)
+        self.makers = set()
+        self.prices = []
+        self.sampler = None  # seeded on the first overflow, so the sample is reproducible
+
+    def add(self, wei: int, ts: int, maker: Optional[str], sale_price: float, sale_time: int):
+        price = wei / 1e18
+        self.count += 1
+        self.wei_sum += wei
+        self.wei_squares += wei * wei
+        self.ts_sum += ts
+        self.ts_squares += ts * ts
+        self.min_wei = wei if self.min_wei is None else min(self.min_wei, wei)
+        self.max_wei = wei if self.max_wei is None else max(self.max_wei, wei)
+        self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+        self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+        self.above += price > sale_price
+        self.below += price < sale_price
+        for i, days in enumerate(WINDOWS_DAYS):
+            self.in_window[i] += sale_time - ts <= days * 86400
+        if maker:
+            self.makers.add(maker)
+        if len(self.prices) < MEDIAN_SAMPLE_SIZE:
+            self.prices.append(price)
+            return
+        if self.sampler is None:
+            self.sampler = random.Random(0)
+        slot = self.sampler.randrange(self.count)
+        if slot < MEDIAN_SAMPLE_SIZE:
+            self.prices[slot] = price
+
+    def std(self, total: int, squares: int) -> float:
+        """Population standard deviation from an exact integer sum and sum of squares."""
+        return math.sqrt(self.count * squares - total * total) / self.count
+
+    def record(self, token_id: str, year_month: str, sale_price: float, sale_time: int) -> Dict[str, Any]:
+        mean_price = self.wei_sum / self.count / 1e18
+        std_price = self.std(self.wei_sum, self.wei_squares) / 1e18
+        std_time = self.std(self.ts_sum, self.ts_squares)
+        self.prices.sort()
+        middle = len(self.prices) // 2
+        median = self.prices[middle] if len(self.prices) % 2 else (self.prices[middle - 1] + self.prices[middle]) / 2
+        record = {
+            "token_id": token_id,
+            "year_month": year_month,
+            "total_offers": self.count,
+            "unique_makers_count": len(self.makers),
+            "mean_offer_price": mean_price,
+            "std_offer_price": std_price,
+            "median_offer_price": median,
+            "highest_offer": self.max_wei / 1e18,
+            "lowest_offer": self.min_wei / 1e18,
+            "mean_price_residual": mean_price - sale_price,
+            "std_price_residual": std_price if not math.isnan(sale_price) else math.nan,
+            "mean_time_residual_hrs": (sale_time - self.ts_sum / self.count) / 3600,
+            "std_time_residual_hrs": std_time / 3600,
+            "offers_above_sale": self.above,
+            "offers_below_sale": self.below,
+            "duration_offer_days": (self.last_ts - self.first_ts) / 86400 if self.count > 1 else 0.0,
+            "time_since_last_offer_hrs": (sale_time - self.last_ts) / 3600,
+        }
+        for days, count in zip(WINDOWS_DAYS, self.in_window):
+            record[f"offers_in_{days}d"] = count
+        return record
+
+
+@lru_cache(maxsize=None)
+def month_of_day(day: int) -> str:
+    """UTC year-month of a day number (timestamp // 86400)."""
+    return datetime.datetime.fromtimestamp(day * 86400, datetime.timezone.utc).strftime("%Y-%m")
+
+
+def last_sales(table1: pl.DataFrame) -> Dict[str, Tuple[float, int]]:
+    """token_id -> (price_n_sale, time_n_sale) of every token with a timed last sale."""
+    return {token_id: (math.nan if price is None else price, ts)
+            for token_id, ts, price in table1.select("token_id", "time_n_sale", "price_n_sale").iter_rows()
+            if ts is not None}
+
+
+def aggregate_offer_file(path: str, sales: Dict[str, Tuple[float, int]]) -> List[Dict[str, Any]]:
+    """The df_offer_monthly rows of the token in one offer file, one per month with item offers."""
+    metadata, events = read_event_file(path)
+    token_id = str(metadata.get("token_id"))
+    if token_id not in sales:
+        return []  # skip NFTs without a matching sale record
+    sale_price, sale_time = sales[token_id]
+    months = {}
+    for event in events:
+        if event.get("event_type") != "order" or event.get("order_type") != "item_offer":
+            continue
+        ts = event.get("event_timestamp")
+        quantity = (event.get("payment") or {}).get("quantity")
+        if ts in (None, "") or quantity is None:
+            continue
+        ts = int(ts)
+        ym = month_of_day(ts // 86400)
+        if ym not in months:
+            months[ym] = OfferMonth()
+        months[ym].add(int(quantity), ts, event.get("maker"), sale_price, sale_time)
+    return [months[ym].record(token_id, ym, sale_price, sale_time) for ym in sorted(months)]
+
+
+def iter_offer_monthly(paths: Iterable[str], table1: pl.DataFrame) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Stream the df_offer_monthly rows one token (file) at a time. A token's months
+    are released as soon as its rows are consumed, so memory does not grow with the corpus.
+    """
+    sales = last_sales(table1)
+    for path in paths:
+        try:
+            yield aggregate_offer_file(path, sales)
+        except Exception as e:
+            print(f"An error occurred with file {path}: {e}")
+
+
+def build_offer_monthly(paths: Iterable[str], table1: pl.DataFrame) -> pl.DataFrame:
+    """df_offer_monthly: item offers per (token_id, year_month), compared with the token's last sale."""
+    records = [record for token_records in iter_offer_monthly(paths, table1) for record in token_records]
+    if not records:
+        return pl.DataFrame(schema={"token_id": pl.String, "year_month": pl.String})
+    return pl.DataFrame(records)
+
+
+def write_offer_monthly(paths: Iterable[str], table1: pl.DataFrame, out_csv: str) -> int:
+    """Write df_offer_monthly row by row, flushing after every token. Returns the number of rows."""
+    rows = 0
+    with open(out_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=OFFER_MONTHLY_COLUMNS)
+        writer.writeheader()
+        for token_records in iter_offer_monthly(paths, table1):
+            writer.writerows(token_records)
+            rows += len(token_records)
+            f.flush()
+    return rows
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the offer event files into df_offer_monthly.csv.")
+    parser.add_argument("--offer", default=EVENT_DIRS["offer"], help="folder with the offer event files")
+    parser.add_argument("--table1", default="df_table1.csv")
+    parser.add_argument("--out", default=OUTPUT_CSV)
+    args = parser.parse_args()
+
+    start = time.time()
+    table1 = pl.read_csv(args.table1, schema_overrides={"token_id": pl.String}, infer_schema_length=None)
+    paths = find_event_files(args.offer)
+    rows = write_offer_monthly(paths, table1, args.out)
+    print(f"Saved {rows} token-months from {len(paths)} offer files to {args.out} in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import time
+import argparse
+from typing import Dict, Tuple
+import polars as pl
+import polars.selectors as cs
+
+from address_features import ROLE_TABLES
+
+# === Configuration ===
+
+TABLES_DIR = r"C:\Emory\Research\NFT\DataAnalysis\Model\Analysis_NFT_Sales"  # df_table1.csv ... Panel_for_Model2.csv
+
+# Panel rows: time_of_sale, df_table1 columns, and the buyer/seller tables joined to it
+GENERIC_COLS = {
+    "transaction_count": "tscount",
+    "active_period": "act_period",
+    "total_value": "total_value",
+    "total_gasUsed": "total_gasUsed",
+    "avg_gasPrice": "avg_gasPrice",
+    "avg_gasLimit": "avg_gasLimit",
+    "rolling_avg_value_last10": "rolling_avg_value_last10",
+    "rolling_std_value_last10": "rolling_std_value_last10",
+}
+PANEL_SALES = [
+    ("time_n_sale", "price_n_sale", "buyer_n_sale", "seller_n_sale", "df_table4.csv", "df_table5.csv"),
+    ("time_n-1_sale", "price_n-1_sale", "buyer_n-1_sale", "seller_n-1_sale", "df_table6.csv", "df_table7.csv"),
+]
+
+
+def long_parts(table1: pl.LazyFrame) -> list:
+    """The wide-to-long reshape of df_table1: one lazy frame per entry of PANEL_SALES."""
+    return [table1.select(
+        pl.col("token_id").cast(pl.String),
+        pl.lit(time_col).alias("time_of_sale"),
+        pl.from_epoch(pl.col(time_col).cast(pl.Int64, strict=False)).dt.strftime("%Y-%m").alias("sale_time"),
+        pl.col(price_col).cast(pl.Float64).alias("price"),
+        pl.col(buyer_col).alias("buyer"),
+        pl.col(seller_col).alias("seller"),
+        pl.col("event_count"),
+    ) for time_col, price_col, buyer_col, seller_col, _, _ in PANEL_SALES]
+
+
+def panel_plan(table1: pl.DataFrame, role_tables: Dict[str, pl.DataFrame], offer_monthly: pl.DataFrame,
+               table3: pl.DataFrame) -> Tuple[pl.LazyFrame, pl.LazyFrame]:
+    """
+    One lazy query plan for df_table1_long and Panel_for_Model2. The panel joins
+    the buyer and seller statistics of the matching sale, the offers of the sale
+    month and the token traits onto df_table1_long; missing values are filled
+    with 0 as in Table_NFTs.ipynb. Collect both with pl.collect_all so the shared
+    reshape runs once.
+    """
+    address_cols = {file: address_col for file, address_col, _ in ROLE_TABLES}
+
+    def role_stats(file: str, prefix: str) -> pl.LazyFrame:
+        return role_tables[file].lazy().select(pl.col(address_cols[file]).alias("address"),
+                                               *[pl.col(src).alias(prefix + dst) for src, dst in GENERIC_COLS.items()])
+
+    parts = long_parts(table1.lazy())
+    table1_long = pl.concat(parts).sort("token_id", maintain_order=True)
+
+    joined = []
+    for part, (_, _, _, _, buyer_file, seller_file) in zip(parts, PANEL_SALES):
+        part = part.join(role_stats(buyer_file, "buyer_"), left_on="buyer", right_on="address", how="left",
+                         maintain_order="left")
+        part = part.join(role_stats(seller_file, "seller_"), left_on="seller", right_on="address", how="left",
+                         maintain_order="left")
+        joined.append(part)
+    panel = (pl.concat(joined, how="diagonal_relaxed")
+             .sort("token_id", maintain_order=True)
+             .with_columns(pl.col("price").round(2))
+             .join(offer_monthly.lazy(), left_on=["token_id", "sale_time"], right_on=["token_id", "year_month"],
+                   how="left", maintain_order="left")
+             .join(table3.lazy(), on="token_id", how="left", maintain_order="left")
+             .with_columns(cs.float().fill_nan(0))
+             .with_columns(cs.numeric().fill_null(0), cs.string().fill_null("0")))
+    return table1_long, panel
+
+
+def build_panel_tables(table1: pl.DataFrame, role_tables: Dict[str, pl.DataFrame], offer_monthly: pl.DataFrame,
+                       table3: pl.DataFrame) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """df_table1_long and Panel_for_Model2, collected from one plan."""
+    table1_long, panel = pl.collect_all(list(panel_plan(table1, role_tables, offer_monthly, table3)))
+    return table1_long, panel
+
+
+# === Main Routine ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild df_table1_long and Panel_for_Model2 from the stored tables.")
+    parser.add_argument("--tables", default=TABLES_DIR, help="folder with df_table1.csv ... df_table7.csv")
+    parser.add_argument("--out", default=None, help="output folder (default: --tables)")
+    args = parser.parse_args()
+    out = args.out or args.tables
+    os.makedirs(out, exist_ok=True)
+
+    start = time.time()
+    read = lambda name, key: pl.read_csv(os.path.join(args.tables, name), schema_overrides={key: pl.String},
+                                         infer_schema_length=None)
+    table1 = read("df_table1.csv", "token_id")
+    role_tables = {file: read(file, address_col) for file, address_col, _ in ROLE_TABLES}
+    offer_monthly = read("df_offer_monthly.csv", "token_id")
+    table3 = read("df_table3.csv", "token_id")
+
+    table1_long, panel = build_panel_tables(table1, role_tables, offer_monthly, table3)
+    table1_long.write_csv(os.path.join(out, "df_table1_long.csv"))
+    panel.write_csv(os.path.join(out, "Panel_for_Model2.csv"))
+    panel.write_parquet(os.path.join(out, "Panel_for_Model2.parquet"))
+    print(f"Saved df_table1_long ({table1_long.height} rows) and Panel_for_Model2 "
+          f"({panel.height} rows, {panel.width} columns) in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()